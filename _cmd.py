@@ -29,14 +29,16 @@ import json
 from uuid import uuid1 as uuid, UUID
 from optparse import OptionParser, BadOptionError, Option, IndentedHelpFormatter
 
-from core import ObdHome
+import _environ as ENV
+if os.environ.get(ENV.ENV_PROFILE_IMPORT) == '1':
+    from _profile import ImportProfiler
+    ImportProfiler().install()
+
 from _stdio import IO, FormtatText
 from _lock import LockMode
 from _types import Capacity
 from tool import DirectoryUtil, FileUtil, NetUtil, COMMAND_ENV
 from _errno import DOC_LINK_MSG, LockError
-import _environ as ENV
-from ssh import LocalClient
 from const import (
     CONST_OBD_HOME,
     VERSION, REVISION, BUILD_BRANCH, BUILD_TIME, FORBIDDEN_VARS,
@@ -240,6 +242,8 @@ class ObdCommand(BaseCommand):
             ROOT_IO.track_limit += 1
             ROOT_IO.verbose('cmd: %s' % self.cmds)
             ROOT_IO.verbose('opts: %s' % self.opts)
+            # core pulls in every manager, import it only when a command really runs
+            from core import ObdHome
             obd = ObdHome(home_path=self.OBD_PATH, dev_mode=self.dev_mode, lock_mode=self.lock_mode, stdio=ROOT_IO)
             obd.set_options(self.opts)
             obd.set_cmds(self.cmds)
@@ -488,10 +492,7 @@ class MirrorCloneCommand(ObdCommand):
 
     def _do_command(self, obd):
         if self.cmds:
-            for src in self.cmds:
-                if not obd.add_mirror(src):
-                    return False
-            return True
+            return obd.add_mirrors(self.cmds)
         else:
             return self._show_help()
 
@@ -567,17 +568,22 @@ class MirrorUpdateCommand(ObdCommand):
         super(MirrorUpdateCommand, self).__init__('update', 'Update remote mirror information.')
 
     def _do_command(self, obd):
-        success = True
         current = int(time.time())
-        mirrors = obd.mirror_manager.get_remote_mirrors()
-        for mirror in mirrors:
-            try:
-                if mirror.enabled and mirror.repo_age < current:
-                    success = mirror.update_mirror() and success
-            except:
-                success = False
-                ROOT_IO.stop_loading('fail')
-                ROOT_IO.exception('Fail to synchronize mirorr (%s)' % mirror.name)
+        mirrors = [mirror for mirror in obd.mirror_manager.get_remote_mirrors(refresh=False) if mirror.enabled and mirror.repo_age < current]
+        success = obd.mirror_manager.refresh_mirrors(mirrors, update=True, probe=True)
+        if mirrors:
+            ROOT_IO.print_list(
+                mirrors,
+                ['SectionName', 'Avaiable', 'Latency', 'Cost', 'Update Time'],
+                lambda x: [
+                    x.section_name,
+                    x.available,
+                    '%.0f ms' % (x.latency * 1000) if x.latency is not None else '-',
+                    '%.0f ms' % (x.refresh_cost * 1000) if x.refresh_cost is not None else '-',
+                    time.strftime("%Y-%m-%d %H:%M", time.localtime(x.repo_age))
+                ],
+                title='Mirror Update Result'
+            )
         return success
 
 
@@ -691,6 +697,7 @@ class ClusterMirrorCommand(ObdCommand):
     def background_telemetry_task(self, obd, demploy_name=None):
         if demploy_name is None:
             demploy_name = self.cmds[0]
+        from ssh import LocalClient
         data = json.dumps(self.get_obd_namespaces_data(obd))
         LocalClient.execute_command_background("nohup obd telemetry post %s --data='%s' >/dev/null 2>&1 &" % (demploy_name, data))
 
@@ -26,7 +26,9 @@ import re
 import sys
 import getpass
 import hashlib
+import shutil
 from copy import deepcopy
+from contextlib import contextmanager
 from enum import Enum
 
 from ruamel.yaml.comments import CommentedMap
@@ -227,14 +229,30 @@ class InnerConfig(object):
         except:
             pass
 
-    def _dump(self):
+    def _dump_tmp(self):
+        # write to a temporary file beside the config, the caller renames it into place
+        tmp_path = '%s.%s.tmp' % (self.path, os.getpid())
         try:
             stdio = self.yaml_loader.stdio if self.yaml_loader else None
-            with FileUtil.open(self.path, 'w', stdio=stdio) as f:
+            with FileUtil.open(tmp_path, 'w', stdio=stdio) as f:
                 self.yaml_loader.dump(self.config, f)
-            return True
+            if os.path.exists(self.path):
+                # the renamed file keeps the mode of the one it replaces
+                shutil.copymode(self.path, tmp_path)
+            return tmp_path
         except:
-            pass
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return None
+
+    def _dump(self):
+        tmp_path = self._dump_tmp()
+        if tmp_path:
+            try:
+                os.rename(tmp_path, self.path)
+                return True
+            except:
+                os.remove(tmp_path)
         return False
 
     def dump(self):
@@ -579,6 +597,14 @@ class ClusterConfig(object):
     def get_inner_config(self):
         return self._inner_config
     
+    @contextmanager
+    def transaction(self):
+        if self._deploy_config is None:
+            yield
+        else:
+            with self._deploy_config.transaction():
+                yield
+
     def update_component_attr(self, key, value, save=True):
         self._inner_config.update_attr(key, value)
         return self._deploy_config.dump() if save else True
@@ -1069,6 +1095,8 @@ class DeployConfig(SafeStdio):
         self._removed_components = set()
         self._do_not_dump = False
         self._mem_mode = False
+        self._transaction_depth = 0
+        self._transaction_dirty = False
 
     def __deepcopy__(self, memo):
         deploy_config = self.__class__(self.yaml_path, self.yaml_loader, self._inner_config, self.config_parser_manager, self.stdio)
@@ -1323,23 +1351,84 @@ class DeployConfig(SafeStdio):
                     inner_config = parser.extract_inner_config(cluster_config, src_data)
                     self.inner_config.update_component_config(component_name, inner_config)
 
+    @contextmanager
+    def transaction(self):
+        """
+        Batch config writes: dumps inside the block only mark the config as changed,
+        and the outermost block writes the config and the inner config once on exit.
+        Changes are applied in memory immediately, so they are written even if the block raises.
+        A failed write raises IOError, so a plugin that changed the config fails instead of reporting success.
+        """
+        self._transaction_depth += 1
+        try:
+            yield
+        except:
+            self._end_transaction()
+            raise
+        if not self._end_transaction():
+            raise IOError('failed to save deploy config %s' % self.yaml_path)
+
+    def _end_transaction(self):
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0 and self._transaction_dirty:
+            self._transaction_dirty = False
+            if not self._dump():
+                self.stdio and getattr(self.stdio, 'error', print)('failed to save deploy config %s' % self.yaml_path)
+                return False
+        return True
+
     def _dump_inner_config(self):
         if self.inner_config:
+            if self._transaction_depth:
+                self._transaction_dirty = True
+                return True
             self._separate_config()
-            self.inner_config.dump()
+            return self.inner_config.dump()
 
     def _dump(self):
         if self._do_not_dump:
             raise Exception("Cannot dump because flag DO NOT DUMP exists.")
+        if self._transaction_depth:
+            self._transaction_dirty = True
+            return True
+        tmp_path = '%s.%s.tmp' % (self.yaml_path, os.getpid())
+        inner_tmp_path = None
+        backup_path = None
+        inner_replaced = False
         try:
-            with open(self.yaml_path, 'w') as f:
-                self._dump_inner_config()
+            if self.inner_config:
+                self._separate_config()
+                inner_tmp_path = self.inner_config._dump_tmp()
+                if not inner_tmp_path:
+                    raise IOError('failed to dump %s' % self.inner_config.path)
+            with open(tmp_path, 'w') as f:
                 self.yaml_loader.dump(self._src_data, f)
+            if os.path.exists(self.yaml_path):
+                shutil.copymode(self.yaml_path, tmp_path)
+            if inner_tmp_path:
+                # config.yaml and the inner config are saved as one unit, the old inner config is put back
+                # if config.yaml can not be replaced
+                if os.path.exists(self.inner_config.path):
+                    backup_path = '%s.%s.bak' % (self.inner_config.path, os.getpid())
+                    os.link(self.inner_config.path, backup_path)
+                os.rename(inner_tmp_path, self.inner_config.path)
+                inner_replaced = True
+            os.rename(tmp_path, self.yaml_path)
             return True
         except:
             import logging
             logging.exception('')
-            pass
+            if inner_replaced:
+                if backup_path:
+                    os.rename(backup_path, self.inner_config.path)
+                else:
+                    os.remove(self.inner_config.path)
+            for path in (tmp_path, inner_tmp_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+        finally:
+            if backup_path and os.path.exists(backup_path):
+                os.remove(backup_path)
         return False
 
     def dump(self):
@@ -1525,6 +1614,7 @@ class Deploy(object):
     DEPLOY_YAML_NAME = 'config.yaml'
     INNER_CONFIG_NAME = 'inner_config.yaml'
     UPRADE_META_NAME = '.upgrade'
+    HOST_FACTS_NAME = '.host_facts'
 
     def __init__(self, config_dir, config_parser_manager=None, stdio=None):
         self.config_dir = config_dir
@@ -1562,6 +1652,10 @@ class Deploy(object):
     def get_inner_config_path(path):
         return os.path.join(path, Deploy.INNER_CONFIG_NAME)
 
+    @staticmethod
+    def get_host_facts_path(path):
+        return os.path.join(path, Deploy.HOST_FACTS_NAME)
+
     @staticmethod
     def get_temp_deploy_yaml_path(path):
         return os.path.join(path, 'tmp_%s' % Deploy.DEPLOY_YAML_NAME)
@@ -38,8 +38,14 @@ ENV_REPO_INSTALL_MODE = "OBD_REPO_INSTALL_MODE"
 # disable rsync mode even if the rsync exists. {0/1}
 ENV_DISABLE_RSYNC = "OBD_DISABLE_RSYNC"
 
+# send directories by a tar stream instead of the parallel sftp channels when rsync is not used. {0/1}
+ENV_ENABLE_TAR_TRANSPORTER = "OBD_ENABLE_TAR_TRANSPORTER"
+
 ENV_DISABLE_PARALLER_EXTRACT = "OBD_DISALBE_PARALLER_EXTRACT"
 
+# max size of the extracted payload cache. {capacity, such as 5G} 0 - disable the cache
+ENV_PAYLOAD_CACHE_SIZE = "OBD_PAYLOAD_CACHE_SIZE"
+
 # telemetry mode. 0 - disable, 1 - enable.
 ENV_TELEMETRY_MODE = "TELEMETRY_MODE"
 
@@ -62,4 +68,16 @@ ENV_HOST_IP_MODE = "HOST_IP_MODE"
 ENV_OBD_INSTALL_PRE = "OBD_INSTALL_PRE"
 
 # obdeploy install path. default /usr/obd/
-ENV_OBD_INSTALL_PATH = "OBD_INSTALL_PATH"
\ No newline at end of file
+ENV_OBD_INSTALL_PATH = "OBD_INSTALL_PATH"
+
+# ttl(seconds) of the cached remote host facts. default 600
+ENV_HOST_FACTS_TTL = "OBD_HOST_FACTS_TTL"
+
+# fan-out degree of the repository distribution among servers. 0 - the control machine sends to every server. default 0
+ENV_DISTRIBUTE_FANOUT = "OBD_DISTRIBUTE_FANOUT"
+
+# deadline(seconds) of probing and refreshing the remote mirrors concurrently. default 120
+ENV_MIRROR_REFRESH_TIMEOUT = "OBD_MIRROR_REFRESH_TIMEOUT"
+
+# report the cost of module imports on exit when set to 1, only read from the process environment. default 0
+ENV_PROFILE_IMPORT = "OBD_PROFILE_IMPORT"
@@ -26,29 +26,37 @@ import os
 import sys
 import tempfile
 import time
+import json
 import pickle
 import string
+import hashlib
 import fcntl
-import requests
+import threading
 from glob import glob
 from enum import Enum
-from copy import deepcopy
+from multiprocessing.pool import ThreadPool
+from copy import deepcopy, copy
 from xml.etree import cElementTree
 
-from _stdio import SafeStdio
+from _stdio import SafeStdio, DeferredIO
 from ssh import LocalClient
 try:
     from ConfigParser import ConfigParser
 except:
     from configparser import ConfigParser
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
 
 from _arch import getArchList, getBaseArch
 from _rpm import Version, Package, PackageInfo
-from tool import ConfigUtil, FileUtil, var_replace
+from tool import ConfigUtil, DirectoryUtil, FileUtil, LazyModule, var_replace, COMMAND_ENV
 from _manager import Manager
-from tool import timeout
+from _environ import ENV_MIRROR_REFRESH_TIMEOUT
 
 
+requests = LazyModule('requests')
 _ARCH = getArchList()
 _NO_LSE = 'amd64' in _ARCH and LocalClient.execute_command("grep atomics /proc/cpuinfo").stdout.strip() == ''
 
@@ -101,6 +109,139 @@ def get_use_centos_release(stdio=None):
     return use_release, server_vars
 
 
+class MirrorPackageIndex(object):
+
+    """
+    SQLite index of the package infos of a mirror, kept next to its pickled db. md5, name and arch
+    are indexed and versions get a sortable key, so lookups no longer unpickle and scan the whole db.
+    """
+
+    __VERSION__ = '1'
+    SCHEMA = '''
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE packages (md5 TEXT PRIMARY KEY, name TEXT, arch TEXT, version_key BLOB, info BLOB);
+        CREATE INDEX packages_name ON packages (name);
+        CREATE INDEX packages_arch ON packages (arch);
+    '''
+
+    def __init__(self, path, stdio=None):
+        self.path = path
+        self.stdio = stdio
+        self._conn = None
+
+    @staticmethod
+    def version_key(version):
+        key = b''
+        for num, suffix in Version(version).__cmp_value__:
+            key += ('%020d%s' % (num, suffix)).encode('utf-8') + b'\0'
+        return key
+
+    @staticmethod
+    def source_signature(path):
+        stat = os.stat(path)
+        return '%r-%s' % (stat.st_mtime, stat.st_size)
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def is_fresh(self, signature):
+        if sqlite3 is None or not os.path.isfile(self.path):
+            return False
+        try:
+            meta = dict(self._connect().execute('SELECT key, value FROM meta'))
+            return meta.get('version') == self.__VERSION__ and meta.get('signature') == signature
+        except:
+            self.close()
+            return False
+
+    def build(self, infos, signature):
+        if sqlite3 is None:
+            return False
+        self.close()
+        tmp_path = '%s.%s.tmp' % (self.path, os.getpid())
+        try:
+            FileUtil.rm(tmp_path, stdio=self.stdio)
+            self.stdio and getattr(self.stdio, 'verbose', print)('build %s' % self.path)
+            conn = sqlite3.connect(tmp_path)
+            try:
+                conn.executescript(self.SCHEMA)
+                conn.executemany('INSERT OR REPLACE INTO packages VALUES (?, ?, ?, ?, ?)', [(
+                    info.md5,
+                    info.name,
+                    info.arch,
+                    sqlite3.Binary(self.version_key(info.version)),
+                    sqlite3.Binary(pickle.dumps(info, pickle.HIGHEST_PROTOCOL))
+                ) for info in infos])
+                conn.executemany('INSERT INTO meta VALUES (?, ?)', [('version', self.__VERSION__), ('signature', signature)])
+                conn.commit()
+            finally:
+                conn.close()
+            os.rename(tmp_path, self.path)
+            return True
+        except:
+            self.stdio and getattr(self.stdio, 'exception', print)('')
+            FileUtil.rm(tmp_path, stdio=self.stdio)
+        return False
+
+    def update(self, infos, removed, base_signature, signature):
+        """
+        Apply the delta between two sources. It is only applied on the index of the source it was computed from,
+        otherwise False is returned and the index has to be built again.
+        """
+        if not base_signature or not os.path.isfile(self.path):
+            return False
+        try:
+            conn = self._connect()
+            meta = dict(conn.execute('SELECT key, value FROM meta'))
+            if meta.get('version') != self.__VERSION__ or meta.get('signature') != base_signature:
+                return False
+            self.stdio and getattr(self.stdio, 'verbose', print)('update %s: %s added, %s removed' % (self.path, len(infos), len(removed)))
+            with conn:
+                conn.executemany('DELETE FROM packages WHERE md5 = ?', [(md5, ) for md5 in removed])
+                conn.executemany('INSERT OR REPLACE INTO packages VALUES (?, ?, ?, ?, ?)', [(
+                    info.md5,
+                    info.name,
+                    info.arch,
+                    sqlite3.Binary(self.version_key(info.version)),
+                    sqlite3.Binary(pickle.dumps(info, pickle.HIGHEST_PROTOCOL))
+                ) for info in infos])
+                conn.execute('UPDATE meta SET value = ? WHERE key = ?', (signature, 'signature'))
+            return True
+        except:
+            self.stdio and getattr(self.stdio, 'exception', print)('')
+            self.close()
+        return False
+
+    def get(self, md5):
+        row = self._connect().execute('SELECT info FROM packages WHERE md5 = ?', (md5, )).fetchone()
+        return pickle.loads(bytes(row[0])) if row else None
+
+    def query(self, name=None, name_contains=None, arch=None):
+        sql = 'SELECT info FROM packages'
+        conditions = []
+        args = []
+        if name:
+            conditions.append('name = ?')
+            args.append(name)
+        if name_contains:
+            conditions.append('instr(name, ?) > 0')
+            args.append(name_contains)
+        if arch:
+            conditions.append('arch IN (%s)' % ', '.join(['?'] * len(arch)))
+            args += list(arch)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY version_key'
+        return [pickle.loads(bytes(row[0])) for row in self._connect().execute(sql, args)]
+
+
 class MirrorRepositoryType(Enum):
 
     LOCAL = 'local'
@@ -130,6 +271,31 @@ class MirrorRepository(SafeStdio):
     def get_all_pkg_info(self):
         return []
 
+    @property
+    def index(self):
+        return None
+
+    def _get_pkg_info_by_md5(self, md5):
+        index = self.index
+        if index:
+            try:
+                return index.get(md5)
+            except:
+                self.stdio and getattr(self.stdio, 'exception', print)('')
+        db = self.db
+        return db.get(md5) if db else None
+
+    def _search_pkgs_info(self, **filters):
+        # the index narrows candidates by name and arch, callers still apply every filter themselves
+        index = self.index
+        if index:
+            try:
+                return index.query(**filters)
+            except:
+                self.stdio and getattr(self.stdio, 'exception', print)('')
+        db = self.db
+        return [db[key] for key in db] if db else []
+
     def get_best_pkg(self, **pattern):
         info = self.get_best_pkg_info(**pattern)
         return self.get_rpm_pkg_by_info(info) if info else None
@@ -288,49 +454,98 @@ class RemoteMirrorRepository(MirrorRepository):
     REPOMD_FILE = 'repomd.xml'
     OTHER_DB_FILE = 'other_db.xml'
     REPO_AGE_FILE = '.rege_age'
+    REPOMD_HTTP_FILE = '.repomd_http'
     DB_CACHE_FILE = '.db'
+    DB_INDEX_FILE = '.db.sqlite'
     PRIMARY_REPOMD_TYPE = 'primary'
+    PROBE_TIMEOUT = 5
+    DOWNLOAD_PART_SUFFIX = '.part'
+    DOWNLOAD_TIMEOUT = (10, 60)
+    DOWNLOAD_CHUNK_SIZE = 1 << 20
+    DOWNLOAD_WORKERS = 4
+    DOWNLOAD_PARALLEL_SIZE = 64 << 20
     __VERSION__ = Version("1.0")
+    # the signature of the primary file which the db cache is parsed from
+    __SOURCE_KEY__ = '__source__'
+    # probe results by baseurl, shared by every mirror built in this process
+    _PROBE_CACHE = {}
 
-    def __init__(self, mirror_path, meta_data, stdio=None):
+    def __init__(self, mirror_path, meta_data, stdio=None, refresh=True):
         self.baseurl = None
         self.repomd_age = 0
         self.repo_age = 0
         self.priority = 1
         self.gpgcheck = False
+        self.latency = None
+        self.refresh_cost = None
         self._db = None
+        self._db_source = None
+        self._db_delta = None
+        self._index = None
         self._repomds = None
         self._available = None
+        self._skipped = False
+        # taken by skip() and around every write into the mirror by a refresh
+        self._write_lock = threading.Lock()
         super(RemoteMirrorRepository, self).__init__(mirror_path, stdio=stdio)
         self.section_name = meta_data['section_name']
         self.baseurl = meta_data['baseurl']
         self.enabled = meta_data['enabled'] == '1'
         self.gpgcheck = ConfigUtil.get_value_from_dict(meta_data, 'gpgcheck', 0, int) > 0
         self.priority = 100 - ConfigUtil.get_value_from_dict(meta_data, 'priority', 99, int)
+        self.config_repo_age = ConfigUtil.get_value_from_dict(meta_data, 'repo_age', 0, int)
         if os.path.exists(mirror_path):
             self._load_repo_age()
-        if self.enabled:
-            repo_age = ConfigUtil.get_value_from_dict(meta_data, 'repo_age', 0, int)
-            if (repo_age > self.repo_age or int(time.time()) - 86400 > self.repo_age) and self.available:
-                if self.update_mirror():
-                    self.repo_age = repo_age
-        
+        if refresh:
+            self.refresh()
+
+    def need_refresh(self):
+        return self.enabled and (self.config_repo_age > self.repo_age or int(time.time()) - 86400 > self.repo_age)
+
+    def refresh(self):
+        if self.need_refresh() and self.available:
+            if self.update_mirror():
+                self.repo_age = self.config_repo_age
+
+    def skip(self):
+        # the refresh missed its deadline, keep this mirror out of the current session.
+        # Once skip() returns, a refresh still running moves no file into the mirror any more
+        with self._write_lock:
+            self._skipped = True
+            self._available = False
+
+    def _move(self, src, dst):
+        # the data is written to temporary paths, and only moved into place while the mirror is not skipped
+        with self._write_lock:
+            if self._skipped:
+                FileUtil.rm(src, stdio=self.stdio)
+                return False
+            os.rename(src, dst)
+            return True
+
     @property
     def available(self):
-        if not self.enabled:
+        if not self.enabled or self._skipped:
             return False
         if self._available is None:
-            try:
-                with timeout(5):
-                    req = requests.request('get', self.baseurl)
-                    self._available = req.status_code < 400
-            except Exception:
-                self.stdio and getattr(self.stdio, 'exception', print)('')
-                self._available = False
+            probe = self._PROBE_CACHE.get(self.baseurl)
+            if probe is None:
+                start = time.time()
+                try:
+                    with requests.get(self.baseurl, timeout=self.PROBE_TIMEOUT, stream=True) as req:
+                        available = req.status_code < 400
+                except Exception:
+                    self.stdio and getattr(self.stdio, 'exception', print)('')
+                    available = False
+                probe = self._PROBE_CACHE[self.baseurl] = (available, time.time() - start)
+                self.stdio and getattr(self.stdio, 'verbose', print)('probe %s: %s in %.0f ms' % (self.baseurl, available, probe[1] * 1000))
+            self._available, self.latency = probe
         return self._available
 
     @property
     def db(self):
+        if self._skipped:
+            return {}
         if self._db is not None:
             return self._db
         primary_repomd = self._get_repomd_by_type(self.PRIMARY_REPOMD_TYPE)
@@ -345,13 +560,25 @@ class RemoteMirrorRepository(MirrorRepository):
             if not fp:
                 FileUtil.rm(file_path, stdio=self.stdio)
                 return []
+            # packages already known by the previous cache are reused, only new ones are parsed
+            previous, previous_source = self._read_db_cache()
+            previous = previous or {}
+            added = []
             self._db = {}
+            self._db_source = MirrorPackageIndex.source_signature(file_path)
             try:
                 parser = cElementTree.iterparse(fp)
                 for event, elem in parser:
                     if RemoteMirrorRepository.ns_cleanup(elem.tag) == 'package' and elem.attrib.get('type') == 'rpm':
-                        info = RemotePackageInfo(elem)
+                        info = previous.pop(self._get_package_checksum(elem), None)
+                        if info is None:
+                            info = RemotePackageInfo(elem)
+                            added.append(info)
                         self._db[info.md5] = info
+                        elem.clear()
+                self.stdio and getattr(self.stdio, 'verbose', print)('%s: %s packages, %s added, %s removed' % (self, len(self._db), len(added), len(previous)))
+                # the delta is only valid for an index of the previous source
+                self._db_delta = (added, list(previous.keys()), previous_source)
                 self._dump_db_cache()
             except:
                 FileUtil.rm(file_path, stdio=self.stdio)
@@ -359,26 +586,66 @@ class RemoteMirrorRepository(MirrorRepository):
                 return []
         return self._db
 
+    @property
+    def index(self):
+        if self._skipped:
+            return None
+        if self._index is None and sqlite3:
+            primary_repomd = self._get_repomd_by_type(self.PRIMARY_REPOMD_TYPE)
+            file_path = self._get_repomd_data_file(primary_repomd) if primary_repomd else None
+            if not file_path:
+                return None
+            index = MirrorPackageIndex(self.get_db_index_file(self.mirror_path), stdio=self.stdio)
+            signature = MirrorPackageIndex.source_signature(file_path)
+            if not index.is_fresh(signature):
+                db = self.db
+                if not db:
+                    return None
+                delta, self._db_delta = self._db_delta, None
+                if not (delta and index.update(delta[0], delta[1], delta[2], signature)) and not index.build(db.values(), signature):
+                    return None
+            self._index = index
+        return self._index
+
+    @staticmethod
+    def _get_package_checksum(elem):
+        for child in elem:
+            if RemoteMirrorRepository.ns_cleanup(child.tag) == 'checksum':
+                return child.text
+        return None
+
+    def _read_db_cache(self):
+        try:
+            db_cacahe_path = self.get_db_cache_file(self.mirror_path)
+            if not os.path.exists(db_cacahe_path):
+                return None, None
+            self.stdio and getattr(self.stdio, 'verbose', print)('load %s' % db_cacahe_path)
+            with open(db_cacahe_path, 'rb') as f:
+                db = pickle.load(f)
+            if self.__VERSION__ > Version(db.get(self.__VERSION_KEY__, '0')):
+                return None, None
+            del db[self.__VERSION_KEY__]
+            return db, db.pop(self.__SOURCE_KEY__, None)
+        except:
+            pass
+        return None, None
+
     def _load_db_cache(self, path):
         try:
             db_cacahe_path = self.get_db_cache_file(self.mirror_path)
             repomd_time = os.stat(path)[8]
             cache_time = os.stat(db_cacahe_path)[8]
             if cache_time > repomd_time:
-                self.stdio and getattr(self.stdio, 'verbose', print)('load %s' % db_cacahe_path)
-                with open(db_cacahe_path, 'rb') as f:
-                    self._db = pickle.load(f)
-                    if self.__VERSION__ > Version(self.db.get(self.__VERSION_KEY__, '0')):
-                        self._db = None
-                    else:
-                        del self._db[self.__VERSION_KEY__]
+                self._db, self._db_source = self._read_db_cache()
         except:
             pass
 
     def _dump_db_cache(self):
         if self._db:
-            data = deepcopy(self.db)
+            # a shallow copy is enough, the infos are only read while pickling
+            data = dict(self._db)
             data[self.__VERSION_KEY__] = self.__VERSION__
+            data[self.__SOURCE_KEY__] = self._db_source
             try:
                 db_cacahe_path = self.get_db_cache_file(self.mirror_path)
                 self.stdio and getattr(self.stdio, 'verbose', print)('dump %s' % db_cacahe_path)
@@ -410,6 +677,14 @@ class RemoteMirrorRepository(MirrorRepository):
     def get_db_cache_file(mirror_path):
         return os.path.join(mirror_path, RemoteMirrorRepository.DB_CACHE_FILE)
 
+    @staticmethod
+    def get_db_index_file(mirror_path):
+        return os.path.join(mirror_path, RemoteMirrorRepository.DB_INDEX_FILE)
+
+    @staticmethod
+    def get_repomd_http_file(mirror_path):
+        return os.path.join(mirror_path, RemoteMirrorRepository.REPOMD_HTTP_FILE)
+
     def _load_repo_age(self):
         try:
             with open(self.get_repo_age_file(self.mirror_path), 'r') as f:
@@ -432,42 +707,134 @@ class RemoteMirrorRepository(MirrorRepository):
             if repodmd.type == repomd_type:
                 return repodmd
 
-    def _get_repomd_data_file(self, repomd):
+    @staticmethod
+    def _file_checksum(path, checksum_type):
+        checksum_type = (checksum_type or '').lower()
+        if checksum_type == 'sha':
+            checksum_type = 'sha1'
+        try:
+            m = hashlib.new(checksum_type)
+        except ValueError:
+            return None
+        with open(path, 'rb') as f:
+            for buf in iter(lambda: f.read(FileUtil.COPY_BUFSIZE), b''):
+                m.update(buf)
+        return m.hexdigest()
+
+    def _is_repomd_data_file_valid(self, repomd, file_path):
+        checksum_type, checksum = repomd.checksum
+        if not checksum:
+            return True
+        value = self._file_checksum(file_path, checksum_type)
+        if value is None or value == checksum:
+            return True
+        self.stdio and getattr(self.stdio, 'verbose', print)('%s checksum mismatch, %s expected but got %s' % (file_path, checksum, value))
+        return False
+
+    def _get_repomd_data_file(self, repomd, verify=False):
         file_name = repomd.location[1]
         repomd_name = file_name.split('-')[-1]
         file_path = os.path.join(self.mirror_path, file_name)
         if os.path.exists(file_path):
-            return file_path
+            if not verify or self._is_repomd_data_file_valid(repomd, file_path):
+                return file_path
         base_url = repomd.location[0] if repomd.location[0] else self.baseurl
         url = '%s/%s' % (base_url, repomd.location[1])
-        if self.download_file(url, file_path, self.stdio):
+        tmp_path = '%s.tmp' % file_path
+        if self.download_file(url, tmp_path, self.stdio, checksum=repomd.checksum) and self._move(tmp_path, file_path):
             return file_path
 
     def update_mirror(self):
         self.stdio and getattr(self.stdio, 'start_loading')('Update %s' % self.name)
-        self.get_repomds(True)
+        primary_repomd = self._get_repomd_by_type(self.PRIMARY_REPOMD_TYPE)
+        old_file_path = os.path.join(self.mirror_path, primary_repomd.location[1]) if primary_repomd else None
+        modified = self._download_repomd()
+        if modified is None or self._skipped:
+            self._available = False
+            self.stdio and getattr(self.stdio, 'stop_loading')('fail')
+            return False
+        self._repomds = None
         primary_repomd = self._get_repomd_by_type(self.PRIMARY_REPOMD_TYPE)
         if not primary_repomd:
             self._available = False
             self.stdio and getattr(self.stdio, 'stop_loading')('fail')
             return False
-        file_path = self._get_repomd_data_file(primary_repomd)
-        if not file_path:
+        # the primary file is only fetched again when its checksum in repomd no longer matches
+        file_path = self._get_repomd_data_file(primary_repomd, verify=modified)
+        if not file_path or self._skipped:
             self._available = False
             self.stdio and getattr(self.stdio, 'stop_loading')('fail')
             return False
-        self._db = None
-        self.repo_age = int(time.time())
-        self._dump_repo_age_data()
+        with self._write_lock:
+            if self._skipped:
+                self.stdio and getattr(self.stdio, 'stop_loading')('fail')
+                return False
+            if old_file_path and old_file_path != file_path:
+                FileUtil.rm(old_file_path, stdio=self.stdio)
+            self.repo_age = int(time.time())
+            self._dump_repo_age_data()
+            self._available = True
+        if modified:
+            self._db = None
+            self._index and self._index.close()
+            self._index = None
         self.stdio and getattr(self.stdio, 'stop_loading')('succeed')
-        self._available = True
         return True
 
+    def _download_repomd(self):
+        # conditional GET, returns True when repomd changed, False when not modified and None on failure
+        path = self.get_repomd_file(self.mirror_path)
+        http_path = self.get_repomd_http_file(self.mirror_path)
+        url = '%s/%s' % (self.baseurl, self.REMOTE_REPOMD_FILE)
+        headers = {}
+        if os.path.exists(path):
+            try:
+                with open(http_path, 'r') as f:
+                    http_meta = json.load(f)
+                if http_meta.get('url') == url:
+                    if http_meta.get('etag'):
+                        headers['If-None-Match'] = http_meta['etag']
+                    if http_meta.get('last_modified'):
+                        headers['If-Modified-Since'] = http_meta['last_modified']
+            except:
+                pass
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=30) as fget:
+                if fget.status_code == 304:
+                    self.stdio and getattr(self.stdio, 'verbose', print)('%s is not modified' % url)
+                    return False
+                fget.raise_for_status()
+                tmp_path = '%s.%s.tmp' % (path, os.getpid())
+                with FileUtil.open(tmp_path, 'wb', stdio=self.stdio) as fw:
+                    for chunk in fget.iter_content(FileUtil.COPY_BUFSIZE):
+                        if self._skipped:
+                            raise Exception('%s is skipped' % self.name)
+                        fw.write(chunk)
+                http_meta = {
+                    'url': url,
+                    'etag': fget.headers.get('ETag'),
+                    'last_modified': fget.headers.get('Last-Modified')
+                }
+            http_tmp_path = '%s.%s.tmp' % (http_path, os.getpid())
+            with open(http_tmp_path, 'w') as f:
+                json.dump(http_meta, f)
+            with self._write_lock:
+                if self._skipped:
+                    raise Exception('%s is skipped' % self.name)
+                os.rename(tmp_path, path)
+                os.rename(http_tmp_path, http_path)
+            return True
+        except:
+            FileUtil.rm('%s.%s.tmp' % (path, os.getpid()))
+            FileUtil.rm('%s.%s.tmp' % (http_path, os.getpid()))
+            self.stdio and getattr(self.stdio, 'warn', print)('Failed to download %s to %s' % (url, path))
+            self.stdio and getattr(self.stdio, 'exception', print)('')
+        return None
+
     def get_repomds(self, update=False):
         path = self.get_repomd_file(self.mirror_path)
         if update or not os.path.exists(path):
-            url = '%s/%s' % (self.baseurl, self.REMOTE_REPOMD_FILE)
-            self.download_file(url, path, self.stdio)
+            self._download_repomd()
             self._repomds = None
         if self._repomds is None:
             self._repomds = []
@@ -482,17 +849,11 @@ class RemoteMirrorRepository(MirrorRepository):
         return self._repomds
 
     def get_all_pkg_info(self):
-        return [self.db[key] for key in self.db]
+        return self._search_pkgs_info()
 
     def get_rpm_info_by_md5(self, md5, **pattern):
-        if md5 in self.db:
-            return self._pattern_check(self.db[md5], **pattern)
-        for key in self.db:
-            info = self.db[key]
-            if info.md5 == md5:
-                self.stdio and getattr(self.stdio, 'verbose', print)('%s translate info %s' % (md5, info.md5))
-                return self._pattern_check(info, **pattern)
-        return None
+        info = self._get_pkg_info_by_md5(md5)
+        return self._pattern_check(info, **pattern) if info else None
 
     def get_rpm_pkg_by_info(self, pkg_info):
         file_name = pkg_info.location[1]
@@ -501,7 +862,7 @@ class RemoteMirrorRepository(MirrorRepository):
         if not os.path.exists(file_path) or os.stat(file_path)[8] < pkg_info.time[1] or os.path.getsize(file_path) != pkg_info.package_size:
             base_url = pkg_info.location[0] if pkg_info.location[0] else self.baseurl
             url = '%s/%s' % (base_url, pkg_info.location[1])
-            if not self.download_file(url, file_path, self.stdio):
+            if not self.download_file(url, file_path, self.stdio, checksum=pkg_info.checksum, file_size=pkg_info.package_size):
                 return None
         return Package(file_path)
     
@@ -538,8 +899,7 @@ class RemoteMirrorRepository(MirrorRepository):
         max_version = ConfigUtil.get_value_from_dict(pattern, 'max_version', transform_func=Version)
         self.stdio and getattr(self.stdio, 'verbose', print)('max_version is %s' % max_version)
         pkgs = []
-        for key in self.db:
-            info = self.db[key]
+        for info in self._search_pkgs_info(name=name, arch=arch):
             if info.name != name:
                 continue
             if info.arch not in arch:
@@ -569,9 +929,9 @@ class RemoteMirrorRepository(MirrorRepository):
         matchs = []
         if 'md5' in pattern and pattern['md5']:
             self.stdio and getattr(self.stdio, 'verbose', print)('md5 is %s' % pattern['md5'])
-            info = None
-            if pattern['md5'] in self.db:
-                info = self._pattern_check(self.db[pattern['md5']], **pattern)
+            info = self._get_pkg_info_by_md5(pattern['md5'])
+            if info:
+                info = self._pattern_check(info, **pattern)
             return [info, (0xfffffffff, )] if info else matchs
         self.stdio and getattr(self.stdio, 'verbose', print)('md5 is None')
         if 'name' not in pattern and not pattern['name']:
@@ -590,8 +950,7 @@ class RemoteMirrorRepository(MirrorRepository):
         else:
             pattern['version'] = None
         self.stdio and getattr(self.stdio, 'verbose', print)('version is %s' % pattern['version'])
-        for key in self.db:
-            info = self.db[key]
+        for info in self._search_pkgs_info(name_contains=pattern['name'], arch=pattern['arch']):
             if pattern['name'] in info.name:
                 score = self.match_score(info, **pattern)
                 if score[0]:
@@ -631,38 +990,115 @@ class RemoteMirrorRepository(MirrorRepository):
             return None
 
     @staticmethod
-    def download_file(url, save_path, stdio=None):
+    def _start_download_progressbar(stdio, save_path, file_size):
+        if not stdio or not file_size:
+            return False
+        for func in ['start_progressbar', 'update_progressbar', 'finish_progressbar']:
+            if getattr(stdio, func, False) is False:
+                return False
+        _, fine_name = os.path.split(save_path)
+        units = {"B": 1, "K": 1<<10, "M": 1<<20, "G": 1<<30, "T": 1<<40}
+        for unit in units:
+            num = file_size / units[unit]
+            if num < 1024:
+                break
+        stdio.start_progressbar('Download %s (%.2f %s)' % (fine_name, num, unit), file_size)
+        return True
+
+    @staticmethod
+    def _download_ranges(url, save_path, part_path, file_size, stdio=None):
+        cls = RemoteMirrorRepository
+        segment = -(-file_size // cls.DOWNLOAD_WORKERS)
+        with open(part_path, 'wb') as f:
+            f.truncate(file_size)
+        lock = threading.Lock()
+        state = {'done': 0, 'errors': []}
+
+        def fetch(start, end):
+            try:
+                with requests.get(url, headers={'Range': 'bytes=%d-%d' % (start, end)}, stream=True, timeout=cls.DOWNLOAD_TIMEOUT) as fget:
+                    if fget.status_code != 206:
+                        raise IOError('%s does not support range requests' % url)
+                    with open(part_path, 'r+b') as fw:
+                        fw.seek(start)
+                        for chunk in fget.iter_content(cls.DOWNLOAD_CHUNK_SIZE):
+                            fw.write(chunk)
+                            with lock:
+                                state['done'] += len(chunk)
+                        if fw.tell() != end + 1:
+                            raise IOError('range %s-%s of %s is incomplete' % (start, end, url))
+            except Exception as e:
+                state['errors'].append(e)
+
+        threads = []
+        for start in range(0, file_size, segment):
+            thread = threading.Thread(target=fetch, args=(start, min(start + segment, file_size) - 1))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        print_bar = cls._start_download_progressbar(stdio, save_path, file_size)
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+                print_bar and stdio.update_progressbar(min(state['done'], file_size))
+        if state['errors']:
+            print_bar and getattr(stdio, 'interrupt_progressbar', print)()
+            # the segments are written out of order, so the part file can not be resumed
+            FileUtil.rm(part_path)
+            raise state['errors'][0]
+        print_bar and stdio.finish_progressbar()
+
+    @staticmethod
+    def _download_part(url, save_path, part_path, stdio=None, file_size=None):
+        cls = RemoteMirrorRepository
+        offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        if file_size and offset >= file_size:
+            offset = 0
+        with requests.get(url, headers={'Range': 'bytes=%d-' % offset}, stream=True, timeout=cls.DOWNLOAD_TIMEOUT) as fget:
+            if fget.status_code == 416 and offset:
+                fget.close()
+                FileUtil.rm(part_path, stdio=stdio)
+                return cls._download_part(url, save_path, part_path, stdio, file_size)
+            fget.raise_for_status()
+            ranged = fget.status_code == 206
+            if not ranged:
+                offset = 0
+            content_range = fget.headers.get('Content-Range', '')
+            if ranged and '/' in content_range and content_range.split('/')[-1].isdigit():
+                total = int(content_range.split('/')[-1])
+            else:
+                total = offset + int(fget.headers.get('Content-Length', 0)) or file_size or 0
+            if ranged and not offset and total >= cls.DOWNLOAD_PARALLEL_SIZE:
+                fget.close()
+                return cls._download_ranges(url, save_path, part_path, total, stdio)
+            if offset:
+                stdio and getattr(stdio, 'verbose', print)('resume %s from %s' % (url, offset))
+            print_bar = cls._start_download_progressbar(stdio, save_path, total)
+            file_done = offset
+            with open(part_path, 'ab' if offset else 'wb') as fw:
+                for chunk in fget.iter_content(cls.DOWNLOAD_CHUNK_SIZE):
+                    fw.write(chunk)
+                    file_done += len(chunk)
+                    if print_bar and file_done <= total:
+                        stdio.update_progressbar(file_done)
+            print_bar and stdio.finish_progressbar()
+
+    @staticmethod
+    def download_file(url, save_path, stdio=None, checksum=None, file_size=None):
+        # the data goes to a .part file first, it is kept on failure so that the next try resumes with a range request
+        part_path = save_path + RemoteMirrorRepository.DOWNLOAD_PART_SUFFIX
         try:
-            with requests.get(url, stream=True) as fget:
-                file_size = int(fget.headers["Content-Length"])
-                if stdio:
-                    print_bar = True
-                    for func in ['start_progressbar', 'update_progressbar', 'finish_progressbar']:
-                        if getattr(stdio, func, False) is False:
-                            print_bar = False
-                            break
-                else:
-                    print_bar = False
-                if print_bar:
-                    _, fine_name = os.path.split(save_path)
-                    units = {"B": 1, "K": 1<<10, "M": 1<<20, "G": 1<<30, "T": 1<<40}
-                    for unit in units:
-                        num = file_size / units[unit]
-                        if num < 1024:
-                            break
-                    stdio.start_progressbar('Download %s (%.2f %s)' % (fine_name, num, unit), file_size)
-                chunk_size = 512
-                file_done = 0
-                with FileUtil.open(save_path, "wb", stdio=stdio) as fw:
-                    for chunk in fget.iter_content(chunk_size):
-                        fw.write(chunk)
-                        file_done = file_done + chunk_size
-                        if print_bar and file_done <= file_size:
-                            stdio.update_progressbar(file_done)
-                    print_bar and stdio.finish_progressbar()
+            DirectoryUtil.mkdir(os.path.dirname(save_path) or '.', stdio=stdio)
+            RemoteMirrorRepository._download_part(url, save_path, part_path, stdio, file_size)
+            if checksum and checksum[1]:
+                value = RemoteMirrorRepository._file_checksum(part_path, checksum[0])
+                if value is not None and value != checksum[1]:
+                    FileUtil.rm(part_path, stdio=stdio)
+                    stdio and getattr(stdio, 'warn', print)('Checksum of %s mismatch: %s expected but got %s' % (url, checksum[1], value))
+                    return False
+            os.rename(part_path, save_path)
             return True
         except:
-            FileUtil.rm(save_path)
             stdio and getattr(stdio, 'warn', print)('Failed to download %s to %s' % (url, save_path))
             stdio and getattr(stdio, 'exception', print)('')
         return False
@@ -671,15 +1107,46 @@ class LocalMirrorRepository(MirrorRepository):
 
     MIRROR_TYPE = MirrorRepositoryType.LOCAL
     _DB_FILE = '.db'
+    _DB_INDEX_FILE = '.db.sqlite'
+    IMPORT_WORKERS = 8
     __VERSION__ = Version("1.0")
 
     def __init__(self, mirror_path, stdio=None):
         super(LocalMirrorRepository, self).__init__(mirror_path, stdio=stdio)
-        self.db = {}
+        self._db = None
+        self._index = None
         self.db_path = os.path.join(mirror_path, self._DB_FILE)
+        self.index_path = os.path.join(mirror_path, self._DB_INDEX_FILE)
         self.enabled = '-'
         self.available = True
-        self._load_db()
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = {}
+            self._load_db()
+        return self._db
+
+    @property
+    def index(self):
+        if self._index is None and sqlite3 and os.path.isfile(self.db_path):
+            index = MirrorPackageIndex(self.index_path, stdio=self.stdio)
+            if not index.is_fresh(MirrorPackageIndex.source_signature(self.db_path)) and not self._build_index(index):
+                return None
+            self._index = index
+        return self._index
+
+    def _build_index(self, index=None):
+        if index is None:
+            index = self._index or MirrorPackageIndex(self.index_path, stdio=self.stdio)
+        return index.build(self.db.values(), MirrorPackageIndex.source_signature(self.db_path))
+
+    def _get_pkg_info_by_md5(self, md5):
+        info = super(LocalMirrorRepository, self)._get_pkg_info_by_md5(md5)
+        return info if info and os.path.exists(info.path) else None
+
+    def _search_pkgs_info(self, **filters):
+        return [info for info in super(LocalMirrorRepository, self)._search_pkgs_info(**filters) if os.path.exists(info.path)]
 
     @property
     def repo_age(self):
@@ -695,6 +1162,23 @@ class LocalMirrorRepository(MirrorRepository):
             self.stdio.exception('')
             pass
         
+    @staticmethod
+    def _file_stat(path):
+        stat = os.stat(path)
+        return (stat.st_size, stat.st_mtime)
+
+    def _is_header_valid(self, info):
+        # the header is parsed once when the package is added, it stays valid while the rpm file is unchanged
+        try:
+            return isinstance(info, Package) and getattr(info, 'file_stat', None) == self._file_stat(info.path)
+        except OSError:
+            return False
+
+    def _load_header(self, path):
+        pkg = Package(path)
+        pkg.file_stat = self._file_stat(path)
+        return pkg
+
     def _flush_db(self, db):
         need_flush = self.__VERSION__ > Version(db.get(self.__VERSION_KEY__, '0')) 
         for key in db:
@@ -702,8 +1186,8 @@ class LocalMirrorRepository(MirrorRepository):
             path = getattr(data, 'path', False)
             if not path or not os.path.exists(path):
                 continue
-            if need_flush:
-                data = Package(path)
+            if need_flush and not self._is_header_valid(data):
+                data = self._load_header(path)
             self.db[key] = data
         if need_flush:
             self._dump_db()
@@ -711,10 +1195,11 @@ class LocalMirrorRepository(MirrorRepository):
     def _dump_db(self):
         # 所有 dump方案都为临时
         try:
-            data = deepcopy(self.db)
+            data = dict(self.db)
             data[self.__VERSION_KEY__] = self.__VERSION__
             with open(self.db_path, 'wb') as f:
                 pickle.dump(data, f)
+            sqlite3 and self._build_index()
             return True
         except:
             self.stdio.exception('')
@@ -722,7 +1207,7 @@ class LocalMirrorRepository(MirrorRepository):
         return False
 
     def exist_pkg(self, pkg):
-        return pkg.md5 in self.db
+        return self._get_pkg_info_by_md5(pkg.md5) is not None
 
     def add_pkg(self, pkg):
         target_path = os.path.join(self.mirror_path, pkg.file_name)
@@ -749,6 +1234,7 @@ class LocalMirrorRepository(MirrorRepository):
             else:
                 self.stdio and getattr(self.stdio, 'error', print)('same file')
                 return None
+            pkg.file_stat = self._file_stat(target_path)
             self.db[pkg.md5] = pkg
             self.stdio and getattr(self.stdio, 'verbose', print)('dump PackageInfo')
             if self._dump_db():
@@ -762,12 +1248,70 @@ class LocalMirrorRepository(MirrorRepository):
             self.stdio and getattr(self.stdio, 'error', print)('Unable to add %s as local mirror' % pkg.file_name)
         return None
 
+    def _import_pkg(self, pkg):
+        target_path = os.path.join(self.mirror_path, pkg.file_name)
+        try:
+            if FileUtil.clone(pkg.path, target_path, stdio=self.stdio):
+                return target_path
+        except:
+            self.stdio and getattr(self.stdio, 'exception', print)('')
+        return None
+
+    def add_pkgs(self, pkgs):
+        # bulk import: the files are linked or copied in parallel and the db is dumped once at the end
+        imports = []
+        targets = set()
+        for pkg in pkgs:
+            target_path = os.path.join(self.mirror_path, pkg.file_name)
+            if target_path == pkg.path:
+                self.stdio and getattr(self.stdio, 'error', print)('same file: %s' % pkg.path)
+                continue
+            if target_path in targets:
+                self.stdio and getattr(self.stdio, 'warn', print)('%s is duplicated, skip %s' % (pkg.file_name, pkg.path))
+                continue
+            targets.add(target_path)
+            imports.append(pkg)
+        if not imports:
+            return None
+
+        workers = min(self.IMPORT_WORKERS, len(imports))
+        pool = ThreadPool(processes=workers)
+        try:
+            results = pool.map(self._import_pkg, imports)
+        finally:
+            pool.close()
+
+        success = True
+        added = []
+        for pkg, target_path in zip(imports, results):
+            if not target_path:
+                self.stdio and getattr(self.stdio, 'error', print)('Unable to add %s as local mirror' % pkg.file_name)
+                success = False
+                continue
+            t_info = self.db.get(pkg.md5)
+            if t_info and t_info.path != target_path and t_info.path not in targets:
+                self.stdio and getattr(self.stdio, 'verbose', print)('remove %s' % t_info.path)
+                FileUtil.rm(t_info.path, stdio=self.stdio)
+            src_path = pkg.path
+            pkg.path = target_path
+            pkg.file_stat = self._file_stat(target_path)
+            self.db[pkg.md5] = pkg
+            added.append((src_path, pkg))
+        self.stdio and getattr(self.stdio, 'verbose', print)('dump PackageInfo')
+        if added and not self._dump_db():
+            return None
+        for src_path, _ in added:
+            self.stdio and getattr(self.stdio, 'print', print)('add %s to local mirror', src_path)
+        return [pkg for _, pkg in added] if success else None
+
     def get_all_pkg_info(self):
-        return [self.db[key] for key in self.db]
+        return self._search_pkgs_info()
 
     def get_rpm_pkg_by_info(self, pkg_info):
         self.stdio and getattr(self.stdio, 'verbose', print)('get RPM package by %s' % pkg_info)
-        return Package(pkg_info.path)
+        if self._is_header_valid(pkg_info):
+            return copy(pkg_info)
+        return self._load_header(pkg_info.path)
 
     def get_pkgs_info(self, **pattern):
         matchs = self.get_pkgs_info_with_score(**pattern)
@@ -778,15 +1322,15 @@ class LocalMirrorRepository(MirrorRepository):
     def get_best_pkg_info(self, **pattern):
         matchs = self.get_pkgs_info_with_score(**pattern)
         if matchs:
-            return Package(max(matchs, key=lambda x: x[1])[0].path)
+            return self.get_rpm_pkg_by_info(max(matchs, key=lambda x: x[1])[0])
         return None
 
     def get_exact_pkg_info(self, **pattern):
         if 'md5' in pattern and pattern['md5']:
             self.stdio and getattr(self.stdio, 'verbose', print)('md5 is %s' % pattern['md5'])
-            info = None
-            if pattern['md5'] in self.db:
-                info = self._pattern_check(self.db[pattern['md5']], **pattern)
+            info = self._get_pkg_info_by_md5(pattern['md5'])
+            if info:
+                info = self._pattern_check(info, **pattern)
             return info
         self.stdio and getattr(self.stdio, 'verbose', print)('md5 is None')
         if 'name' not in pattern and not pattern['name']:
@@ -805,8 +1349,7 @@ class LocalMirrorRepository(MirrorRepository):
         max_version = ConfigUtil.get_value_from_dict(pattern, 'max_version', transform_func=Version)
         self.stdio and getattr(self.stdio, 'verbose', print)('max_version is %s' % max_version)
         pkgs = []
-        for key in self.db:
-            info = self.db[key]
+        for info in self._search_pkgs_info(name=name, arch=arch):
             if info.name != name:
                 continue
             if info.arch not in arch:
@@ -836,9 +1379,9 @@ class LocalMirrorRepository(MirrorRepository):
         matchs = []
         if 'md5' in pattern and pattern['md5']:
             self.stdio and getattr(self.stdio, 'verbose', print)('md5 is %s' % pattern['md5'])
-            info = None
-            if pattern['md5'] in self.db:
-                info = self._pattern_check(self.db[pattern['md5']], **pattern)
+            info = self._get_pkg_info_by_md5(pattern['md5'])
+            if info:
+                info = self._pattern_check(info, **pattern)
             return [info, (0xfffffffff, )] if info else matchs
         self.stdio and getattr(self.stdio, 'verbose', print)('md5 is None')
         if 'name' not in pattern and not pattern['name']:
@@ -856,8 +1399,7 @@ class LocalMirrorRepository(MirrorRepository):
         else:
             pattern['version'] = None
         self.stdio and getattr(self.stdio, 'verbose', print)('version is %s' % pattern['version'])
-        for key in self.db:
-            info = self.db[key]
+        for info in self._search_pkgs_info(name_contains=pattern['name'], arch=pattern['arch']):
             if pattern['name'] in info.name:
                 score = self.match_score(info, **pattern)
                 if score[0]:
@@ -881,7 +1423,7 @@ class LocalMirrorRepository(MirrorRepository):
         return c
 
     def get_info_list(self):
-        return [self.db[key] for key in self.db]
+        return self._search_pkgs_info()
 
 
 class MirrorRepositoryConfig(object):
@@ -912,12 +1454,12 @@ class MirrorRepositorySection(object):
         self.meta_data = meta_data
         self.remote_path = remote_path
 
-    def get_mirror(self, server_vars, stdio=None):
+    def get_mirror(self, server_vars, stdio=None, refresh=True):
         meta_data = self.meta_data
         meta_data['name'] = var_replace(meta_data['name'], server_vars)
         meta_data['baseurl'] = var_replace(meta_data['baseurl'], server_vars)
         mirror_path = os.path.join(self.remote_path, meta_data['name'])
-        mirror = RemoteMirrorRepository(mirror_path, meta_data, stdio)
+        mirror = RemoteMirrorRepository(mirror_path, meta_data, stdio, refresh=refresh)
         return mirror
 
     @property
@@ -928,6 +1470,7 @@ class MirrorRepositorySection(object):
 class MirrorRepositoryManager(Manager):
 
     RELATIVE_PATH = 'mirror'
+    REFRESH_TIMEOUT = 120
 
     def __init__(self, home_path, lock_manager=None, stdio=None):
         super(MirrorRepositoryManager, self).__init__(home_path, stdio=stdio)
@@ -1022,16 +1565,90 @@ class MirrorRepositoryManager(Manager):
             return None
         return repo_conf.sections.get(section_name)
 
-    def get_remote_mirrors(self, is_enabled=True):
+    def get_remote_mirrors(self, is_enabled=True, refresh=True, probe=False):
         self._lock()
         mirrors = []
         for mirror_section in self._get_sections():
             if is_enabled is not None and is_enabled != mirror_section.is_enabled:
                 continue
             _, server_vars = get_use_centos_release(self.stdio)
-            mirrors.append(mirror_section.get_mirror(server_vars, self.stdio))
+            mirrors.append(mirror_section.get_mirror(server_vars, self.stdio, refresh=False))
+        if refresh or probe:
+            self.refresh_mirrors(mirrors, probe=probe)
         return mirrors
 
+    @staticmethod
+    def _refresh_mirror(mirror, update, probe, results):
+        start = time.time()
+        try:
+            probe and mirror.available
+            if update:
+                ret = mirror.update_mirror()
+            else:
+                mirror.refresh()
+                ret = True
+        except:
+            mirror.stdio and getattr(mirror.stdio, 'exception', print)('Fail to synchronize mirror (%s)' % mirror.name)
+            ret = False
+        mirror.refresh_cost = time.time() - start
+        results[mirror] = ret
+
+    def refresh_mirrors(self, mirrors, update=False, probe=False, deadline=None):
+        """
+        Probe and refresh the remote mirrors concurrently. The mirrors that are not finished before the deadline are
+        skipped in this session, their workers are daemon threads so that a hanging mirror never blocks obd.
+        """
+        if update:
+            jobs = [mirror for mirror in mirrors if mirror.enabled]
+        else:
+            jobs = [mirror for mirror in mirrors if mirror.enabled and (probe or mirror.need_refresh())]
+        if not jobs:
+            return True
+        if deadline is None:
+            try:
+                deadline = int(COMMAND_ENV.get(ENV_MIRROR_REFRESH_TIMEOUT, self.REFRESH_TIMEOUT))
+            except ValueError:
+                deadline = self.REFRESH_TIMEOUT
+
+        ios = {}
+        results = {}
+        threads = []
+        for mirror in jobs:
+            ios[mirror] = mirror.stdio
+            mirror.stdio = DeferredIO(mirror.stdio)
+            thread = threading.Thread(target=self._refresh_mirror, args=(mirror, update, probe, results))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        self.stdio and getattr(self.stdio, 'start_loading')('Update %s' % ', '.join([mirror.name for mirror in jobs]) if update or not probe else 'Check remote mirrors')
+        end_time = time.time() + deadline
+        for thread in threads:
+            thread.join(max(0, end_time - time.time()))
+
+        success = True
+        for mirror in jobs:
+            deferred_io = mirror.stdio
+            if mirror not in results:
+                # the worker may still be running, it must neither print nor touch the mirror files any more
+                mirror.skip()
+                mirror.stdio = DeferredIO(discard=True)
+                deferred_io.replay(ios[mirror])
+                self.stdio and getattr(self.stdio, 'warn', print)('%s is not refreshed in %ss, skip it in this session' % (mirror.name, deadline))
+                success = False
+                continue
+            mirror.stdio = ios[mirror]
+            deferred_io.replay()
+            success = results[mirror] and success
+            self.stdio and getattr(self.stdio, 'verbose', print)('%s: available %s, latency %s, refresh %.0f ms' % (
+                mirror.name,
+                mirror._available,
+                '%.0f ms' % (mirror.latency * 1000) if mirror.latency is not None else '-',
+                mirror.refresh_cost * 1000
+            ))
+        self.stdio and getattr(self.stdio, 'stop_loading')('succeed' if success else 'fail')
+        return success
+
     def get_mirrors(self, is_enabled=True):
         self._lock()
         mirrors = self.get_remote_mirrors(is_enabled=is_enabled)
@@ -1105,6 +1722,42 @@ class MirrorRepositoryManager(Manager):
         self.stdio and getattr(self.stdio, 'print', print)('%s' % pkg)
         return self.local_mirror.add_pkg(pkg)
 
+    def _load_local_package(self, src):
+        try:
+            return Package(src)
+        except:
+            self.stdio and getattr(self.stdio, 'exception', print)('')
+            self.stdio and getattr(self.stdio, 'error', print)('failed to extract info from %s' % src)
+        return None
+
+    def add_local_mirrors(self, srcs, force=False):
+        self._lock()
+        for src in srcs:
+            if not os.path.isfile(src):
+                self.stdio and getattr(self.stdio, 'error', print)('No such file: %s' % (src))
+                return None
+        self.stdio and getattr(self.stdio, 'verbose', print)('load %s RPM headers' % len(srcs))
+        workers = min(LocalMirrorRepository.IMPORT_WORKERS, len(srcs))
+        pool = ThreadPool(processes=workers)
+        try:
+            pkgs = pool.map(self._load_local_package, srcs)
+        finally:
+            pool.close()
+        if None in pkgs:
+            return None
+
+        existed = [pkg for pkg in pkgs if self.local_mirror.exist_pkg(pkg)]
+        if existed and not force:
+            if not self.stdio:
+                return None
+            if not getattr(self.stdio, 'confirm', False):
+                return None
+            if not self.stdio.confirm('mirror %s existed. Do you want to overwrite?' % ', '.join([pkg.file_name for pkg in existed])):
+                return None
+        for pkg in pkgs:
+            self.stdio and getattr(self.stdio, 'print', print)('%s' % pkg)
+        return self.local_mirror.add_pkgs(pkgs)
+
     def set_remote_mirror_enabled(self, section_name, enabled=True):
         self._lock()
         op = 'Enable' if enabled else 'Disable'
@@ -24,15 +24,19 @@ import os
 import re
 import sys
 import time
+import pickle
 import inspect2
 from enum import Enum
 from glob import glob
 from copy import deepcopy, copy
+from multiprocessing.pool import ThreadPool
 
 from _manager import Manager
+from _stdio import DeferredIO
 from _rpm import Version, get_prefix_version, add_sub_version
+from const import VERSION
 from ssh import ConcurrentExecutor
-from tool import ConfigUtil, DynamicLoading, YamlLoader, FileUtil
+from tool import ConfigUtil, DynamicLoading, YamlLoader, FileUtil, OrderedDict
 from _types import *
 
 
@@ -147,6 +151,9 @@ class PluginReturn(object):
 
 class PluginContext(object):
 
+    # max number of servers handled at the same time by concurrent_run
+    MAX_CONCURRENT_SERVERS = 32
+
     def __init__(self, plugin_name, namespace, namespaces, deploy_name, deploy_status, repositories, components, clients, cluster_config, cmd, options, dev_mode, stdio):
         self.namespace = namespace
         self.namespaces = namespaces
@@ -161,7 +168,7 @@ class PluginContext(object):
         self.options = options
         self.dev_mode = dev_mode
         self.stdio = stdio
-        self.concurrent_executor = ConcurrentExecutor(32)
+        self.concurrent_executor = ConcurrentExecutor()
         self._return = PluginReturn()
 
     def get_return(self, plugin_name=None, spacename=None):
@@ -191,6 +198,93 @@ class PluginContext(object):
     def set_variable(self, name, value):
         self.namespace.set_variable(name, value)
 
+    def concurrent_run(self, func, servers=None, workers=None, **kwargs):
+        """
+        Run `func(server_context, server, **kwargs)` for every server over a bounded thread pool.
+
+        Every call gets its own ServerPluginContext whose stdio and clients buffer the output of that server.
+        The buffered output is replayed once all the servers are done, in the order of `servers`.
+
+        :param func: the per-server callable. It reports the result by server_context.return_true/return_false or returns a PluginReturn
+        :param servers: the servers to run on. default is cluster_config.servers
+        :param workers: the max number of servers handled at the same time
+        :return: an OrderedDict which maps every server to its PluginReturn, in the order of `servers`
+        """
+        if servers is None:
+            servers = self.cluster_config.servers
+        servers = list(servers)
+        rets = OrderedDict()
+        if not servers:
+            return rets
+        if self.cluster_config:
+            # server configs are cached lazily, resolve them on the calling thread before dispatching
+            for server in servers:
+                self.cluster_config.get_server_conf(server)
+        contexts = [ServerPluginContext(self, server) for server in servers]
+
+        def run(context):
+            try:
+                ret = func(context, context.server, **kwargs)
+                if isinstance(ret, PluginReturn):
+                    context.set_server_return(ret)
+            except Exception as e:
+                context.stdio.exception('%s %s RuntimeError: %s' % (self.plugin_name, context.server, e))
+                context.return_false(exception=e)
+            return context
+
+        workers = min(len(servers), workers or self.MAX_CONCURRENT_SERVERS)
+        if workers < 2:
+            results = [run(context) for context in contexts]
+        else:
+            pool = ThreadPool(processes=workers)
+            try:
+                results = pool.map(run, contexts)
+            finally:
+                pool.close()
+        for context in results:
+            context.stdio.replay(self.stdio)
+            rets[context.server] = context.get_server_return()
+        return rets
+
+
+class ServerPluginContext(PluginContext):
+
+    """The plugin context handed to a per-server task of PluginContext.concurrent_run"""
+
+    # the fields which are only read, and so can be shared with the context of the plugin
+    SHARED_FIELDS = (
+        'namespace', 'namespaces', 'deploy_name', 'deploy_status', 'repositories', 'plugin_name',
+        'components', 'cluster_config', 'cmds', 'options', 'dev_mode'
+    )
+
+    def __init__(self, plugin_context, server):
+        for name in self.SHARED_FIELDS:
+            setattr(self, name, getattr(plugin_context, name))
+        self.server = server
+        self.concurrent_executor = ConcurrentExecutor()
+        self.stdio = DeferredIO(plugin_context.stdio)
+        self.clients = {}
+        for key, client in plugin_context.clients.items():
+            if isinstance(client, ScriptPlugin.ClientForScriptPlugin):
+                client = client.client
+            self.clients[key] = ScriptPlugin.ClientForScriptPlugin(client, self.stdio)
+        self._return = PluginReturn()
+
+    def return_true(self, *args, **kwargs):
+        self._return.return_true(*args, **kwargs)
+
+    def return_false(self, *args, **kwargs):
+        self._return.return_false(*args, **kwargs)
+
+    def set_server_return(self, plugin_return):
+        self._return = plugin_return
+
+    def get_server_return(self):
+        return self._return
+
+    def concurrent_run(self, func, servers=None, workers=None, **kwargs):
+        raise RuntimeError('concurrent_run can not be nested')
+
 
 class SubIO(object):
 
@@ -302,7 +396,12 @@ def pyScriptPluginExec(func):
                         stdio and getattr(stdio, 'verbose', print)('plugin %s target_servers: %s' % (self, target_servers))
                         del kwargs['target_servers']
                 try:
-                    ret = method(self.context, *arg, **kwargs)
+                    if cluster_config:
+                        # coalesce the config writes made by the plugin into a single dump
+                        with cluster_config.transaction():
+                            ret = method(self.context, *arg, **kwargs)
+                    else:
+                        ret = method(self.context, *arg, **kwargs)
                     if ret is None and self.context and self.context.get_return() is None:
                         run_result[method_name]['result'] = False
                         self.context.return_false()
@@ -355,13 +454,12 @@ class PyScriptPlugin(ScriptPlugin):
 
     def _import(self, stdio=None):
         if self.module is None:
-            DynamicLoading.add_libs_path(self.libs_path)
-            self.module = DynamicLoading.import_module(self.PLUGIN_NAME, stdio)
+            script_path = os.path.join(self.plugin_path, '%s.py' % self.PLUGIN_NAME)
+            self.module = DynamicLoading.load_source(script_path, self.libs_path, stdio)
 
     def _export(self, stdio=None):
-        if self.module:
-            DynamicLoading.remove_libs_path(self.libs_path)
-            DynamicLoading.export_module(self.PLUGIN_NAME, stdio)
+        # modules are cached by DynamicLoading for the life of the process
+        pass
 
 # this is PyScriptPlugin demo
 # class InitPlugin(PyScriptPlugin):
@@ -461,115 +559,188 @@ class ParamPlugin(Plugin):
     PLUGIN_TYPE = PluginType.PARAM
     DEF_PARAM_YAML = 'parameter.yaml'
     FLAG_FILE = DEF_PARAM_YAML
+    # compiled parameter.yaml, rebuilt when the yaml changes or the format version is bumped
+    PARAM_CACHE_FILE = '.parameter.cache'
+    PARAM_CACHE_VERSION = 1
+    TYPES = {
+        'DOUBLE': Double,
+        'BOOL': Boolean,
+        'INT': Integer,
+        'STRING': String,
+        'PATH': Path,
+        'PATH_LIST': PathList,
+        'SAFE_STRING': SafeString,
+        'SAFE_STRING_LIST': SafeStringList,
+        'MOMENT': Moment,
+        'TIME': Time,
+        'CAPACITY': Capacity,
+        'CAPACITY_MB': CapacityMB,
+        'STRING_LIST': StringList,
+        'DICT': Dict,
+        'LIST': List,
+        'PARAM_LIST': StringOrKvList,
+        'DB_URL': DBUrl,
+        'WEB_URL': WebUrl,
+        'OB_USER': OBUser
+    }
+    ITEM_FIELDS = (
+        ('default', None),
+        ('min_value', None),
+        ('max_value', None),
+        ('modify_limit', None),
+        ('require', False),
+        ('section', ""),
+        ('essential', False),
+        ('need_reload', False),
+        ('need_restart', False),
+        ('need_redeploy', False),
+        ('description_en', None),
+        ('description_local', None),
+    )
 
     def __init__(self, component_name, plugin_path, version, dev_mode):
         super(ParamPlugin, self).__init__(component_name, plugin_path, version, dev_mode)
         self.def_param_yaml_path = os.path.join(self.plugin_path, self.DEF_PARAM_YAML)
+        self.param_cache_path = os.path.join(self.plugin_path, self.PARAM_CACHE_FILE)
         self._src_data = None
+        self._schema = None
         self._need_redploy_items = None
         self._had_modify_limit_items = None
         self._need_restart_items = None
         self._params_default = None
 
+    @staticmethod
+    def _plain_value(value):
+        # drop the round-trip yaml types so that the schema pickles to builtins only
+        if isinstance(value, dict):
+            return dict((ParamPlugin._plain_value(k), ParamPlugin._plain_value(v)) for k, v in value.items())
+        if isinstance(value, (list, tuple)):
+            return [ParamPlugin._plain_value(v) for v in value]
+        if isinstance(value, bool) or value is None:
+            return value
+        for _type in (int, float, str):
+            if isinstance(value, _type):
+                return _type(value)
+        return value
+
+    def _source_key(self):
+        stat = os.stat(self.def_param_yaml_path)
+        return [stat.st_size, getattr(stat, 'st_mtime_ns', stat.st_mtime)]
+
+    def _build_item(self, conf):
+        return ParamPlugin.ConfigItem(
+            name=conf['name'],
+            param_type=self.TYPES.get(conf['type'], String),
+            **dict((key, conf[key]) for key, _ in self.ITEM_FIELDS)
+        )
+
+    def _compile_schema(self):
+        items = OrderedDict()
+        with open(self.def_param_yaml_path, 'rb') as f:
+            configs = yaml.load(f)
+            for conf in configs:
+                try:
+                    item = {
+                        'name': self._plain_value(conf['name']),
+                        'type': ConfigUtil.get_value_from_dict(conf, 'type', 'STRING').upper()
+                    }
+                    for key, default in self.ITEM_FIELDS:
+                        item[key] = self._plain_value(conf[key]) if key in conf else default
+                    items[item['name']] = (item, self._build_item(item))
+                except:
+                    pass
+        items = list(items.values())
+        return {
+            'version': self.PARAM_CACHE_VERSION,
+            'key': self._source_key(),
+            'md5': FileUtil.checksum(self.def_param_yaml_path).decode(),
+            'items': [item for item, _ in items],
+            'redeploy': [conf.name for _, conf in items if conf.need_redeploy],
+            'restart': [conf.name for _, conf in items if conf.need_restart],
+            'modify_limit': [conf.name for _, conf in items if conf.had_modify_limit],
+            'default': dict((conf.name, conf.default) for _, conf in items),
+        }
+
+    def _load_schema_cache(self):
+        if not os.path.isfile(self.param_cache_path):
+            return None
+        try:
+            with open(self.param_cache_path, 'rb') as f:
+                schema = pickle.load(f)
+            if schema.get('version') != self.PARAM_CACHE_VERSION:
+                return None
+            key = self._source_key()
+            if schema['key'] != key:
+                # touched or copied, reuse it only if the content is the same
+                if schema['md5'] != FileUtil.checksum(self.def_param_yaml_path).decode():
+                    return None
+                schema['key'] = key
+                self._dump_schema_cache(schema)
+            return schema
+        except:
+            return None
+
+    def _dump_schema_cache(self, schema):
+        tmp_path = '%s.%s.tmp' % (self.param_cache_path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(schema, f, protocol=2)
+            os.rename(tmp_path, self.param_cache_path)
+        except:
+            # plugin directory may be read-only
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @property
+    def schema(self):
+        if self._schema is None:
+            schema = self._load_schema_cache()
+            if schema is None:
+                try:
+                    schema = self._compile_schema()
+                    self._dump_schema_cache(schema)
+                except:
+                    schema = {'items': [], 'redeploy': [], 'restart': [], 'modify_limit': [], 'default': {}}
+            self._schema = schema
+        return self._schema
+
     @property
     def params(self):
         if self._src_data is None:
-            try:
-                TYPES = {
-                    'DOUBLE': Double,
-                    'BOOL': Boolean,
-                    'INT': Integer,
-                    'STRING': String,
-                    'PATH': Path,
-                    'PATH_LIST': PathList,
-                    'SAFE_STRING': SafeString,
-                    'SAFE_STRING_LIST': SafeStringList,
-                    'MOMENT': Moment,
-                    'TIME': Time,
-                    'CAPACITY': Capacity,
-                    'CAPACITY_MB': CapacityMB,
-                    'STRING_LIST': StringList,
-                    'DICT': Dict,
-                    'LIST': List,
-                    'PARAM_LIST': StringOrKvList,
-                    'DB_URL': DBUrl,
-                    'WEB_URL': WebUrl,
-                    'OB_USER': OBUser
-                }
-                self._src_data = {}
-                with open(self.def_param_yaml_path, 'rb') as f:
-                    configs = yaml.load(f)
-                    for conf in configs:
-                        try:
-                            param_type = ConfigUtil.get_value_from_dict(conf, 'type', 'STRING').upper()
-                            if param_type in TYPES:
-                                param_type = TYPES[param_type]
-                            else:
-                                param_type = String
-
-                            self._src_data[conf['name']] = ParamPlugin.ConfigItem(
-                                name=conf['name'],
-                                param_type=param_type,
-                                default=ConfigUtil.get_value_from_dict(conf, 'default', None),
-                                min_value=ConfigUtil.get_value_from_dict(conf, 'min_value', None),
-                                max_value=ConfigUtil.get_value_from_dict(conf, 'max_value', None),
-                                modify_limit=ConfigUtil.get_value_from_dict(conf, 'modify_limit', None),
-                                require=ConfigUtil.get_value_from_dict(conf, 'require', False),
-                                section=ConfigUtil.get_value_from_dict(conf, 'section', ""),
-                                essential=ConfigUtil.get_value_from_dict(conf, 'essential', False),
-                                need_reload=ConfigUtil.get_value_from_dict(conf, 'need_reload', False),
-                                need_restart=ConfigUtil.get_value_from_dict(conf, 'need_restart', False),
-                                need_redeploy=ConfigUtil.get_value_from_dict(conf, 'need_redeploy', False),
-                                description_en=ConfigUtil.get_value_from_dict(conf, 'description_en', None),
-                                description_local=ConfigUtil.get_value_from_dict(conf, 'description_local', None),
-                            )
-                        except:
-                            pass
-            except:
-                pass
+            self._src_data = {}
+            for conf in self.schema['items']:
+                try:
+                    self._src_data[conf['name']] = self._build_item(conf)
+                except:
+                    pass
         return self._src_data
 
+    def _get_items(self, names):
+        params = self.params
+        return [params[name] for name in names if name in params]
+
     @property
     def redploy_params(self):
         if self._need_redploy_items is None:
-            self._need_redploy_items = []
-            params = self.params
-            for name in params:
-                conf = params[name]
-                if conf.need_redeploy:
-                    self._need_redploy_items.append(conf)
+            self._need_redploy_items = self._get_items(self.schema['redeploy'])
         return self._need_redploy_items
 
     @property
     def modify_limit_params(self):
         if self._had_modify_limit_items is None:
-            self._had_modify_limit_items = []
-            params = self.params
-            for name in params:
-                conf = params[name]
-                if conf.had_modify_limit:
-                    self._had_modify_limit_items.append(conf)
+            self._had_modify_limit_items = self._get_items(self.schema['modify_limit'])
         return self._had_modify_limit_items
 
     @property
     def restart_params(self):
         if self._need_restart_items is None:
-            self._need_restart_items = []
-            params = self.params
-            for name in params:
-                conf = params[name]
-                if conf.need_restart:
-                    self._need_restart_items.append(conf)
+            self._need_restart_items = self._get_items(self.schema['restart'])
         return self._need_restart_items
 
     @property
     def params_default(self):
         if self._params_default is None:
-            self._params_default = {}
-            params = self.params
-            for name in params:
-                conf = params[name]
-                self._params_default[conf.name] = conf.default
+            self._params_default = self.schema['default']
         return self._params_default
 
 
@@ -804,11 +975,104 @@ class InstallPlugin(Plugin):
         return [requirement_map[k] for k in requirement_map]
 
 
+class PluginIndex(object):
+
+    # component -> version -> plugin files of the plugin repository
+    INDEX_FILE = '.index'
+    INDEX_VERSION = 3
+
+    def __init__(self, path, stdio=None):
+        self.path = path
+        self.index_path = os.path.join(path, self.INDEX_FILE)
+        self.stdio = stdio
+        self._components = None
+
+    @staticmethod
+    def _mtime(stat):
+        return getattr(stat, 'st_mtime_ns', stat.st_mtime)
+
+    def _file_signature(self, plugin_path):
+        # a file edited in place does not change the mtime of its directory
+        files = []
+        for file_name in sorted(os.listdir(plugin_path)):
+            if file_name.startswith('.'):
+                continue
+            stat = os.stat(os.path.join(plugin_path, file_name))
+            files.append([file_name, stat.st_size, self._mtime(stat)])
+        return files
+
+    def _signature(self):
+        # rebuilt with every obd version. A plugin version added or removed changes the mtime of its component directory,
+        # a plugin file added, removed or edited changes the signature of its version directory
+        signature = [VERSION, self.INDEX_VERSION]
+        if os.path.isdir(self.path):
+            for component_name in sorted(os.listdir(self.path)):
+                component_path = os.path.join(self.path, component_name)
+                if not os.path.isdir(component_path):
+                    continue
+                versions = []
+                for version in sorted(os.listdir(component_path)):
+                    plugin_path = os.path.join(component_path, version)
+                    if os.path.isdir(plugin_path):
+                        versions.append([version, self._mtime(os.stat(plugin_path)), self._file_signature(plugin_path)])
+                signature.append([component_name, self._mtime(os.stat(component_path)), versions])
+        return signature
+
+    def _build(self):
+        components = {}
+        for component_name in os.listdir(self.path):
+            component_path = os.path.join(self.path, component_name)
+            if not os.path.isdir(component_path):
+                continue
+            versions = components[component_name] = {}
+            for version in os.listdir(component_path):
+                plugin_path = os.path.join(component_path, version)
+                if not os.path.isdir(plugin_path):
+                    continue
+                versions[version] = set([
+                    file_name for file_name in os.listdir(plugin_path)
+                    if not file_name.startswith('.') and os.path.isfile(os.path.join(plugin_path, file_name))
+                ])
+        return components
+
+    def _load(self):
+        signature = self._signature()
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = pickle.load(f)
+            if data['signature'] == signature:
+                return data['components']
+        except:
+            pass
+        self.stdio and getattr(self.stdio, 'verbose', print)('build plugin index of %s' % self.path)
+        components = self._build() if os.path.isdir(self.path) else {}
+        tmp_path = '%s.%s.tmp' % (self.index_path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'signature': signature, 'components': components}, f, protocol=2)
+            os.rename(tmp_path, self.index_path)
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return components
+
+    @property
+    def components(self):
+        if self._components is None:
+            self._components = self._load()
+        return self._components
+
+    def get_flag_paths(self, component_name, flag_file):
+        component_path = os.path.join(self.path, component_name)
+        versions = self.components.get(component_name, {})
+        return [os.path.join(component_path, version, flag_file) for version in versions if flag_file in versions[version]]
+
+
 class ComponentPluginLoader(object):
 
     PLUGIN_TYPE = None
 
-    def __init__(self, home_path, plugin_type=PLUGIN_TYPE, dev_mode=False, stdio=None):
+    def __init__(self, home_path, plugin_type=PLUGIN_TYPE, dev_mode=False, stdio=None, index=None):
         if plugin_type:
             self.PLUGIN_TYPE = plugin_type
         if not self.PLUGIN_TYPE:
@@ -820,11 +1084,18 @@ class ComponentPluginLoader(object):
         self.stdio = stdio
         self.path = home_path
         self.component_name = os.path.split(self.path)[1]
+        self.index = index
         self._plugins = {}
 
+    def _get_flag_paths(self):
+        # plugins are edited in place under dev mode, so always look at the disk there
+        if self.index and not self.dev_mode:
+            return self.index.get_flag_paths(self.component_name, self.plguin_cls.FLAG_FILE)
+        return glob('%s/*/%s' % (self.path, self.plguin_cls.FLAG_FILE))
+
     def get_plugins(self):
         plugins = []
-        for flag_path in glob('%s/*/%s' % (self.path, self.plguin_cls.FLAG_FILE)):
+        for flag_path in self._get_flag_paths():
             if flag_path in self._plugins:
                 plugins.append(self._plugins[flag_path])
             else:
@@ -863,7 +1134,7 @@ class PyScriptPluginLoader(ComponentPluginLoader):
 
     PLUGIN_TYPE = PluginType.PY_SCRIPT
 
-    def __init__(self, home_path, script_name=None, dev_mode=False, stdio=None):
+    def __init__(self, home_path, script_name=None, dev_mode=False, stdio=None, index=None):
         if not script_name:
             raise NotImplementedError
         type_name = 'PY_SCRIPT_%s' % script_name.upper()
@@ -871,32 +1142,22 @@ class PyScriptPluginLoader(ComponentPluginLoader):
         self.PLUGIN_TYPE = PyScriptPluginLoader.PyScriptPluginType(type_name, type_value)
         if not getattr(sys.modules[__name__], type_value, False):
             self._create_(script_name)
-        super(PyScriptPluginLoader, self).__init__(home_path, dev_mode=dev_mode, stdio=stdio)
+        super(PyScriptPluginLoader, self).__init__(home_path, dev_mode=dev_mode, stdio=stdio, index=index)
 
     def _create_(self, script_name):
-        exec('''
-class %s(PyScriptPlugin):
-
-    FLAG_FILE = '%s.py'
-    PLUGIN_NAME = '%s'
-
-    def __init__(self, component_name, plugin_path, version, dev_mode):
-        super(%s, self).__init__(component_name, plugin_path, version, dev_mode)
-
-    @staticmethod
-    def set_plugin_type(plugin_type):
-        %s.PLUGIN_TYPE = plugin_type
-
-    @pyScriptPluginExec
-    def %s(
-        self, namespace, namespaces, deploy_name, deploy_status,
-        repositories, components, clients, cluster_config, cmd,
-        options, stdio, *arg, **kwargs):
-        pass
-        ''' % (self.PLUGIN_TYPE.value, script_name, script_name, self.PLUGIN_TYPE.value, self.PLUGIN_TYPE.value, script_name))
-        clz = locals()[self.PLUGIN_TYPE.value]
+        def plugin_func(
+            self, namespace, namespaces, deploy_name, deploy_status,
+            repositories, components, clients, cluster_config, cmd,
+            options, stdio, *arg, **kwargs):
+            pass
+        clz = type(self.PLUGIN_TYPE.value, (PyScriptPlugin, ), {
+            'FLAG_FILE': '%s.py' % script_name,
+            'PLUGIN_NAME': script_name,
+            'PLUGIN_TYPE': self.PLUGIN_TYPE,
+            '__module__': __name__,
+            script_name: pyScriptPluginExec(plugin_func),
+        })
         setattr(sys.modules[__name__], self.PLUGIN_TYPE.value, clz)
-        clz.set_plugin_type(self.PLUGIN_TYPE)
         return clz
 
 
@@ -908,6 +1169,7 @@ class PluginManager(Manager):
     def __init__(self, home_path, dev_mode=False, stdio=None):
         super(PluginManager, self).__init__(home_path, stdio=stdio)
         self.dev_mode = dev_mode
+        self._index = None
         self.component_plugin_loaders = {}
         self.py_script_plugin_loaders = {}
         for plugin_type in PluginType:
@@ -916,12 +1178,20 @@ class PluginManager(Manager):
         # Log off the PyScriptPluginLoader in component_plugin_loaders
         del self.component_plugin_loaders[PluginType.PY_SCRIPT]
 
+    @property
+    def index(self):
+        if self.dev_mode:
+            return None
+        if self._index is None:
+            self._index = PluginIndex(self.path, self.stdio)
+        return self._index
+
     def get_best_plugin(self, plugin_type, component_name, version):
         if plugin_type not in self.component_plugin_loaders:
             return None
         loaders = self.component_plugin_loaders[plugin_type]
         if component_name not in loaders:
-            loaders[component_name] = ComponentPluginLoader(os.path.join(self.path, component_name), plugin_type, self.dev_mode, self.stdio)
+            loaders[component_name] = ComponentPluginLoader(os.path.join(self.path, component_name), plugin_type, self.dev_mode, self.stdio, self.index)
         loader = loaders[component_name]
         return loader.get_best_plugin(version)
 
@@ -934,6 +1204,6 @@ class PluginManager(Manager):
             self.py_script_plugin_loaders[script_name] = {}
         loaders = self.py_script_plugin_loaders[script_name]
         if component_name not in loaders:
-            loaders[component_name] = PyScriptPluginLoader(os.path.join(self.path, component_name), script_name, self.dev_mode, self.stdio)
+            loaders[component_name] = PyScriptPluginLoader(os.path.join(self.path, component_name), script_name, self.dev_mode, self.stdio, self.index)
         loader = loaders[component_name]
         return loader.get_best_plugin(version)
@@ -0,0 +1,89 @@
+# coding: utf-8
+# OceanBase Deploy.
+# Copyright (C) 2021 OceanBase
+#
+# This file is part of OceanBase Deploy.
+#
+# OceanBase Deploy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OceanBase Deploy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+import atexit
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+
+class ImportProfiler(object):
+
+    # wraps __import__ and reports the modules that cost the most to load, like `python -X importtime`
+    def __init__(self, limit=30, stream=None):
+        self.limit = limit
+        self.stream = stream
+        self.records = []
+        self._stack = []
+        self._import = None
+        self._start_time = None
+
+    def install(self):
+        if self._import is None:
+            self._import = builtins.__import__
+            builtins.__import__ = self._profile_import
+            self._start_time = time.time()
+            atexit.register(self.report)
+
+    def uninstall(self):
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+    def _profile_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level == 0 and name in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+        count = len(sys.modules)
+        self._stack.append(0)
+        start_time = time.time()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            cost = time.time() - start_time
+            children = self._stack.pop()
+            if len(sys.modules) != count:
+                self.records.append((self._module_name(name, globals, level), cost, cost - children, len(self._stack)))
+                if self._stack:
+                    self._stack[-1] += cost
+
+    @staticmethod
+    def _module_name(name, globals, level):
+        if level and globals:
+            package = globals.get('__package__') or globals.get('__name__', '')
+            if level > 1:
+                package = package.rsplit('.', level - 1)[0]
+            name = '%s.%s' % (package, name) if name else package
+        return name
+
+    def report(self):
+        self.uninstall()
+        stream = self.stream or sys.stderr
+        total = time.time() - self._start_time
+        imports = sum([record[1] for record in self.records if record[3] == 0])
+        stream.write('import profile: %.1f ms in imports, %.1f ms in total\n' % (imports * 1000, total * 1000))
+        stream.write('%10s %10s  %s\n' % ('self(ms)', 'cum(ms)', 'module'))
+        for name, cost, self_cost, depth in sorted(self.records, key=lambda record: record[1], reverse=True)[:self.limit]:
+            stream.write('%10.1f %10.1f  %s%s\n' % (self_cost * 1000, cost * 1000, '  ' * depth, name))
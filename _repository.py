@@ -24,14 +24,16 @@ import os
 import sys
 import time
 import hashlib
+import threading
 from glob import glob
 from multiprocessing import cpu_count
-from multiprocessing.pool import Pool
+from multiprocessing.pool import ThreadPool
 
 from _deploy import DeployStatus
 from _rpm import Package, PackageInfo, Version
 from _arch import getBaseArch
-from _environ import ENV_DISABLE_PARALLER_EXTRACT
+from _environ import ENV_DISABLE_PARALLER_EXTRACT, ENV_PAYLOAD_CACHE_SIZE
+from _types import Capacity
 from const import PKG_REPO_FILE
 from ssh import LocalClient
 from tool import DirectoryUtil, FileUtil, YamlLoader, COMMAND_ENV
@@ -123,6 +125,7 @@ class LocalPackage(Package):
         filelinktos = []
         dirnames_map = {}
         m_sum = hashlib.md5()
+        checksums = FileUtil.checksums([path for path in self.files.values() if not os.path.islink(path)])
         for src_path in self.files:
             target_path = self.files[src_path]
             dirname, basename = os.path.split(src_path)
@@ -138,7 +141,7 @@ class LocalPackage(Package):
                     filelinktos.append(os.readlink(target_path))
                     filemodes.append(-24065)
                 else:
-                    m_value = FileUtil.checksum(target_path)
+                    m_value = checksums[target_path]
                     m_sum.update(m_value)
                     filemd5s.append(m_value)
                     filelinktos.append('')
@@ -187,23 +190,28 @@ class Extractor(object):
 
 class ParallerExtractor(object):
 
+    """
+    Extract the payload in a single pass: the cpio archive is decompressed once and walked
+    sequentially, small members are handed to a pool of writer threads, large ones are
+    streamed to disk directly so memory stays bounded.
+    """
+
     MAX_PARALLER = cpu_count() * 2 if cpu_count() else 8
-    MAX_SIZE = 100
-    MIN_SIZE = 20
+    MAX_PENDING = 64
+    CHUNK_SIZE = 1 << 20
+    CPIO_HEADER_SIZE = 110
+    CPIO_MAGICS = (b'070701', b'070702')
+    CPIO_TRAILER = 'TRAILER!!!'
 
     def __init__(self, pkg, files, stdio=None):
         self.pkg = pkg
         self.files = files
         self.stdio = stdio
-    
-    @staticmethod
-    def _extract(worker):
-        return worker.extract()
 
     def extract(self):
         if not self.files:
             return
-        
+
         if sys.version_info.major == 2 or COMMAND_ENV.get(ENV_DISABLE_PARALLER_EXTRACT, False):
             return self._single()
         else:
@@ -216,50 +224,274 @@ class ParallerExtractor(object):
             self.files,
             stdio=self.stdio
         ).extract()
-        
+
     def _paraller(self):
-        self.stdio and getattr(self.stdio, 'verbose', print)('extract mode: paraller')
-        workers = []
-        file_num = len(self.files)
-        paraller = int(min(self.MAX_PARALLER, file_num))
-        size = min(self.MAX_SIZE, int(file_num / paraller)) # 
-        size = int(max(self.MIN_SIZE, size))
-        index = 0
-        while index < file_num:
-            p_index = index + size
-            workers.append(Extractor(
-                self.pkg,
-                self.files[index:p_index],
-                stdio=self.stdio
-            ))
-            index = p_index
-        
-        pool = Pool(processes=paraller)
-        try:
-            results = pool.map(ParallerExtractor._extract, workers)
-            for r in results:
-                if not r:
-                    return False
+        files = {}
+        for info in self.files:
+            if not os.path.exists(info.target_path):
+                files[self._member_name(info.src_path)] = info
+        if not files:
             return True
+        with self.pkg.open() as rpm:
+            stream = getattr(rpm, 'data_file', None)
+            if stream is None:
+                # local packages have no cpio payload, their files are copied as is
+                return self._single()
+            self.stdio and getattr(self.stdio, 'verbose', print)('extract mode: stream')
+            return self._extract_stream(stream, files)
+
+    @staticmethod
+    def _member_name(name):
+        if name.startswith('./'):
+            return name[2:]
+        return name.lstrip('/')
+
+    @staticmethod
+    def _padding(offset):
+        return (4 - offset % 4) % 4
+
+    def _skip(self, stream, size):
+        while size > 0:
+            buf = stream.read(min(size, self.CHUNK_SIZE))
+            if not buf:
+                raise IOError('unexpected end of payload in %s' % self.pkg.path)
+            size -= len(buf)
+
+    def _read(self, stream, size):
+        data = stream.read(size)
+        if len(data) != size:
+            raise IOError('unexpected end of payload in %s' % self.pkg.path)
+        return data
+
+    def _write(self, info, data, pending=None):
+        try:
+            with FileUtil.open(info.target_path, 'wb', stdio=self.stdio) as f:
+                f.write(data)
+            if info.mode != 0o744:
+                os.chmod(info.target_path, info.mode)
+        finally:
+            pending and pending.release()
+
+    def _copy(self, src_info, info):
+        FileUtil.copy(src_info.target_path, info.target_path, stdio=self.stdio)
+        if info.mode != 0o744:
+            os.chmod(info.target_path, info.mode)
+
+    def _write_stream(self, stream, info, size):
+        with FileUtil.open(info.target_path, 'wb', stdio=self.stdio) as f:
+            while size > 0:
+                buf = self._read(stream, min(size, self.CHUNK_SIZE))
+                f.write(buf)
+                size -= len(buf)
+        if info.mode != 0o744:
+            os.chmod(info.target_path, info.mode)
+
+    def _extract_stream(self, stream, files):
+        pending = threading.BoundedSemaphore(self.MAX_PENDING)
+        pool = ThreadPool(processes=int(min(self.MAX_PARALLER, len(files))))
+        results = []
+        # hard links of newc: only the last entry of an inode carries the data, the earlier ones are empty
+        links = {}
+        offset = 0
+        try:
+            while files or links:
+                header = stream.read(self.CPIO_HEADER_SIZE)
+                if len(header) < self.CPIO_HEADER_SIZE:
+                    break
+                if header[:6] not in self.CPIO_MAGICS:
+                    raise IOError('bad cpio magic %r in %s' % (header[:6], self.pkg.path))
+                nlink = int(header[38:46], 16)
+                file_size = int(header[54:62], 16)
+                name_size = int(header[94:102], 16)
+                name = self._read(stream, name_size).rstrip(b'\0').decode('utf-8', 'replace')
+                offset += self.CPIO_HEADER_SIZE + name_size
+                padding = self._padding(offset)
+                self._skip(stream, padding)
+                offset += padding
+                if name == self.CPIO_TRAILER:
+                    break
+
+                info = files.pop(self._member_name(name), None)
+                infos = [info] if info else []
+                if nlink > 1:
+                    # ino, devmajor and devminor
+                    link_key = header[6:14] + header[62:78]
+                    if not file_size:
+                        infos and links.setdefault(link_key, []).extend(infos)
+                        continue
+                    infos = links.pop(link_key, []) + infos
+                if not infos:
+                    self._skip(stream, file_size)
+                elif file_size > self.CHUNK_SIZE:
+                    self._write_stream(stream, infos[0], file_size)
+                    for link_info in infos[1:]:
+                        self._copy(infos[0], link_info)
+                else:
+                    data = self._read(stream, file_size)
+                    for link_info in infos:
+                        pending.acquire()
+                        results.append(pool.apply_async(self._write, (link_info, data, pending)))
+                offset += file_size
+                padding = self._padding(offset)
+                self._skip(stream, padding)
+                offset += padding
+            # hard links without any data are empty files
+            for link_key in links:
+                for info in links[link_key]:
+                    pending.acquire()
+                    results.append(pool.apply_async(self._write, (info, b'', pending)))
+            for result in results:
+                result.get()
         except KeyboardInterrupt:
-            if pool:
-                pool.close()
-                pool = None
+            pool.terminate()
+            raise
         except:
             self.stdio and getattr(self.stdio, 'exception', print)('')
+            return False
         finally:
-            pool and pool.close()
-        return False
+            pool.close()
+            pool.join()
+        if files:
+            self.stdio and getattr(self.stdio, 'error', print)('%s not found in %s' % (', '.join(sorted(files)), self.pkg.path))
+            return False
+        return True
+
+
+class PayloadCache(Manager):
+
+    """
+    Size-bounded LRU cache of extracted payload files keyed by package md5. A package loaded into
+    several repositories is decompressed once, later loads hard-link (or reflink) from the cache.
+    The mtime of an entry directory records its last use, eviction is driven by `obd mirror clean`.
+    """
+
+    RELATIVE_PATH = 'cache/payload'
+    TMP_DIR = '.tmp'
+    DEFAULT_MAX_SIZE = '5G'
+
+    def __init__(self, home_path, stdio=None):
+        super(PayloadCache, self).__init__(home_path, stdio=stdio)
+        self._max_size = None
+
+    @property
+    def max_size(self):
+        if self._max_size is None:
+            value = COMMAND_ENV.get(ENV_PAYLOAD_CACHE_SIZE, self.DEFAULT_MAX_SIZE)
+            try:
+                self._max_size = Capacity(value).btyes
+            except:
+                self.stdio and getattr(self.stdio, 'warn', print)('invalid %s: %s, use %s' % (ENV_PAYLOAD_CACHE_SIZE, value, self.DEFAULT_MAX_SIZE))
+                self._max_size = Capacity(self.DEFAULT_MAX_SIZE).btyes
+        return self._max_size
+
+    @property
+    def enabled(self):
+        return self.is_init and self.max_size > 0
+
+    def entry_path(self, md5):
+        return os.path.join(self.path, md5)
+
+    def install(self, pkg, files):
+        entry = self.entry_path(pkg.md5)
+        cached = []
+        for info in files:
+            cached.append(ExtractFileInfo(
+                info.src_path,
+                os.path.join(entry, ParallerExtractor._member_name(info.src_path)),
+                info.mode
+            ))
+        missing = [info for info in cached if not os.path.exists(info.target_path)]
+        if missing:
+            self.stdio and getattr(self.stdio, 'verbose', print)('payload cache miss: %s files of %s' % (len(missing), pkg.md5))
+            if not self._fill(pkg, missing):
+                return False
+        else:
+            self.stdio and getattr(self.stdio, 'verbose', print)('payload cache hit: %s' % pkg.md5)
+        # nothing is cached for an empty file list
+        if os.path.isdir(entry):
+            os.utime(entry, None)
+        for src, info in zip(cached, files):
+            if not os.path.exists(info.target_path):
+                self._link(src.target_path, info.target_path)
+        return True
+
+    def _fill(self, pkg, files):
+        # extract into a private staging dir first so an interrupted load never leaves partial files in the cache
+        staging = os.path.join(self.path, self.TMP_DIR, '%s-%s' % (pkg.md5, os.getpid()))
+        DirectoryUtil.rm(staging, self.stdio)
+        staged = []
+        for info in files:
+            staged.append(ExtractFileInfo(
+                info.src_path,
+                os.path.join(staging, os.path.relpath(info.target_path, self.path)),
+                info.mode
+            ))
+        try:
+            if ParallerExtractor(pkg, staged, stdio=self.stdio).extract() is False:
+                return False
+            for src, info in zip(staged, files):
+                if not DirectoryUtil.mkdir(os.path.dirname(info.target_path), stdio=self.stdio):
+                    return False
+                os.rename(src.target_path, info.target_path)
+            return True
+        finally:
+            DirectoryUtil.rm(staging, self.stdio)
+
+    def _link(self, src, dst):
+        DirectoryUtil.mkdir(os.path.dirname(dst), stdio=self.stdio)
+        if not FileUtil.clone(src, dst, stdio=self.stdio):
+            raise IOError('failed to copy %s to %s' % (src, dst))
+
+    @staticmethod
+    def _entry_size(path):
+        size = 0
+        for root, _, names in os.walk(path):
+            for name in names:
+                size += os.lstat(os.path.join(root, name)).st_size
+        return size
+
+    def get_entries(self):
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+        for md5 in os.listdir(self.path):
+            path = self.entry_path(md5)
+            if md5 == self.TMP_DIR or not os.path.isdir(path):
+                continue
+            entries.append((os.stat(path).st_mtime, md5, self._entry_size(path)))
+        entries.sort(reverse=True)
+        return entries
+
+    def remove(self, md5s):
+        ret = True
+        for md5 in md5s:
+            ret = DirectoryUtil.rm(self.entry_path(md5), self.stdio) and ret
+        return ret
+
+    def evict(self, max_size=None):
+        if max_size is None:
+            max_size = self.max_size
+        total = 0
+        evicted = []
+        for _, md5, size in self.get_entries():
+            total += size
+            if total > max_size:
+                evicted.append(md5)
+        DirectoryUtil.rm(os.path.join(self.path, self.TMP_DIR), self.stdio)
+        self.remove(evicted)
+        return evicted
 
 
 class Repository(PackageInfo):
     
     _DATA_FILE = '.data'
+    _MANIFEST_FILE = '.manifest'
 
-    def __init__(self, name, repository_dir, stdio=None):
+    def __init__(self, name, repository_dir, stdio=None, payload_cache=None):
         self.repository_dir = repository_dir
         super(Repository, self).__init__(name, None, None, None, None, None)
         self.stdio = stdio
+        self.payload_cache = payload_cache
         self._load()
     
     @property
@@ -282,6 +514,40 @@ class Repository(PackageInfo):
         path = os.readlink(self.repository_dir) if os.path.islink(self.repository_dir) else self.repository_dir
         return os.path.join(path, Repository._DATA_FILE)
 
+    @property
+    def manifest_file_path(self):
+        return os.path.join(os.path.dirname(self.data_file_path), Repository._MANIFEST_FILE)
+
+    @staticmethod
+    def parse_manifest(content):
+        manifest = {}
+        for line in content.split('\n'):
+            digest, _, path = line.partition('  ')
+            if digest and path:
+                manifest[path] = digest
+        return manifest
+
+    def get_manifest(self):
+        """
+        Return the content hash of each file in the repository: {relative path: digest}.
+        The manifest is generated from the rpm file digests in load_pkg. An empty dict is returned if there is no manifest.
+        """
+        try:
+            with open(self.manifest_file_path, 'r') as f:
+                return self.parse_manifest(f.read())
+        except:
+            return {}
+
+    def _dump_manifest(self, manifest):
+        try:
+            with open(self.manifest_file_path, 'w') as f:
+                for path in sorted(manifest):
+                    f.write('%s  %s\n' % (manifest[path], path))
+            return True
+        except:
+            self.stdio and getattr(self.stdio, 'exception', print)('dump manifest to %s failed' % self.manifest_file_path)
+        return False
+
     def bin_list(self, plugin):
         files = []
         if self.version and self.hash:
@@ -398,6 +664,7 @@ class Repository(PackageInfo):
                                 break
                 
                 need_extract_files = []
+                manifest = {}
                 for src_path in need_files:
                     if src_path not in files:
                         raise Exception('%s not found in packge' % src_path)
@@ -406,6 +673,7 @@ class Repository(PackageInfo):
                         return
                     idx = files[src_path]
                     if filemd5s[idx]:
+                        manifest[need_files[src_path]] = format_str(filemd5s[idx])
                         need_extract_files.append(ExtractFileInfo(
                             src_path,
                             target_path,
@@ -416,7 +684,11 @@ class Repository(PackageInfo):
                     else:
                         raise Exception('%s is directory' % src_path)
                 
-                ParallerExtractor(pkg, need_extract_files, stdio=self.stdio).extract()
+                if self.payload_cache and self.payload_cache.enabled and not isinstance(pkg, LocalPackage):
+                    if not self.payload_cache.install(pkg, need_extract_files):
+                        raise Exception('failed to extract %s' % pkg.path)
+                elif ParallerExtractor(pkg, need_extract_files, stdio=self.stdio).extract() is False:
+                    raise Exception('failed to extract %s' % pkg.path)
 
                 for link in links:
                     self.stdio and getattr(self.stdio, 'verbose', print)('link %s to %s' % (links[link], link))
@@ -433,7 +705,7 @@ class Repository(PackageInfo):
             self.arch = pkg.arch
             self.size = pkg.size
             self.install_time = time.time()
-            if self._dump():
+            if self._dump_manifest(manifest) and self._dump():
                 return True
             else:
                 self.clear()
@@ -533,6 +805,7 @@ class RepositoryManager(Manager):
         self.repositories = {}
         self.component_repositories = {}
         self.lock_manager = lock_manager
+        self.payload_cache = PayloadCache(home_path, stdio=stdio)
 
     def _lock(self, read_only=False):
         if self.lock_manager:
@@ -629,7 +902,7 @@ class RepositoryManager(Manager):
         if path not in self.repositories:
             self._lock()
             self._mkdir(path)
-            repository = Repository(name, path, self.stdio)
+            repository = Repository(name, path, self.stdio, payload_cache=self.payload_cache)
             self.repositories[path] = repository
         return self.repositories[path]
 
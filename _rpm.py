@@ -40,48 +40,85 @@ if sys.version_info.major == 2:
 
 class Version(str):
 
+    __slots__ = ()
+    # parsed sort keys are shared by every instance of the same version string
+    _CMP_KEYS = {}
+    _CMP_KEYS_LIMIT = 1 << 16
+    _CMP_PATTERN = re.compile('(\d+)([^\._]*)')
+
     def __init__(self, bytes_or_buffer, encoding=None, errors=None):
         super(Version, self).__init__()
 
+    @classmethod
+    def _parse_cmp_key(cls, value):
+        return tuple((int(_i), _s) for _i, _s in cls._CMP_PATTERN.findall(value))
+
+    @classmethod
+    def _get_cmp_key(cls, value):
+        keys = cls._CMP_KEYS
+        key = keys.get(value)
+        if key is None:
+            if len(keys) >= cls._CMP_KEYS_LIMIT:
+                keys.clear()
+            key = keys[value] = cls._parse_cmp_key(value)
+        return key
+
+    @property
+    def __cmp_key__(self):
+        return self._get_cmp_key(str.__str__(self))
+
     @property
     def __cmp_value__(self):
-        return [(int(_i), _s) for _i, _s in re.findall('(\d+)([^\._]*)', self.__str__())]
+        return list(self.__cmp_key__)
+
+    def _other_cmp_key(self, value):
+        if type(value) is type(self):
+            return value.__cmp_key__
+        return self._get_cmp_key(str(value))
 
     def __eq__(self, value):
         if value is None:
             return False
-        return self.__cmp_value__ == self.__class__(value).__cmp_value__
+        return self.__cmp_key__ == self._other_cmp_key(value)
 
     def __gt__(self, value):
         if value is None:
             return True
-        return self.__cmp_value__ > self.__class__(value).__cmp_value__
+        return self.__cmp_key__ > self._other_cmp_key(value)
 
     def __ge__(self, value):
         if value is None:
             return True
-        return self.__eq__(value) or self.__gt__(value)
+        return self.__cmp_key__ >= self._other_cmp_key(value)
 
     def __lt__(self, value):
         if value is None:
             return False
-        return self.__cmp_value__ < self.__class__(value).__cmp_value__
+        return self.__cmp_key__ < self._other_cmp_key(value)
 
     def __le__(self, value):
         if value is None:
             return False
-        return self.__eq__(value) or self.__lt__(value)
+        return self.__cmp_key__ <= self._other_cmp_key(value)
 
 
 class Release(Version):
 
+    __slots__ = ()
+    _CMP_KEYS = {}
+    _CMP_PATTERN = re.compile('(\d+)')
+
+    @classmethod
+    def _parse_cmp_key(cls, value):
+        m = cls._CMP_PATTERN.search(value)
+        return int(m.group(0)) if m else -1
+
     @property
     def __cmp_value__(self):
-        m = re.search('(\d+)', self.__str__())
-        return int(m.group(0)) if m else -1
+        return self.__cmp_key__
 
     def simple(self):
-        m = re.search('(\d+)', self.__str__())
+        m = self._CMP_PATTERN.search(self.__str__())
         return m.group(0) if m else ""
 
 class PackageInfo(object):
@@ -105,7 +142,7 @@ class PackageInfo(object):
 
     @property
     def __cmp_value__(self):
-        return [self.version, self.release]
+        return (self.version.__cmp_key__, self.release.__cmp_key__)
 
     def __hash__(self):
         return hash(self.md5)
@@ -36,7 +36,7 @@ from halo import Halo, cursor
 from colorama import Fore
 from prettytable import PrettyTable
 from progressbar import AdaptiveETA, Bar, SimpleProgress, ETA, FileTransferSpeed, Percentage, ProgressBar
-from types import MethodType
+from types import FunctionType
 from inspect2 import Parameter
 
 from log import Logger
@@ -832,6 +832,58 @@ class FakeReturn(object):
 FAKE_RETURN = FakeReturn()
 
 
+class DeferredIO(object):
+
+    """
+    Record the messages of a task running on a worker thread and replay them later, so that
+    the output of concurrent tasks is printed in a deterministic order
+    """
+
+    MSG_FUNCS = ['print', 'warn', 'error', 'critical', 'verbose', 'print_list']
+    SYNC_FUNCS = [
+        'start_loading', 'stop_loading', 'update_loading_text',
+        'start_progressbar', 'update_progressbar', 'finish_progressbar', 'interrupt_progressbar'
+    ]
+
+    def __init__(self, io=None, discard=False):
+        self.io = io
+        # a discarding DeferredIO drops the messages, e.g. for the tasks which are abandoned
+        self.discard = discard
+        self._records = []
+
+    def _record(self, func):
+        def record(*args, **kwargs):
+            self.discard or self._records.append((func, args, kwargs))
+        return record
+
+    def exception(self, msg='', *args, **kwargs):
+        if self.discard:
+            return
+        msg and self._records.append(('error', (msg, ) + args, kwargs))
+        self._records.append(('verbose', (traceback.format_exc(), ), {}))
+
+    def sub_io(self, *args, **kwargs):
+        return self
+
+    def replay(self, io=None):
+        io = io or self.io
+        records, self._records = self._records, []
+        if io is None:
+            return
+        for func, args, kwargs in records:
+            getattr(io, func, print)(*args, **kwargs)
+
+    def __getattr__(self, item):
+        if item.startswith('__'):
+            return super(DeferredIO, self).__getattribute__(item)
+        if item in self.MSG_FUNCS:
+            return self._record(item)
+        if item in self.SYNC_FUNCS:
+            # loading animations and progress bars belong to the thread that started the concurrent tasks
+            return FAKE_RETURN
+        return getattr(self.io, item, FAKE_RETURN)
+
+
 class StdIO(object):
 
     def __init__(self, io=None):
@@ -866,8 +918,24 @@ def get_stdio(io_obj):
         return FAKE_IO
     elif isinstance(io_obj, StdIO):
         return io_obj
-    else:
-        return StdIO(io_obj)
+    # the wrapper is kept on the io object itself, so it lives exactly as long as the io object
+    stdio = getattr(io_obj, '_std_io', None)
+    if isinstance(stdio, StdIO) and stdio.io is io_obj:
+        return stdio
+    stdio = StdIO(io_obj)
+    try:
+        io_obj._std_io = stdio
+    except AttributeError:
+        pass
+    return stdio
+
+
+def _get_stdio_index(func):
+    parameters = inspect2.signature(func).parameters
+    if "stdio" not in parameters:
+        return None, None
+    default = parameters["stdio"].default
+    return list(parameters.keys()).index("stdio"), None if default is Parameter.empty else default
 
 
 def safe_stdio_decorator(default_stdio=None):
@@ -879,23 +947,15 @@ def safe_stdio_decorator(default_stdio=None):
             is_bond_method = True
             _type = type(func)
             func = func.__func__
-        all_parameters = inspect2.signature(func).parameters
-        if "stdio" in all_parameters:
-            default_stdio_in_params = all_parameters["stdio"].default
-            if not isinstance(default_stdio_in_params, Parameter.empty):
-                _default_stdio = default_stdio_in_params or default_stdio
+        _index, default_stdio_in_params = _get_stdio_index(func)
+        if _index is not None:
+            _default_stdio = default_stdio_in_params or default_stdio
 
             def func_wrapper(*args, **kwargs):
-                _params_keys = list(all_parameters.keys())
-                _index = _params_keys.index("stdio")
                 if "stdio" not in kwargs and len(args) > _index:
-                    stdio = get_stdio(args[_index])
-                    tmp_args = list(args)
-                    tmp_args[_index] = stdio
-                    args = tuple(tmp_args)
+                    args = args[:_index] + (get_stdio(args[_index]), ) + args[_index + 1:]
                 else:
-                    stdio = get_stdio(kwargs.get("stdio", _default_stdio))
-                    kwargs["stdio"] = stdio
+                    kwargs["stdio"] = get_stdio(kwargs.get("stdio", _default_stdio))
                 return func(*args, **kwargs)
             return _type(func_wrapper) if is_bond_method else func_wrapper
         else:
@@ -903,20 +963,43 @@ def safe_stdio_decorator(default_stdio=None):
     return decorated
 
 
+def safe_stdio_method(func):
+    # the stdio of a method defaults to the stdio of its instance, the parameter index is resolved once here
+    if getattr(func, '__safe_stdio__', False):
+        return func
+    _index, default_stdio_in_params = _get_stdio_index(func)
+    if _index is None:
+        return func
+
+    def method_wrapper(*args, **kwargs):
+        if "stdio" in kwargs:
+            kwargs["stdio"] = get_stdio(kwargs["stdio"])
+        elif len(args) > _index:
+            args = args[:_index] + (get_stdio(args[_index]), ) + args[_index + 1:]
+        else:
+            kwargs["stdio"] = get_stdio(default_stdio_in_params or getattr(args[0], "stdio", None))
+        return func(*args, **kwargs)
+    method_wrapper.__name__ = func.__name__
+    method_wrapper.__doc__ = func.__doc__
+    method_wrapper.__wrapped__ = func
+    method_wrapper.__safe_stdio__ = True
+    return method_wrapper
+
+
 class SafeStdioMeta(type):
 
     @staticmethod
     def _init_wrapper_func(func):
+        if getattr(func, '__safe_stdio__', False):
+            return func
+        func = safe_stdio_decorator(FAKE_IO)(func)
+
         def wrapper(*args, **kwargs):
-            setattr(args[0], "_wrapper_func", {})
-            safe_stdio_decorator(FAKE_IO)(func)(*args, **kwargs)
+            func(*args, **kwargs)
             if "stdio" in args[0].__dict__:
                 args[0].__dict__["stdio"] = get_stdio(args[0].__dict__["stdio"])
-
-        if func.__name__ != wrapper.__name__:
-            return wrapper
-        else:
-            return func
+        wrapper.__safe_stdio__ = True
+        return wrapper
 
     def __new__(mcs, name, bases, attrs):
 
@@ -925,36 +1008,23 @@ class SafeStdioMeta(type):
                 continue
             if isinstance(attr, (staticmethod, classmethod)):
                 attrs[key] = safe_stdio_decorator()(attr)
+            elif isinstance(attr, FunctionType):
+                attrs[key] = safe_stdio_method(attr)
         cls = type.__new__(mcs, name, bases, attrs)
+        # methods inherited from bases which are not safe stdio classes
+        for base in cls.__mro__[1:]:
+            if isinstance(base, SafeStdioMeta):
+                continue
+            for key, attr in base.__dict__.items():
+                if key.startswith("__") and key.endswith("__"):
+                    continue
+                if isinstance(attr, FunctionType) and getattr(cls, key, None) is attr:
+                    wrapped = safe_stdio_method(attr)
+                    if wrapped is not attr:
+                        setattr(cls, key, wrapped)
         cls.__init__ = mcs._init_wrapper_func(cls.__init__)
         return cls
 
 
-class _StayTheSame(object):
-    pass
-
-
-STAY_THE_SAME = _StayTheSame()
-
-
 class SafeStdio(six.with_metaclass(SafeStdioMeta)):
-    _wrapper_func = {}
-
-    def __getattribute__(self, item):
-        _wrapper_func = super(SafeStdio, self).__getattribute__("_wrapper_func")
-        if item not in _wrapper_func:
-            attr = super(SafeStdio, self).__getattribute__(item)
-            if (not item.startswith("__") or not item.endswith("__")) and isinstance(attr, MethodType):
-                if "stdio" in inspect2.signature(attr).parameters:
-                    _wrapper_func[item] = safe_stdio_decorator(default_stdio=getattr(self, "stdio", None))(attr)
-                    return _wrapper_func[item]
-            _wrapper_func[item] = STAY_THE_SAME
-            return attr
-        if _wrapper_func[item] is STAY_THE_SAME:
-            return super(SafeStdio, self).__getattribute__(item)
-        return _wrapper_func[item]
-
-    def __setattr__(self, key, value):
-        if key in self._wrapper_func:
-            del self._wrapper_func[key]
-        return super(SafeStdio, self).__setattr__(key, value)
+    pass
@@ -0,0 +1,81 @@
+# coding: utf-8
+# OceanBase Deploy.
+# Copyright (C) 2021 OceanBase
+#
+# This file is part of OceanBase Deploy.
+#
+# OceanBase Deploy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OceanBase Deploy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Cold-start benchmark of common obd subcommands.
+
+    python benchmark/cli_startup.py [-n repeat] [subcommand ...]
+
+Every subcommand runs in a fresh interpreter against a temporary OBD_HOME.
+Run with OBD_PROFILE_IMPORT=1 to get the import profile of each subcommand.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = [
+    '--help',
+    'cluster --help',
+    'env show',
+    'display-trace 5e6f8a1c-0000-11ee-8000-000000000000',
+    'mirror list',
+    'cluster list',
+]
+
+
+def cold_start(args, env, repeat):
+    costs = []
+    stderr = None if env.get('OBD_PROFILE_IMPORT') == '1' else subprocess.STDOUT
+    for _ in range(repeat):
+        start = time.time()
+        subprocess.call([sys.executable, os.path.join(ROOT, '_cmd.py')] + args, env=env, stdout=open(os.devnull, 'w'), stderr=stderr)
+        costs.append(time.time() - start)
+    costs.sort()
+    return costs[0], costs[len(costs) // 2]
+
+
+def main(argv):
+    repeat = 5
+    if argv[:1] == ['-n']:
+        repeat = int(argv[1])
+        argv = argv[2:]
+    commands = argv or COMMANDS
+    home = tempfile.mkdtemp(prefix='obd_startup_')
+    env = os.environ.copy()
+    env['OBD_HOME'] = home
+    try:
+        print('%-60s %10s %10s' % ('command', 'min(ms)', 'median(ms)'))
+        for command in commands:
+            best, median = cold_start(command.split(), env, repeat)
+            print('%-60s %10.1f %10.1f' % ('obd ' + command, best * 1000, median * 1000))
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
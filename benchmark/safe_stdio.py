@@ -0,0 +1,147 @@
+# coding: utf-8
+# OceanBase Deploy.
+# Copyright (C) 2021 OceanBase
+#
+# This file is part of OceanBase Deploy.
+#
+# OceanBase Deploy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OceanBase Deploy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Per-call overhead of the stdio injection of SafeStdio methods.
+
+    python benchmark/safe_stdio.py [calls]
+
+Compares a plain method, the legacy SafeStdio that resolved the stdio parameter
+through __getattribute__ and inspect2 on attribute access, and the current one.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inspect2
+from types import MethodType
+
+from _stdio import IO, SafeStdio, get_stdio
+
+
+def legacy_safe_stdio_decorator(default_stdio=None):
+
+    def decorated(func):
+        all_parameters = inspect2.signature(func).parameters
+        if "stdio" in all_parameters:
+            _default_stdio = all_parameters["stdio"].default or default_stdio
+
+            def func_wrapper(*args, **kwargs):
+                _params_keys = list(all_parameters.keys())
+                _index = _params_keys.index("stdio")
+                if "stdio" not in kwargs and len(args) > _index:
+                    stdio = get_stdio(args[_index])
+                    tmp_args = list(args)
+                    tmp_args[_index] = stdio
+                    args = tuple(tmp_args)
+                else:
+                    stdio = get_stdio(kwargs.get("stdio", _default_stdio))
+                    kwargs["stdio"] = stdio
+                return func(*args, **kwargs)
+            return func_wrapper
+        return func
+    return decorated
+
+
+class LegacySafeStdio(object):
+
+    _STAY_THE_SAME = object()
+
+    def __init__(self):
+        self._wrapper_func = {}
+
+    def __getattribute__(self, item):
+        _wrapper_func = super(LegacySafeStdio, self).__getattribute__("_wrapper_func")
+        if item not in _wrapper_func:
+            attr = super(LegacySafeStdio, self).__getattribute__(item)
+            if (not item.startswith("__") or not item.endswith("__")) and isinstance(attr, MethodType):
+                if "stdio" in inspect2.signature(attr).parameters:
+                    _wrapper_func[item] = legacy_safe_stdio_decorator(default_stdio=getattr(self, "stdio", None))(attr)
+                    return _wrapper_func[item]
+            _wrapper_func[item] = LegacySafeStdio._STAY_THE_SAME
+            return attr
+        if _wrapper_func[item] is LegacySafeStdio._STAY_THE_SAME:
+            return super(LegacySafeStdio, self).__getattribute__(item)
+        return _wrapper_func[item]
+
+
+class Plain(object):
+
+    def __init__(self, stdio):
+        self.stdio = stdio
+
+    def execute(self, command, timeout=None, stdio=None):
+        return stdio
+
+
+class Legacy(LegacySafeStdio):
+
+    def __init__(self, stdio):
+        super(Legacy, self).__init__()
+        self.stdio = stdio
+
+    def execute(self, command, timeout=None, stdio=None):
+        return stdio
+
+
+class Current(SafeStdio):
+
+    def __init__(self, stdio):
+        self.stdio = stdio
+
+    def execute(self, command, timeout=None, stdio=None):
+        return stdio
+
+
+def bench_call(obj, calls):
+    stdio = obj.stdio
+    start = time.time()
+    for _ in range(calls):
+        obj.execute('ls')
+        obj.execute('ls', stdio=stdio)
+    return (time.time() - start) / calls / 2
+
+
+def bench_attribute(obj, calls):
+    start = time.time()
+    for _ in range(calls):
+        obj.stdio
+        obj.stdio
+    return (time.time() - start) / calls / 2
+
+
+def main(argv):
+    calls = int(argv[0]) if argv else 200000
+    stdio = IO(1)
+    for case, bench in [('method call', bench_call), ('attribute access', bench_attribute)]:
+        plain = min(bench(Plain(stdio), calls) for _ in range(3))
+        legacy = min(bench(Legacy(stdio), calls) for _ in range(3))
+        current = min(bench(Current(stdio), calls) for _ in range(3))
+        print('%-20s plain %8.3f us, legacy %8.3f us (%.1fx), current %8.3f us (%.1fx)' % (
+            case, plain * 1e6, legacy * 1e6, legacy / plain, current * 1e6, current / plain))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,138 @@
+# coding: utf-8
+# OceanBase Deploy.
+# Copyright (C) 2021 OceanBase
+#
+# This file is part of OceanBase Deploy.
+#
+# OceanBase Deploy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OceanBase Deploy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Micro-benchmark of Version/Release comparisons over a mirror index.
+
+    python benchmark/version_compare.py [primary.xml[.gz] ...]
+
+Without arguments the primary files of the remote mirrors under ~/.obd are used,
+and a synthetic index is generated if there are none.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import re
+import sys
+import gzip
+import time
+import random
+from glob import glob
+from xml.etree import cElementTree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _rpm import Version, Release
+
+
+class LegacyVersion(str):
+
+    @property
+    def __cmp_value__(self):
+        return [(int(_i), _s) for _i, _s in re.findall('(\d+)([^\._]*)', self.__str__())]
+
+    def __eq__(self, value):
+        if value is None:
+            return False
+        return self.__cmp_value__ == self.__class__(value).__cmp_value__
+
+    def __gt__(self, value):
+        if value is None:
+            return True
+        return self.__cmp_value__ > self.__class__(value).__cmp_value__
+
+    def __lt__(self, value):
+        if value is None:
+            return False
+        return self.__cmp_value__ < self.__class__(value).__cmp_value__
+
+
+class LegacyRelease(LegacyVersion):
+
+    @property
+    def __cmp_value__(self):
+        m = re.search('(\d+)', self.__str__())
+        return int(m.group(0)) if m else -1
+
+
+def load_versions(paths):
+    pairs = []
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            for _, elem in cElementTree.iterparse(f):
+                if elem.tag.split('}')[-1] == 'version':
+                    pairs.append((elem.attrib.get('ver', ''), elem.attrib.get('rel', '')))
+                    elem.clear()
+    return pairs
+
+
+def synthetic_versions(count=20000):
+    random.seed(0)
+    pairs = []
+    for _ in range(count):
+        version = '.'.join([str(random.randint(0, 4)) for _ in range(4)])
+        release = '%s.el%s' % (random.randint(1, 200000000), random.choice([7, 8]))
+        pairs.append((version, release))
+    return pairs
+
+
+def bench(name, func, repeat=3):
+    cost = min(timeit(func) for _ in range(repeat))
+    print('%-40s %10.2f ms' % (name, cost * 1000))
+    return cost
+
+
+def timeit(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def run(pairs, version_cls, release_cls):
+    versions = [version_cls(v) for v, _ in pairs]
+    keys = [(version_cls(v), release_cls(r)) for v, r in pairs]
+    pivot = version_cls('4.2.0.0')
+    return {
+        'sort': lambda: sorted(keys),
+        'max': lambda: max(keys),
+        'range filter': lambda: [v for v in versions if v > pivot and v < '5.0'],
+    }
+
+
+def main(argv):
+    paths = argv or glob(os.path.join(os.path.expanduser('~'), '.obd', 'mirror', 'remote', '*', 'repodata', '*primary.xml*'))
+    pairs = load_versions(paths) if paths else []
+    if not pairs:
+        pairs = synthetic_versions()
+        print('no mirror index found, use %s synthetic packages' % len(pairs))
+    else:
+        print('%s packages from %s' % (len(pairs), ', '.join(paths)))
+
+    legacy = run(pairs, LegacyVersion, LegacyRelease)
+    current = run(pairs, Version, Release)
+    for case in legacy:
+        old = bench('legacy %s' % case, legacy[case])
+        new = bench('cached %s' % case, current[case])
+        print('%-40s %10.1fx' % ('speedup', old / new if new else float('inf')))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
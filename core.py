@@ -30,7 +30,7 @@ from collections import defaultdict
 import tempfile
 from subprocess import call as subprocess_call
 
-from ssh import SshClient, SshConfig
+from ssh import SshClient, SshConfig, HostFactsCache
 from tool import FileUtil, DirectoryUtil, YamlLoader, timeout, COMMAND_ENV, OrderedDict
 from _stdio import MsgLevel, FormtatText
 from _rpm import Version
@@ -67,6 +67,7 @@ class ObdHome(object):
         self.stdio = None
         self._stdio_func = None
         self.ssh_clients = {}
+        self.host_facts_caches = {}
         self.deploy = None
         self.cmds = []
         self.options = Values()
@@ -207,6 +208,18 @@ class ObdHome(object):
         else:
             return self.mirror_manager.add_local_mirror(src, getattr(self.options, 'force', False))
 
+    def add_mirrors(self, srcs):
+        local_srcs = []
+        for src in srcs:
+            if re.match('^https?://', src):
+                if not self.mirror_manager.add_remote_mirror(src):
+                    return False
+            else:
+                local_srcs.append(src)
+        if local_srcs:
+            return self.mirror_manager.add_local_mirrors(local_srcs, getattr(self.options, 'force', False))
+        return True
+
     def deploy_param_check(self, repositories, deploy_config, gen_config_plugins={}):
         # parameter check
         errors = []
@@ -276,8 +289,20 @@ class ObdHome(object):
                     connect_status[server] = err.CheckStatus(err.CheckStatus.PASS)
         if servers:
             connect_status.update(self.ssh_clients_connect(servers, ssh_clients, user_config, fail_exit))
+        host_facts_cache = self.get_host_facts_cache()
+        if host_facts_cache:
+            for server in ssh_clients:
+                ssh_clients[server].host_facts_cache = host_facts_cache
         return ssh_clients, connect_status
 
+    def get_host_facts_cache(self):
+        if not self.deploy:
+            return None
+        config_dir = self.deploy.config_dir
+        if config_dir not in self.host_facts_caches:
+            self.host_facts_caches[config_dir] = HostFactsCache(Deploy.get_host_facts_path(config_dir), stdio=self.stdio)
+        return self.host_facts_caches[config_dir]
+
     def ssh_clients_connect(self, servers, ssh_clients, user_config, fail_exit=False):
         self._call_stdio('start_loading', 'Open ssh connection')
         connect_io = self.stdio if fail_exit else self.stdio.sub_io()
@@ -4962,6 +4987,10 @@ class ObdHome(object):
         return True
 
     def clean_pkg(self, opts):
+        payload_cache = self.repository_manager.payload_cache
+        evicted = payload_cache.evict()
+        if evicted:
+            self._call_stdio('print', 'Evicted %s entries from the payload cache %s' % (len(evicted), payload_cache.path))
         filter_pkgs, filter_repositories = {}, {}
         if opts.type != PKG_REPO_FILE:
             downloaded_pkgs = self.mirror_manager.get_all_rpm_pkgs()
@@ -4994,6 +5023,7 @@ class ObdHome(object):
             return False
         if not self.mirror_manager.delete_pkgs(delete_pkgs) or not self.repository_manager.delete_repositories(delete_repositories):
             return False
+        payload_cache.remove(set([pkg.md5 for pkg in delete_pkgs]))
 
         self.stdio.print("Delete the files listed above successful!")
         return True
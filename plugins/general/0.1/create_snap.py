@@ -22,6 +22,7 @@ from __future__ import absolute_import, division, print_function
 
 import hashlib
 import os
+import threading
 
 
 def create_snap(plugin_context, snap_config, env={}, *args, **kwargs):
@@ -42,7 +43,7 @@ def create_snap(plugin_context, snap_config, env={}, *args, **kwargs):
     backup_cmd_temp = '''sanp_path='{sanp_path}'
 tar_path='{tar_path}'
 mkdir -p $sanp_path
-tar -I zstd -cf $sanp_path/`basename $tar_path` $tar_path
+tar -I zstd -cvf $sanp_path/`basename $tar_path` $tar_path
 if [ -d $tar_path ]
 then
 for fn in `ls $tar_path`
@@ -50,30 +51,40 @@ do
     path=$tar_path/$fn
     if [ -L $path ]; then
         path=$(readlink $path)
-        tar -I zstd -cf $sanp_path/$fn $path
+        tar -I zstd -cvf $sanp_path/$fn $path
     fi
 done
 fi'''
-    concurrent_executor = plugin_context.concurrent_executor
-    concurrent_executor.workers = len(cluster_config.servers)
+    # the archives are created at the same time, and the archived files are logged as they are done
+    streams = []
     for server in cluster_config.servers:
         home_path = cluster_config.get_server_conf(server).get('home_path')
         snap_path = os.path.join(home_path, snap_hash)
         client = clients[server]
         if client.execute_command('[ ! -d %s ]' % snap_path):
-            stdio.start_loading('%s create snap' % (server))
             for fn in snap_config.backup:
-                concurrent_executor.add_task(client, backup_cmd_temp.format(sanp_path=snap_path, tar_path=os.path.join(home_path, fn)), timeout=-1)
+                cmd = backup_cmd_temp.format(sanp_path=snap_path, tar_path=os.path.join(home_path, fn))
+                streams.append((server, client.execute_command_stream(cmd, on_stdout=stdio.verbose)))
         else:
             stdio.verbose('%s snap exist: %s' % (server, snap_path))
-    
-    if concurrent_executor.size():
+
+    if streams:
         stdio.start_loading('%s create snap' % cluster_config.name)
-        results = concurrent_executor.submit()
-        if not all(results):
-            for ret in results:
-                if not ret:
-                    stdio.error('(%s) %s' % (ret.client, ret.stdout))
+        # a stream only makes progress while it is consumed, so every stream gets a thread of its own
+        threads = []
+        for _, ret in streams:
+            thread = threading.Thread(target=ret.wait)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        failed = False
+        for server, ret in streams:
+            if not ret:
+                stdio.error('(%s) %s' % (server, ret.stderr))
+                failed = True
+        if failed:
             stdio.stop_loading('fail')
             return
     
@@ -22,11 +22,123 @@ from __future__ import absolute_import, division, print_function
 
 import os
 import re
+import tempfile
+
+from multiprocessing.pool import ThreadPool
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
 
 from _plugin import InstallPlugin
 from _deploy import InnerConfigKeywords
-from tool import YamlLoader
+from tool import YamlLoader, COMMAND_ENV
 from _rpm import Version
+from _environ import ENV_DISTRIBUTE_FANOUT
+from _repository import Repository
+
+
+MANIFEST_FILE = '.manifest'
+# size, mtime and path of the files of the manifest on the host, recorded right after they are installed
+STATE_SUFFIX = '.stat'
+
+
+def parse_file_state(text):
+    state = {}
+    for line in text.split('\n'):
+        parts = line.split(' ', 2)
+        if len(parts) == 3:
+            state[os.path.normpath(parts[2])] = ' '.join(parts[:2])
+    return state
+
+
+def build_fanout_tree(servers, fanout):
+    """
+    Split servers into levels of (parent, server). The servers of the first level get the data from the control machine,
+    and each server forwards it to at most `fanout` servers of the next level.
+    """
+    levels = [[(None, server) for server in servers[:fanout]]]
+    parents = servers[:fanout]
+    idx = fanout
+    while idx < len(servers):
+        level = []
+        for parent in parents:
+            for server in servers[idx:idx + fanout]:
+                level.append((parent, server))
+            idx += fanout
+            if idx >= len(servers):
+                break
+        levels.append(level)
+        parents = [server for _, server in level]
+    return levels
+
+
+DIGEST_COMMANDS = {32: 'md5sum', 40: 'sha1sum', 64: 'sha256sum', 128: 'sha512sum'}
+
+
+def put_file_list(client, paths, stdio):
+    # long file lists do not fit in a command line, send them as a file
+    fd, local_path = tempfile.mkstemp(prefix='obd_file_list_')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(paths) + '\n')
+        remote_path = os.path.join('/tmp', os.path.basename(local_path))
+        if client.put_file(local_path, remote_path, stdio=stdio.sub_io()):
+            return remote_path
+    finally:
+        os.remove(local_path)
+    return None
+
+
+def check_files(client, path, manifest, stdio):
+    """
+    Whether the files of the manifest under path have the content recorded in the manifest
+    """
+    groups = {}
+    for file_path in manifest:
+        groups.setdefault(DIGEST_COMMANDS.get(len(manifest[file_path])), []).append(file_path)
+    if None in groups:
+        return False
+    for digest_cmd in groups:
+        paths = groups[digest_cmd]
+        list_path = put_file_list(client, paths, stdio)
+        if not list_path:
+            return False
+        ret = client.execute_command("cd %s && xargs -d '\\n' -r %s -- < %s; ret=$?; rm -f %s; exit $ret" % (quote(path), digest_cmd, list_path, list_path))
+        if not ret:
+            return False
+        digests = Repository.parse_manifest(ret.stdout)
+        for file_path in paths:
+            if digests.get(file_path) != manifest[file_path]:
+                return False
+    return True
+
+
+def relay_repository(src_client, src_path, dst_client, dst_path, manifest, extras, stdio):
+    # the install path of the parent also holds its runtime files, so only the files of the repository are relayed,
+    # and only if the parent still has exactly the content of the repository
+    if not manifest:
+        return False
+    if not check_files(src_client, src_path, manifest, stdio):
+        stdio.verbose('%s: %s differs from the repository' % (src_client, src_path))
+        return False
+    ssh_cmd = 'ssh -o BatchMode=yes -o StrictHostKeyChecking=no -o ConnectTimeout=5 -p %s %s@%s' % (dst_client.config.port, dst_client.config.username, dst_client.config.host)
+    # the servers need to trust each other
+    if not src_client.execute_command('%s true' % ssh_cmd):
+        return False
+    list_path = put_file_list(src_client, sorted(manifest) + extras, stdio)
+    if not list_path:
+        return False
+    remote_cmd = 'mkdir -p %s && tar -xf - -C %s' % (quote(dst_path), quote(dst_path))
+    cmd = 'tar -C %s --no-recursion -cf - -T %s | %s %s' % (quote(src_path), list_path, ssh_cmd, quote(remote_cmd))
+    ret = src_client.execute_command(cmd, timeout=-1)
+    src_client.execute_command('rm -f %s' % list_path)
+    if not ret:
+        return False
+    if not check_files(dst_client, dst_path, manifest, stdio):
+        stdio.verbose('%s: %s digest mismatch' % (dst_client, dst_path))
+        return False
+    return True
 
 
 def install_repo(plugin_context, obd_home, install_repository, install_plugin, check_repository, check_file_map,
@@ -76,14 +188,186 @@ def install_repo(plugin_context, obd_home, install_repository, install_plugin, c
         home_path_map[server] = server_config.get("home_path")
 
     is_ln_install_mode = cluster_config.is_ln_install_mode()
+    install_file_items = install_plugin.file_map(install_repository).values()
+    target_paths = []
+    for file_item in install_file_items:
+        if file_item.type != InstallPlugin.FileItemType.DIR or os.path.isdir(os.path.join(install_repository.repository_dir, file_item.target_path)):
+            target_paths.append(file_item.target_path)
+
+    # the repositories installed in cp mode can share an install path, so every one of them has its own manifest
+    manifest_name = '%s.%s.%s' % (MANIFEST_FILE, install_repository.name, install_repository.md5)
+    local_manifest = {}
+    for path, digest in install_repository.get_manifest().items():
+        for target_path in target_paths:
+            if path == target_path or path.startswith(target_path.rstrip('/') + '/'):
+                local_manifest[path] = digest
+                break
+    # symlinks and empty directories are not in the manifest, always send them
+    local_extras = []
+    for target_path in target_paths:
+        path = os.path.join(install_repository.repository_dir, target_path)
+        if os.path.islink(path):
+            local_extras.append(target_path)
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                if not dirs and not files:
+                    local_extras.append(os.path.relpath(root, install_repository.repository_dir))
+                for name in dirs + files:
+                    if os.path.islink(os.path.join(root, name)):
+                        local_extras.append(os.path.relpath(os.path.join(root, name), install_repository.repository_dir))
+
+    def link_same_files(client, install_path, paths, search_dir):
+        # hard link the files which have the same content in the other repositories on the host
+        ret = client.execute_command('for f in %s/*/*/%s.*; do case "$f" in *%s) continue;; esac; [ -f "$f" ] && echo "# $(dirname $f)" && cat $f; done' % (search_dir, MANIFEST_FILE, STATE_SUFFIX))
+        if not ret:
+            return paths
+        sources = {}
+        base_dir = None
+        for line in ret.stdout.split('\n'):
+            if line.startswith('# '):
+                base_dir = line[2:]
+                continue
+            digest, _, path = line.partition('  ')
+            if base_dir and base_dir != install_path and digest and path:
+                sources.setdefault(digest, os.path.join(base_dir, path))
+        linked = []
+        cmds = []
+        for path in paths:
+            source = sources.get(local_manifest.get(path))
+            if source:
+                target = os.path.join(install_path, path)
+                cmds.append('mkdir -p %s && ln -f %s %s' % (os.path.dirname(target), source, target))
+                linked.append(path)
+        if not cmds:
+            return paths
+        for idx in range(0, len(cmds), 100):
+            if not client.execute_command(' && '.join(cmds[idx:idx + 100])):
+                return paths
+        stdio.verbose('%s: %d files are linked from the other repositories' % (client, len(linked)))
+        linked = set(linked)
+        return [path for path in paths if path not in linked]
+
+    def get_file_state(client, install_path):
+        # size, mtime and path of the files under the target paths on the host
+        ret = client.execute_command("cd %s && find %s -type f -printf '%%s %%T@ %%p\\n' 2>/dev/null; true" % (quote(install_path), ' '.join([quote(path) for path in target_paths])))
+        return parse_file_state(ret.stdout) if ret else {}
+
+    def get_remote_manifest(client, install_path):
+        # the manifest of this repository on the host, or of another version of it, and the state recorded with it
+        ret = client.execute_command('cd %s && for f in %s*; do [ -f "$f" ] && echo "# $f" && cat "$f" && echo; done' % (quote(install_path), quote('%s.%s.' % (MANIFEST_FILE, install_repository.name))))
+        contents = {}
+        name = None
+        for line in (ret.stdout if ret else '').split('\n'):
+            if line.startswith('# '):
+                name = line[2:]
+                contents[name] = []
+            elif name:
+                contents[name].append(line)
+        names = [name for name in contents if not name.endswith(STATE_SUFFIX) and name + STATE_SUFFIX in contents]
+        if not names:
+            return {}, {}
+        name = manifest_name if manifest_name in names else names[0]
+        return Repository.parse_manifest('\n'.join(contents[name])), parse_file_state('\n'.join(contents[name + STATE_SUFFIX]))
+
+    def get_changed_paths(client, install_path, search_dir=None):
+        # compare with the manifest on the host, and only the changed files need to be sent.
+        # The files modified or removed on the host after the last install no longer have the recorded state, they are sent again
+        if not local_manifest:
+            return target_paths
+        remote_manifest, remote_state = get_remote_manifest(client, install_path)
+        file_state = get_file_state(client, install_path) if remote_manifest else {}
+        paths = [
+            path for path in sorted(local_manifest)
+            if remote_manifest.get(path) != local_manifest[path] or path not in remote_state or file_state.get(path) != remote_state[path]
+        ]
+        stdio.verbose('%s: %d of %d files are changed' % (client, len(paths), len(local_manifest)))
+        if paths and search_dir:
+            paths = link_same_files(client, install_path, paths, search_dir)
+        return paths + local_extras
+
+    def send_manifest(client, install_path):
+        if not local_manifest:
+            return
+        if not client.put_file(install_repository.manifest_file_path, os.path.join(install_path, manifest_name), stdio=stdio.sub_io()):
+            return
+        # drop the manifests of the other versions of the repository, and record the state of the installed files
+        cmd = 'cd %s && for f in %s*; do [ "$f" = %s ] || rm -f "$f"; done && rm -f %s && find %s -type f -printf %s > %s' % (
+            quote(install_path),
+            quote('%s.%s.' % (MANIFEST_FILE, install_repository.name)),
+            quote(manifest_name),
+            MANIFEST_FILE,
+            ' '.join([quote(path) for path in target_paths]),
+            quote('%s %T@ %p\\n'),
+            quote(manifest_name + STATE_SUFFIX)
+        )
+        client.execute_command(cmd)
+
+    def send_repository(client, install_path, search_dir=None):
+        sub_io = stdio.sub_io()
+        # send the changed files in one tar stream, and fall back to send the files one by one
+        if client.put_tar(install_repository.repository_dir, install_path, get_changed_paths(client, install_path, search_dir), stdio=sub_io):
+            send_manifest(client, install_path)
+            return True
+        for file_item in install_file_items:
+            file_path = os.path.join(install_repository.repository_dir, file_item.target_path)
+            remote_file_path = os.path.join(install_path, file_item.target_path)
+            if file_item.type == InstallPlugin.FileItemType.DIR:
+                if os.path.isdir(file_path) and not client.put_dir(file_path, remote_file_path, stdio=sub_io):
+                    return False
+            else:
+                if not client.put_file(file_path, remote_file_path, stdio=sub_io):
+                    return False
+        send_manifest(client, install_path)
+        return True
+
+    def distribute(pending_servers):
+        # the control machine only sends the repository to the seed servers,
+        # and every server which has got it forwards the files of the repository to the servers of the next level
+        done = set()
+
+        def relay(parent, server):
+            client = clients[server]
+            install_path = install_paths[server]
+            if parent:
+                if relay_repository(clients[parent], install_paths[parent], client, install_path, local_manifest, local_extras, stdio):
+                    stdio.verbose('%s %s is forwarded by %s' % (server, install_repository, parent))
+                    send_manifest(client, install_path)
+                    return True
+                stdio.verbose('%s failed to forward %s to %s, send it by the control machine' % (parent, install_repository, server))
+            return send_repository(client, install_path, search_dirs.get(server))
+
+        for level in build_fanout_tree(pending_servers, fanout):
+            tasks = [(parent if parent in done else None, server) for parent, server in level]
+            if len(tasks) > 1:
+                pool = ThreadPool(min(len(tasks), plugin_context.MAX_CONCURRENT_SERVERS))
+                try:
+                    results = pool.map(lambda task: relay(*task), tasks)
+                finally:
+                    pool.close()
+            else:
+                results = [relay(*task) for task in tasks]
+            for (_, server), result in zip(tasks, results):
+                if not result:
+                    return False
+                done.add(server)
+        return True
 
     # remote install repository
     stdio.start_loading('Remote %s repository install' % install_repository)
     stdio.verbose('Remote %s repository integrity check' % install_repository)
+    try:
+        fanout = int(COMMAND_ENV.get(ENV_DISTRIBUTE_FANOUT, 0) or 0)
+    except ValueError:
+        stdio.verbose('invalid %s: %s, the control machine sends to every server' % (ENV_DISTRIBUTE_FANOUT, COMMAND_ENV.get(ENV_DISTRIBUTE_FANOUT)))
+        fanout = 0
+    fanout = max(fanout, 0)
+    install_paths = {}
+    remote_obd_homes = {}
+    search_dirs = {}
+    pending_servers = []
     for server in servers:
         client = clients[server]
         remote_home_path = home_path_map[server]
-        install_file_items = install_plugin.file_map(install_repository).values()
         stdio.verbose('%s %s repository integrity check' % (server, install_repository))
         if is_ln_install_mode:
             remote_obd_home = client.execute_command('echo ${OBD_HOME:-"$HOME"}/.obd').stdout.strip()
@@ -118,24 +402,38 @@ def install_repo(plugin_context, obd_home, install_repository, install_plugin, c
             stdio.verbose('%s %s need to be installed ' % (server, install_repository))
 
         stdio.verbose('%s %s installing' % (server, install_repository))
-        sub_io = stdio.sub_io()
-        for file_item in install_file_items:
-            file_path = os.path.join(install_repository.repository_dir, file_item.target_path)
-            remote_file_path = os.path.join(install_path, file_item.target_path)
-            if file_item.type == InstallPlugin.FileItemType.DIR:
-                if os.path.isdir(file_path) and not client.put_dir(file_path, remote_file_path, stdio=sub_io):
-                    stdio.stop_loading('fail')
-                    return False
-            else:
-                if not client.put_file(file_path, remote_file_path, stdio=sub_io):
-                    stdio.stop_loading('fail')
-                    return False
+        install_paths[server] = install_path
+        if is_ln_install_mode:
+            remote_obd_homes[server] = remote_obd_home
+            # the other versions of the repository on the host
+            search_dirs[server] = os.path.dirname(os.path.dirname(install_path))
+        if fanout and len(servers) > 1:
+            # send later, by the servers which have got the repository
+            pending_servers.append(server)
+            continue
+        if not send_repository(client, install_path, search_dirs.get(server)):
+            stdio.stop_loading('fail')
+            return False
         if is_ln_install_mode:
             # save data file for later comparing
-            client.put_file(install_repository.data_file_path, remote_repository_data_path, stdio=sub_io)
+            client.put_file(install_repository.data_file_path, remote_repository_data_path, stdio=stdio.sub_io())
             # link files to home_path
             install_to_home_path()
         stdio.verbose('%s %s installed' % (server, install_repository.name))
+
+    if pending_servers:
+        if not distribute(pending_servers):
+            stdio.stop_loading('fail')
+            return False
+        for server in pending_servers:
+            client = clients[server]
+            remote_home_path = home_path_map[server]
+            install_path = install_paths[server]
+            if is_ln_install_mode:
+                remote_obd_home = remote_obd_homes[server]
+                client.put_file(install_repository.data_file_path, os.path.join(install_path, '.data'), stdio=stdio.sub_io())
+                install_to_home_path()
+            stdio.verbose('%s %s installed' % (server, install_repository.name))
     stdio.stop_loading('succeed')
 
     # check lib
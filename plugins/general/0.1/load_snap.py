@@ -58,7 +58,6 @@ do
     tar -I zstd -xf $sanp_path/$fn
 done'''
     concurrent_executor = plugin_context.concurrent_executor
-    concurrent_executor.workers = len(cluster_config.servers)
     for server in cluster_config.servers:
         home_path = cluster_config.get_server_conf(server).get('home_path')
         snap_path = os.path.join(home_path, snap_hash)
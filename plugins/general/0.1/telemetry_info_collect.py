@@ -27,34 +27,56 @@ import uuid
 import resource
 import hashlib
 
+from ssh import SshReturn
 from tool import NetUtil, COMMAND_ENV
 from const import VERSION, REVISION, TELEMETRY_COMPONENT
 from _environ import ENV_TELEMETRY_REPORTER, ENV_OBD_ID
 
+
+def grep(text, keyword, start=False):
+    return [line for line in text.split('\n') if (line.startswith(keyword) if start else keyword in line)]
+
+
+def cut_uniq(lines, sep=':'):
+    fields = []
+    for line in lines:
+        field = line.split(sep)[1] if sep in line else line
+        if not fields or fields[-1] != field:
+            fields.append(field)
+    return '\n'.join(fields)
+
+
+# name -> (host fact, filter of the fact output)
 shell_command_map = {
-    "host_type": 'systemd-detect-virt',
-    "_cpu_physical_core_num": 'cat /proc/cpuinfo | grep "physical id" | sort | uniq | wc -l',
-    "_per_physical_core_num": 'cat /proc/cpuinfo | grep "cpu cores" | cut -f2 -d: | uniq',
-    "cpu_logical_cores": 'cat /proc/cpuinfo | grep "processor" | wc -l',
-    "cpu_model_name": 'cat /proc/cpuinfo | grep name | cut -f2 -d: | uniq',
-    "cpu_frequency": 'cat /proc/cpuinfo | grep MHz | cut -f2 -d: | uniq',
-    "memory_total": 'cat /proc/meminfo | grep MemTotal | cut -f2 -d: | uniq',
-    "memory_free": 'cat /proc/meminfo | grep MemFree | cut -f2 -d: | uniq',
-    "memory_avaiable": 'cat /proc/meminfo | grep MemAvailable | cut -f2 -d: | uniq',
-    "os_name": 'cat /etc/os-release | grep "^ID=" | cut -f2 -d=',
-    "os_release": 'cat /etc/os-release | grep "^VERSION_ID=" | cut -f2 -d='
+    "host_type": ('host_type', lambda out: out),
+    "_cpu_physical_core_num": ('cpuinfo', lambda out: str(len(set(grep(out, 'physical id'))))),
+    "_per_physical_core_num": ('cpuinfo', lambda out: cut_uniq(grep(out, 'cpu cores'))),
+    "cpu_logical_cores": ('cpuinfo', lambda out: str(len(grep(out, 'processor')))),
+    "cpu_model_name": ('cpuinfo', lambda out: cut_uniq(grep(out, 'name'))),
+    "cpu_frequency": ('cpuinfo', lambda out: cut_uniq(grep(out, 'MHz'))),
+    "memory_total": ('meminfo', lambda out: cut_uniq(grep(out, 'MemTotal'))),
+    "memory_free": ('meminfo', lambda out: cut_uniq(grep(out, 'MemFree'))),
+    "memory_avaiable": ('meminfo', lambda out: cut_uniq(grep(out, 'MemAvailable'))),
+    "os_name": ('os_release', lambda out: '\n'.join([line.split('=')[1] for line in grep(out, 'ID=', True)])),
+    "os_release": ('os_release', lambda out: '\n'.join([line.split('=')[1] for line in grep(out, 'VERSION_ID=', True)])),
+    "get_disks_info": ('df_human', lambda out: '\n'.join(out.split('\n')[1:]))
 }
 current_client = None
 
 
+def get_shell_result(name):
+    fact, output_filter = shell_command_map[name]
+    res = current_client.get_host_facts().get_return(fact)
+    return SshReturn(res.code, output_filter(res.stdout), res.stderr)
+
+
 def shell_command(func):
     def wrapper(*args, **kwargs):
         name = func.__name__
-        command = shell_command_map.get(name)
-        assert command, f"{name} is not in shell_command.yaml"
+        assert name in shell_command_map, f"{name} is not in shell_command.yaml"
         assert current_client, "current_client is None"
 
-        res = current_client.execute_command(command)
+        res = get_shell_result(name)
         kwargs["bash_result"] = res.stdout.strip() if res.code == 0 else None
         return func(*args, **kwargs)
 
@@ -148,7 +170,7 @@ class DiskInfo:
     def get_disks_info():
         data = []
         sha1 = hashlib.sha1()
-        for _ in current_client.execute_command("df -h | awk '{if(NR>1)print}'").stdout.strip().split('\n'):
+        for _ in get_shell_result('get_disks_info').stdout.strip().split('\n'):
             _disk_info = {}
             _ = [i for i in _.split(' ') if i != '']
             _disk_info['deviceName'] = _[0]
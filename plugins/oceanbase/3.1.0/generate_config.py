@@ -148,7 +148,7 @@ def generate_config(plugin_context, generate_config_mini=False, auto_depend=Fals
         # memory
         auto_set_memory = False
         if user_server_config.get('memory_limit_percentage'):
-            ret = client.execute_command('cat /proc/meminfo')
+            ret = client.get_host_facts().get_return('meminfo')
             if ret:
                 total_memory = 0
                 for k, v in re.findall('(\w+)\s*:\s*(\d+\s*\w+)', ret.stdout):
@@ -157,7 +157,7 @@ def generate_config(plugin_context, generate_config_mini=False, auto_depend=Fals
             memory_limit = int(total_memory * user_server_config.get('memory_limit_percentage') / 100)
         else:
             if not server_config.get('memory_limit'):
-                ret = client.execute_command('cat /proc/meminfo')
+                ret = client.get_host_facts().get_return('meminfo')
                 if ret:
                     server_memory_stats = {}
                     memory_key_map = {
@@ -203,7 +203,7 @@ def generate_config(plugin_context, generate_config_mini=False, auto_depend=Fals
             
         # cpu
         if not server_config.get('cpu_count'):
-            ret = client.execute_command("grep -e 'processor\s*:' /proc/cpuinfo | wc -l")
+            ret = client.get_host_facts().get_return('cpu_count')
             if ret and ret.stdout.strip().isdigit():
                 cpu_num = int(ret.stdout)
                 server_config['cpu_count'] = max(MIN_CPU_COUNT, int(cpu_num - 2))
@@ -217,7 +217,7 @@ def generate_config(plugin_context, generate_config_mini=False, auto_depend=Fals
         # disk
         if not server_config.get('datafile_size') and not user_server_config.get('datafile_disk_percentage'):
             disk = {'/': 0}
-            ret = client.execute_command('df --block-size=1024')
+            ret = client.get_host_facts().get_return('df')
             if ret:
                 for total, used, avail, puse, path in re.findall('(\d+)\s+(\d+)\s+(\d+)\s+(\d+%)\s+(.+)', ret.stdout):
                     disk[path] = {
@@ -21,20 +21,24 @@
 from __future__ import absolute_import, division, print_function
 
 
-def status(plugin_context, *args, **kwargs):
+def server_status(plugin_context, server):
     cluster_config = plugin_context.cluster_config
-    clients = plugin_context.clients
+    client = plugin_context.clients[server]
     stdio = plugin_context.stdio
+    server_config = cluster_config.get_server_conf(server)
+    if 'home_path' not in server_config:
+        stdio.print('%s home_path is empty', server)
+        return plugin_context.return_true(status=0)
+    remote_pid_path = '%s/run/observer.pid' % server_config['home_path']
+    remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
+    if remote_pid and client.execute_command('ls /proc/%s' % remote_pid):
+        return plugin_context.return_true(status=1)
+    return plugin_context.return_true(status=0)
+
+
+def status(plugin_context, *args, **kwargs):
     cluster_status = {}
-    for server in cluster_config.servers:
-        server_config = cluster_config.get_server_conf(server)
-        client = clients[server]
-        cluster_status[server] = 0
-        if 'home_path' not in server_config:
-            stdio.print('%s home_path is empty', server)
-            continue
-        remote_pid_path = '%s/run/observer.pid' % server_config['home_path']
-        remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
-        if remote_pid and client.execute_command('ls /proc/%s' % remote_pid):
-            cluster_status[server] = 1
+    rets = plugin_context.concurrent_run(server_status)
+    for server in rets:
+        cluster_status[server] = rets[server].get_return('status', 0)
     return plugin_context.return_true(cluster_status=cluster_status)
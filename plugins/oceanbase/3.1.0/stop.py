@@ -61,6 +61,23 @@ def port_release_check(client, pid, port, count):
     return False
 
 
+def kill_observer(plugin_context, server):
+    client = plugin_context.clients[server]
+    stdio = plugin_context.stdio
+    server_config = plugin_context.cluster_config.get_server_conf(server)
+    if 'home_path' not in server_config:
+        stdio.verbose('%s home_path is empty', server)
+        return plugin_context.return_true()
+    remote_pid_path = '%s/run/observer.pid' % server_config['home_path']
+    remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
+    if remote_pid and client.execute_command('ps uax | egrep " %s " | grep -v grep' % remote_pid):
+        stdio.verbose('%s observer[pid:%s] stopping ...' % (server, remote_pid))
+        client.execute_command('kill -9 %s' % (remote_pid))
+        return plugin_context.return_true(pid=remote_pid, path=remote_pid_path)
+    stdio.verbose('%s observer is not running ...' % server)
+    return plugin_context.return_true()
+
+
 def stop(plugin_context, *args, **kwargs):
     cluster_config = plugin_context.cluster_config
     clients = plugin_context.clients
@@ -80,26 +97,17 @@ def stop(plugin_context, *args, **kwargs):
         except:
             stdio.warn('failed to clean up the configuration url content')
     servers = {}
-    for server in cluster_config.servers:
-        server_config = cluster_config.get_server_conf(server)
-        client = clients[server]
-        if 'home_path' not in server_config:
-            stdio.verbose('%s home_path is empty', server)
-            continue
-        remote_pid_path = '%s/run/observer.pid' % server_config['home_path']
-        remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
-        if remote_pid and client.execute_command('ps uax | egrep " %s " | grep -v grep' % remote_pid):
-            stdio.verbose('%s observer[pid:%s] stopping ...' % (server, remote_pid))
-            client.execute_command('kill -9 %s' % (remote_pid))
+    rets = plugin_context.concurrent_run(kill_observer)
+    for server in rets:
+        if rets[server].get_return('pid'):
+            server_config = cluster_config.get_server_conf(server)
             servers[server] = {
-                'client': client,
+                'client': clients[server],
                 'mysql_port': server_config['mysql_port'],
                 'rpc_port': server_config['rpc_port'],
-                'pid': remote_pid,
-                'path': remote_pid_path
+                'pid': rets[server].get_return('pid'),
+                'path': rets[server].get_return('path')
             }
-        else:
-            stdio.verbose('%s observer is not running ...' % server)
     count = 30
     time.sleep(1)
     while count and servers:
@@ -80,9 +80,10 @@ def get_system_memory(memory_limit, min_pool_memory):
     return max(system_memory, min_pool_memory)
 
 
-def get_disk_info_by_path(path, client, stdio):
+def get_disk_info_by_path(path, client, stdio, ret=None):
     disk_info = {}
-    ret = client.execute_command('df --block-size=1024 {}'.format(path))
+    if ret is None:
+        ret = client.execute_command('df --block-size=1024 {}'.format(path))
     if ret:
         for total, used, avail, puse, path in re.findall(r'(\d+)\s+(\d+)\s+(\d+)\s+(\d+%)\s+(.+)', ret.stdout):
             disk_info[path] = {'total': int(total) << 10, 'avail': int(avail) << 10, 'need': 0}
@@ -90,9 +91,9 @@ def get_disk_info_by_path(path, client, stdio):
     return disk_info
 
 
-def get_disk_info(all_paths, client, stdio):
+def get_disk_info(all_paths, client, stdio, overview=None):
     overview_ret = True
-    disk_info = get_disk_info_by_path('', client, stdio)
+    disk_info = get_disk_info_by_path('', client, stdio, overview)
     if not disk_info:
         overview_ret = False
         disk_info = get_disk_info_by_path('/', client, stdio)
@@ -417,7 +418,9 @@ def start_check(plugin_context, init_check_status=False, strict_check=False, wor
         ip_servers = servers_memory[ip]['servers'].keys()
         server_num = len(ip_servers)
         client = servers_clients[ip]
-        ret = client.execute_command('cat /proc/sys/fs/aio-max-nr /proc/sys/fs/aio-nr')
+        # start_check runs right before the start, so it checks the current state of the host, not the cached one
+        host_facts = client.get_host_facts(refresh=True)
+        ret = host_facts.get_return('aio')
         if not ret:
             for server in ip_servers:
                 alert('aio', err.EC_FAILED_TO_GET_AIO_NR.format(ip=ip), [err.SUG_CONNECT_EXCEPT.format()])
@@ -438,7 +441,7 @@ def start_check(plugin_context, init_check_status=False, strict_check=False, wor
                     alert('aio', err.EC_FAILED_TO_GET_AIO_NR.format(ip=ip), [err.SUG_UNSUPPORT_OS.format()])
                 stdio.exception('')
 
-        ret = client.execute_command('ulimit -a')
+        ret = host_facts.get_return('ulimit')
         ulimits_min = {
             'open files': {
                 'need': lambda x: 20000 * x,
@@ -501,7 +504,7 @@ def start_check(plugin_context, init_check_status=False, strict_check=False, wor
             # check kernel params
             try:
                 cmd = 'sysctl -a'
-                ret = client.execute_command(cmd)
+                ret = host_facts.get_return('sysctl')
                 if not ret:
                     alert_strict('kernel', err.EC_FAILED_TO_GET_PARAM.format(key='kernel parameter ', cmd=cmd), [err.SUG_CONNECT_EXCEPT.format(ip=ip)])
                     continue
@@ -538,7 +541,7 @@ def start_check(plugin_context, init_check_status=False, strict_check=False, wor
                 stdio.exception('')
 
         # memory
-        ret = client.execute_command('cat /proc/meminfo')
+        ret = host_facts.get_return('meminfo')
         if ret:
             server_memory_stats = {}
             memory_key_map = {
@@ -581,7 +584,7 @@ def start_check(plugin_context, init_check_status=False, strict_check=False, wor
 
         # disk
         all_path = set(list(servers_disk[ip].keys()) + list(servers_clog_mount[ip].keys()))
-        disk = get_disk_info(all_paths=all_path, client=client, stdio=stdio)
+        disk = get_disk_info(all_paths=all_path, client=client, stdio=stdio, overview=host_facts.get_return('df'))
         stdio.verbose('disk: {}'.format(disk))
         for path in servers_disk[ip]:
             mount_path = get_mount_path(disk, path)
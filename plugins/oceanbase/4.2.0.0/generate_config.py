@@ -151,7 +151,7 @@ def generate_config(plugin_context, generate_config_mini=False, auto_depend=Fals
         min_pool_memory = server_config['__min_full_resource_pool_memory']
         min_memory = max(system_memory, MIN_MEMORY)
         if ip not in ip_server_memory_info:
-            ret = client.execute_command('cat /proc/meminfo')
+            ret = client.get_host_facts().get_return('meminfo')
             if ret:
                 ip_server_memory_info[ip] = server_memory_stats = {}
                 memory_key_map = {
@@ -218,7 +218,7 @@ def generate_config(plugin_context, generate_config_mini=False, auto_depend=Fals
 
         # cpu
         if not server_config.get('cpu_count'):
-            ret = client.execute_command("grep -e 'processor\s*:' /proc/cpuinfo | wc -l")
+            ret = client.get_host_facts().get_return('cpu_count')
             if ret and ret.stdout.strip().isdigit():
                 cpu_num = int(ret.stdout)
                 server_config['cpu_count'] = max(MIN_CPU_COUNT, int(cpu_num - 2))
@@ -234,7 +234,7 @@ def generate_config(plugin_context, generate_config_mini=False, auto_depend=Fals
         log_disk_size = server_config.get('log_disk_size', 0)
         if not server_config.get('datafile_size') or not server_config.get('log_disk_size'):
             disk = {'/': 0}
-            ret = client.execute_command('df --block-size=1024')
+            ret = client.get_host_facts().get_return('df')
             if ret:
                 for total, used, avail, puse, path in re.findall('(\d+)\s+(\d+)\s+(\d+)\s+(\d+%)\s+(.+)', ret.stdout):
                     disk[path] = {
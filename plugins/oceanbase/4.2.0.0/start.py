@@ -88,6 +88,19 @@ class EnvVariables(object):
                 self.client.del_env(env_key)
 
 
+def observer_health_check(plugin_context, server):
+    client = plugin_context.clients[server]
+    stdio = plugin_context.stdio
+    server_config = plugin_context.cluster_config.get_server_conf(server)
+    remote_pid_path = '%s/run/observer.pid' % server_config['home_path']
+    stdio.verbose('%s program health check' % server)
+    remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
+    if remote_pid and client.execute_command('ls /proc/%s' % remote_pid):
+        stdio.verbose('%s observer[pid: %s] started', server, remote_pid)
+        return plugin_context.return_true()
+    return plugin_context.return_false()
+
+
 def start(plugin_context, *args, **kwargs):
     cluster_config = plugin_context.cluster_config
     options = plugin_context.options
@@ -201,34 +214,33 @@ def start(plugin_context, *args, **kwargs):
 
         clusters_cmd[server] = 'cd %s; %s/bin/observer %s' % (home_path, home_path, ' '.join(cmd))
 
-    for server in clusters_cmd:
+    def start_server(server_context, server):
         environments = deepcopy(cluster_config.get_environments())
-        client = clients[server]
+        client = server_context.clients[server]
         server_config = cluster_config.get_server_conf(server)
-        stdio.verbose('starting %s observer', server)
+        server_context.stdio.verbose('starting %s observer', server)
         if 'LD_LIBRARY_PATH' not in environments:
             environments['LD_LIBRARY_PATH'] = '%s/lib:' % server_config['home_path']
         with EnvVariables(environments, client):
             ret = client.execute_command(clusters_cmd[server])
         if not ret:
+            return server_context.return_false(stderr=ret.stderr)
+        return server_context.return_true()
+
+    start_rets = plugin_context.concurrent_run(start_server, servers=clusters_cmd.keys())
+    for server in start_rets:
+        if not start_rets[server]:
             stdio.stop_loading('fail')
-            stdio.error(EC_OBSERVER_FAIL_TO_START_WITH_ERR.format(server=server, stderr=ret.stderr))
+            stdio.error(EC_OBSERVER_FAIL_TO_START_WITH_ERR.format(server=server, stderr=start_rets[server].get_return('stderr', '')))
             return
     stdio.stop_loading('succeed')
 
     stdio.start_loading('observer program health check')
     time.sleep(3)
     failed = []
-    for server in cluster_config.servers:
-        client = clients[server]
-        server_config = cluster_config.get_server_conf(server)
-        home_path = server_config['home_path']
-        remote_pid_path = '%s/run/observer.pid' % home_path
-        stdio.verbose('%s program health check' % server)
-        remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
-        if remote_pid and client.execute_command('ls /proc/%s' % remote_pid):
-            stdio.verbose('%s observer[pid: %s] started', server, remote_pid)
-        else:
+    health_rets = plugin_context.concurrent_run(observer_health_check)
+    for server in health_rets:
+        if not health_rets[server]:
             failed.append(EC_OBSERVER_FAIL_TO_START.format(server=server))
     if failed:
         stdio.stop_loading('fail')
@@ -26,27 +26,30 @@ global_ret = True
 
 
 def destroy(plugin_context, *args, **kwargs):
-    def clean(server, path):
-        client = clients[server]
+    def clean(server_context, server, path):
+        client = server_context.clients[server]
         ret = client.execute_command('rm -fr %s/' % (path), timeout=-1)
         if not ret:
             # print stderror
             global global_ret
             global_ret = False
-            stdio.warn(EC_CLEAN_PATH_FAILED.format(server=server, path=path))
+            server_context.stdio.warn(EC_CLEAN_PATH_FAILED.format(server=server, path=path))
         else:
-            stdio.verbose('%s:%s cleaned' % (server, path))
-    cluster_config = plugin_context.cluster_config
-    clients = plugin_context.clients
-    stdio = plugin_context.stdio
-    stdio.start_loading('observer work dir cleaning')
-    for server in cluster_config.servers:
+            server_context.stdio.verbose('%s:%s cleaned' % (server, path))
+
+    def clean_server(server_context, server):
         server_config = cluster_config.get_server_conf(server)
-        stdio.verbose('%s work path cleaning', server)
-        clean(server, server_config['home_path'])
+        server_context.stdio.verbose('%s work path cleaning', server)
+        clean(server_context, server, server_config['home_path'])
         for key in ['data_dir', 'redo_dir', 'clog_dir', 'ilog_dir', 'slog_dir']:
             if server_config.get(key):
-                clean(server, server_config[key])
+                clean(server_context, server, server_config[key])
+        return server_context.return_true()
+
+    cluster_config = plugin_context.cluster_config
+    stdio = plugin_context.stdio
+    stdio.start_loading('observer work dir cleaning')
+    plugin_context.concurrent_run(clean_server)
     if global_ret:
         stdio.stop_loading('succeed')
         plugin_context.return_true()
@@ -61,6 +61,41 @@ def port_release_check(client, pid, port, count):
     return False
 
 
+def kill_observer(plugin_context, server):
+    client = plugin_context.clients[server]
+    stdio = plugin_context.stdio
+    server_config = plugin_context.cluster_config.get_server_conf(server)
+    if 'home_path' not in server_config:
+        stdio.verbose('%s home_path is empty', server)
+        return plugin_context.return_true()
+    remote_pid_path = '%s/run/observer.pid' % server_config['home_path']
+    remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
+    if remote_pid and client.execute_command('ps uax | egrep " %s " | grep -v grep' % remote_pid):
+        stdio.verbose('%s observer[pid:%s] stopping ...' % (server, remote_pid))
+        client.execute_command('kill -9 %s' % (remote_pid))
+        return plugin_context.return_true(pid=remote_pid, path=remote_pid_path)
+    stdio.verbose('%s observer is not running ...' % server)
+    return plugin_context.return_true()
+
+
+def stop_obshell(plugin_context, server):
+    client = plugin_context.clients[server]
+    stdio = plugin_context.stdio
+    server_config = plugin_context.cluster_config.get_server_conf(server)
+    stdio.verbose('%s obshell stopping ...' % (server))
+    home_path = server_config['home_path']
+    cmd = 'cd %s; %s/bin/obshell admin stop'%(home_path, home_path)
+    if not client.execute_command(cmd):
+        return plugin_context.return_false()
+    # check obshell is stopped
+    for pid_file in ['obshell.pid', 'daemon.pid']:
+        remote_pid_path = '%s/run/%s' % (home_path, pid_file)
+        remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
+        if remote_pid and client.execute_command('ps uax | egrep " %s " | grep -v grep' % remote_pid):
+            return plugin_context.return_false()
+    return plugin_context.return_true()
+
+
 def stop(plugin_context, *args, **kwargs):
     cluster_config = plugin_context.cluster_config
     clients = plugin_context.clients
@@ -80,26 +115,17 @@ def stop(plugin_context, *args, **kwargs):
         except:
             stdio.warn('failed to clean up the configuration url content')
     servers = {}
-    for server in cluster_config.servers:
-        server_config = cluster_config.get_server_conf(server)
-        client = clients[server]
-        if 'home_path' not in server_config:
-            stdio.verbose('%s home_path is empty', server)
-            continue
-        remote_pid_path = '%s/run/observer.pid' % server_config['home_path']
-        remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
-        if remote_pid and client.execute_command('ps uax | egrep " %s " | grep -v grep' % remote_pid):
-            stdio.verbose('%s observer[pid:%s] stopping ...' % (server, remote_pid))
-            client.execute_command('kill -9 %s' % (remote_pid))
+    rets = plugin_context.concurrent_run(kill_observer)
+    for server in rets:
+        if rets[server].get_return('pid'):
+            server_config = cluster_config.get_server_conf(server)
             servers[server] = {
-                'client': client,
+                'client': clients[server],
                 'mysql_port': server_config['mysql_port'],
                 'rpc_port': server_config['rpc_port'],
-                'pid': remote_pid,
-                'path': remote_pid_path
+                'pid': rets[server].get_return('pid'),
+                'path': rets[server].get_return('path')
             }
-        else:
-            stdio.verbose('%s observer is not running ...' % server)
     count = 30
     time.sleep(1)
     while count and servers:
@@ -137,24 +163,9 @@ def stop(plugin_context, *args, **kwargs):
         stdio.stop_loading('succeed')
 
     stdio.start_loading('Stop obshell')
-    for server in cluster_config.servers:
-        client = clients[server]
-        server_config = cluster_config.get_server_conf(server)
-        stdio.verbose('%s obshell stopping ...' % (server))
-        home_path = server_config['home_path']
-        cmd = 'cd %s; %s/bin/obshell admin stop'%(home_path, home_path)
-        if not client.execute_command(cmd):
-            stdio.stop_loading('fail')
-            return
-        # check obshell is stopped
-        remote_pid_path = '%s/run/obshell.pid' % home_path
-        remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
-        if remote_pid and client.execute_command('ps uax | egrep " %s " | grep -v grep' % remote_pid):
-            stdio.stop_loading('fail')
-            return
-        remote_pid_path = '%s/run/daemon.pid' %  home_path
-        remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
-        if remote_pid and client.execute_command('ps uax | egrep " %s " | grep -v grep' % remote_pid):
+    rets = plugin_context.concurrent_run(stop_obshell)
+    for server in rets:
+        if not rets[server]:
             stdio.stop_loading('fail')
             return
     stdio.stop_loading('succeed')
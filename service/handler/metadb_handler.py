@@ -177,6 +177,7 @@ class MetadbHandler(BaseHandler):
         return data
 
     def get_server_memory_info(self, client, resource_check_results, address):
+        # the free memory changes all the time, it is never taken from the cached host facts
         memory_free = client.execute_command(
             "cat /proc/meminfo|grep MemFree|cut -f2 -d:|uniq | awk '{print $1}'").stdout.strip()
         memory_higher_limit = int(int(memory_free) / 1024 / 1024)
@@ -37,7 +37,8 @@ class MirrorHandler(BaseHandler):
         self.context['mirror']['remote_mirror_info_status'] = const.RUNNING
         try:
             mirror_list = []
-            mirrors = self.obd.mirror_manager.get_remote_mirrors(is_enabled=True)
+            # enabled mirrors are probed and refreshed concurrently under a global deadline
+            mirrors = self.obd.mirror_manager.get_remote_mirrors(is_enabled=True, probe=True)
             mirrors_disabled = self.obd.mirror_manager.get_remote_mirrors(is_enabled=False)
             mirrors.extend(mirrors_disabled)
             for mirror in mirrors:
@@ -209,12 +209,13 @@ class ServiceInfoHandler(BaseHandler):
                 if not global_config.get('ocp_meta_username', ''):
                     jdbc_url = global_config['jdbc_url']
                     matched = re.match(r"^jdbc:\S+://(\S+?)(|:\d+)/(\S+)", jdbc_url)
-                    if matched:
-                        cluster_config.update_global_conf('ocp_meta_db', matched.group(3))
-                    cluster_config.update_global_conf('ocp_meta_username', global_config['jdbc_username'].split('@')[0])
-                    cluster_config.update_global_conf('ocp_meta_password', global_config['jdbc_password'])
-                    cluster_config.update_global_conf('ocp_meta_tenant',
-                                                      {'tenant_name': global_config['jdbc_username'].split('@')[1]})
+                    with deploy_config.transaction():
+                        if matched:
+                            cluster_config.update_global_conf('ocp_meta_db', matched.group(3))
+                        cluster_config.update_global_conf('ocp_meta_username', global_config['jdbc_username'].split('@')[0])
+                        cluster_config.update_global_conf('ocp_meta_password', global_config['jdbc_password'])
+                        cluster_config.update_global_conf('ocp_meta_tenant',
+                                                          {'tenant_name': global_config['jdbc_username'].split('@')[1]})
             self.obd.set_deploy(deploy)
         else:
             self.generate_config(cluster_name)
@@ -21,32 +21,54 @@
 from __future__ import absolute_import, division, print_function
 
 import enum
+import codecs
 import getpass
 import os
+import signal
+import json
+import uuid
+import time
+import atexit
 import tempfile
+import threading
 import warnings
 from glob import glob
+from collections import deque
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
 
 from subprocess32 import Popen, PIPE
 
 # paramiko import cryptography 模块在python2下会报不支持警报
 warnings.filterwarnings("ignore")
 
-from paramiko import AuthenticationException, SFTPClient
-from paramiko.client import SSHClient, AutoAddPolicy
-from paramiko.ssh_exception import NoValidConnectionsError, SSHException
 
+try:
+    from queue import Queue as ThreadQueue
+except ImportError:
+    from Queue import Queue as ThreadQueue
 from multiprocessing.queues import Empty
 from multiprocessing import Queue, Process
 from multiprocessing.pool import ThreadPool
+try:
+    from concurrent.futures import ThreadPoolExecutor, Future
+except ImportError:
+    # python2 without the futures backport, ConcurrentExecutor runs its tasks on a ThreadPool of its own
+    ThreadPoolExecutor = Future = None
 
-from tool import COMMAND_ENV, DirectoryUtil, FileUtil, NetUtil, Timeout
+from tool import COMMAND_ENV, DirectoryUtil, FileUtil, NetUtil, Timeout, LazyModule
 from _stdio import SafeStdio
 from _errno import EC_SSH_CONNECT
-from _environ import ENV_DISABLE_RSYNC, ENV_DISABLE_RSA_ALGORITHMS, ENV_HOST_IP_MODE
+from _environ import ENV_DISABLE_RSYNC, ENV_ENABLE_TAR_TRANSPORTER, ENV_DISABLE_RSA_ALGORITHMS, ENV_HOST_IP_MODE, ENV_HOST_FACTS_TTL
 
 
-__all__ = ("SshClient", "SshConfig", "LocalClient", "ConcurrentExecutor")
+# paramiko is only needed once a remote host is connected
+paramiko = LazyModule('paramiko')
+
+
+__all__ = ("SshClient", "SshConfig", "LocalClient", "ConcurrentExecutor", "SshTaskExecutor", "StreamSshReturn", "SshConnectionPool", "HostFacts", "HostFactsCache")
 
 
 class SshConfig(object):
@@ -142,9 +164,211 @@ class FutureSshReturn(SshReturn):
         self.finsh = True
 
 
+class StreamSshReturn(SshReturn, SafeStdio):
+    """
+    The handle of a command started by execute_command_stream.
+
+    Iterate it to get the (stream, text) chunks of stdout and stderr as they arrive, stream is 'stdout' or 'stderr'.
+    on_stdout/on_stderr are called with every complete line. Only the last buffer_size characters of each stream are kept,
+    so stdout and stderr of a finished command are the tails of the outputs. code/stdout/stderr wait for the command to exit.
+    """
+
+    CHUNK_SIZE = 1 << 15
+    QUEUE_SIZE = 64
+    BUFFER_SIZE = 1 << 20
+
+    def __init__(self, readers, wait, kill, timeout=None, on_stdout=None, on_stderr=None, buffer_size=None, stdio=None):
+        self._wait = wait
+        self._kill = kill
+        self.timeout = timeout
+        self.stdio = stdio
+        self.buffer_size = buffer_size if buffer_size else self.BUFFER_SIZE
+        self.cancelled = False
+        self.timed_out = False
+        self._callbacks = {'stdout': on_stdout, 'stderr': on_stderr}
+        self._buffers = {'stdout': '', 'stderr': ''}
+        self._lines = {'stdout': '', 'stderr': ''}
+        self._code = None
+        self._deadline = time.time() + timeout if timeout else None
+        # a bounded queue, the readers wait when the consumer is slow
+        self._queue = ThreadQueue(self.QUEUE_SIZE)
+        self._running = len(readers)
+        for name, read in readers:
+            thread = threading.Thread(target=self._read, args=(name, read))
+            thread.daemon = True
+            thread.start()
+
+    def _read(self, name, read):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        try:
+            while True:
+                data = read(self.CHUNK_SIZE)
+                if not data:
+                    break
+                self._queue.put((name, decoder.decode(data)))
+            self._queue.put((name, decoder.decode(b'', final=True)))
+        except Exception:
+            self._queue.put((name, decoder.decode(b'', final=True)))
+        finally:
+            self._queue.put((name, None))
+
+    def _feed(self, name, text):
+        buffer = self._buffers[name] + text
+        self._buffers[name] = buffer[-self.buffer_size:]
+        callback = self._callbacks[name]
+        if callback:
+            lines = (self._lines[name] + text).split('\n')
+            self._lines[name] = lines.pop()
+            for line in lines:
+                callback(line)
+
+    def __iter__(self):
+        while self._running:
+            # a chatty command keeps the queue busy, so the deadline is checked before every get
+            if self._deadline and not self.timed_out and time.time() > self._deadline:
+                self.timed_out = True
+                self.cancel()
+            try:
+                name, text = self._queue.get(timeout=0.1)
+            except Empty:
+                continue
+            if text is None:
+                self._running -= 1
+            elif text:
+                self._feed(name, text)
+                yield name, text
+        self._finish()
+
+    def _finish(self):
+        if self._code is not None:
+            return
+        for name in self._lines:
+            if self._lines[name] and self._callbacks[name]:
+                self._callbacks[name](self._lines[name])
+            self._lines[name] = ''
+        try:
+            self._code = self._wait()
+        except Exception as e:
+            self._buffers['stderr'] += str(e)
+            self._code = 255
+        if self.cancelled:
+            self._buffers['stderr'] += 'timeout' if self.timed_out else 'cancelled'
+        if self._code is None or self._code < 0 or (self.cancelled and not self._code):
+            self._code = 255
+        verbose_msg = 'exited code %s' % self._code
+        if self._code:
+            verbose_msg += ', error output:\n%s' % self._buffers['stderr']
+        self.stdio.verbose(verbose_msg)
+
+    def wait(self):
+        for _ in self:
+            pass
+        return self
+
+    def cancel(self):
+        if self._code is None and not self.cancelled:
+            self.cancelled = True
+            self._kill()
+
+    @property
+    def code(self):
+        self.wait()
+        return self._code
+
+    @property
+    def stdout(self):
+        self.wait()
+        return self._buffers['stdout']
+
+    @property
+    def stderr(self):
+        self.wait()
+        return self._buffers['stderr']
+
+
+class SshTaskExecutor(object):
+    """
+    A process-lifetime thread pool for remote commands.
+
+    At most MAX_WORKERS tasks run at the same time, and at most MAX_HOST_WORKERS of them on the same host,
+    so that a large cluster can not exhaust the sessions(sshd MaxSessions) of one server.
+    The tasks of a busy host wait in the queue of that host, not in a worker of the pool, so they never hold up the other hosts.
+    """
+
+    MAX_WORKERS = 32
+    # sshd allows 10 sessions for one connection by default
+    MAX_HOST_WORKERS = 8
+
+    def __init__(self, max_workers=MAX_WORKERS, max_host_workers=MAX_HOST_WORKERS):
+        self.max_workers = max_workers
+        self.max_host_workers = max_host_workers
+        self._executor = None
+        self._host_queues = {}
+        self._host_running = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    @property
+    def executor(self):
+        with self._lock:
+            # the threads are not inherited by the child process
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+                self._host_queues = {}
+                self._host_running = {}
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run_next(self, key):
+        with self._lock:
+            queue = self._host_queues.get(key)
+            if not queue:
+                self._host_running[key] -= 1
+                return
+            future, func, args, kwargs = queue.popleft()
+        if future.set_running_or_notify_cancel():
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+        with self._lock:
+            if not self._host_queues.get(key):
+                self._host_running[key] -= 1
+                return
+        # the next task of the host goes to the end of the pool queue, behind the tasks of the other hosts
+        self.executor.submit(self._run_next, key)
+
+    def submit(self, config, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) for the host of config and return a concurrent.futures.Future
+        """
+        executor = self.executor
+        future = Future()
+        key = (config.host, config.port)
+        with self._lock:
+            self._host_queues.setdefault(key, deque()).append((future, func, args, kwargs))
+            if self._host_running.get(key, 0) >= self.max_host_workers:
+                return future
+            self._host_running[key] = self._host_running.get(key, 0) + 1
+        executor.submit(self._run_next, key)
+        return future
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
+
+
+SSH_TASK_EXECUTOR = SshTaskExecutor()
+atexit.register(SSH_TASK_EXECUTOR.shutdown)
+
+
 class ConcurrentExecutor(object):
 
     def __init__(self, workers=None):
+        # only used without concurrent.futures, otherwise the concurrency is limited by SSH_TASK_EXECUTOR
         self.workers = workers
         self.futures = []
 
@@ -157,12 +381,20 @@ class ConcurrentExecutor(object):
         return len(self.futures)
 
     @staticmethod
-    def execute(future):
+    def execute(future, submit_time=None):
+        start_time = time.time()
         client = SshClient(future.client.config, future.stdio)
-        future.set_return(client.execute_command(future.command, timeout=future.timeout))
+        try:
+            future.set_return(client.execute_command(future.command, timeout=future.timeout))
+        finally:
+            client.close()
+            end_time = time.time()
+            if future.stdio:
+                future.stdio.verbose('%s task cost %.3fs(wait %.3fs): %s' % (
+                    future.client.config, end_time - start_time, start_time - submit_time if submit_time else 0, future.command))
         return future
 
-    def submit(self):
+    def _submit_by_pool(self):
         rets = []
         pool = ThreadPool(processes=self.workers)
         try:
@@ -174,6 +406,16 @@ class ConcurrentExecutor(object):
         self.futures = []
         return rets
 
+    def submit(self):
+        if ThreadPoolExecutor is None:
+            return self._submit_by_pool()
+        submit_time = time.time()
+        tasks = []
+        for future in self.futures:
+            tasks.append(SSH_TASK_EXECUTOR.submit(future.client.config, ConcurrentExecutor.execute, future, submit_time))
+        self.futures = []
+        return [task.result() for task in tasks]
+
 
 class LocalClient(SafeStdio):
     
@@ -300,9 +542,299 @@ class LocalClient(SafeStdio):
                 process.terminate()
         return SshReturn(code, stdout, stderr)
 
+class SshConnectionPool(object):
+
+    # idle transports are closed after IDLE_TIMEOUT seconds without borrowers
+    IDLE_TIMEOUT = 600
+    # borrowed transports idle longer than HEALTH_CHECK_INTERVAL seconds are probed before reuse
+    HEALTH_CHECK_INTERVAL = 30
+
+    class Connection(object):
+
+        def __init__(self, key, ssh_client):
+            self.key = key
+            self.ssh_client = ssh_client
+            self.refs = 0
+            self.last_used = time.time()
+
+        def is_active(self, check_interval=0):
+            transport = self.ssh_client.get_transport()
+            if transport is None or not transport.is_active():
+                return False
+            if check_interval and time.time() - self.last_used > check_interval:
+                try:
+                    transport.send_ignore()
+                except Exception:
+                    return False
+            return True
+
+        def close(self):
+            try:
+                self.ssh_client.close()
+            except Exception:
+                pass
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, check_interval=HEALTH_CHECK_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._connections = {}
+        # connections removed from the pool while still borrowed, closed by the last borrower
+        self._retired = {}
+
+    @staticmethod
+    def get_key(config):
+        # credentials are part of the key so that a changed password or key file is never masked by a pooled transport
+        return (config.host, config.port, config.username, config.password, config.key_filename)
+
+    def _check_pid(self):
+        # transports can not be shared with a forked child, drop them without closing the parent's sockets
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._key_locks = {}
+                    self._connections = {}
+                    self._retired = {}
+
+    def _get_key_lock(self, key):
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def acquire(self, config, disabled_algorithms=None):
+        self._check_pid()
+        self.evict_idle()
+        key = self.get_key(config)
+        with self._get_key_lock(key):
+            with self._lock:
+                connection = self._connections.get(key)
+            if connection and not connection.is_active(self.check_interval):
+                self._remove(connection)
+                connection = None
+            if connection is None:
+                ssh_client = paramiko.SSHClient()
+                ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+                ssh_client.set_log_channel(None)
+                ssh_client.connect(
+                    config.host,
+                    port=config.port,
+                    username=config.username,
+                    password=config.password,
+                    key_filename=config.key_filename,
+                    timeout=config.timeout,
+                    disabled_algorithms=disabled_algorithms
+                )
+                connection = self.Connection(key, ssh_client)
+                with self._lock:
+                    self._connections[key] = connection
+            with self._lock:
+                connection.refs += 1
+                connection.last_used = time.time()
+            return connection.ssh_client
+
+    def release(self, config, ssh_client):
+        key = self.get_key(config)
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection and connection.ssh_client is ssh_client:
+                connection.refs = max(0, connection.refs - 1)
+                connection.last_used = time.time()
+                return True
+            # the transport has been invalidated in the meantime and is no longer tracked by the pool
+            connection = self._retired.get(id(ssh_client))
+            if connection:
+                connection.refs -= 1
+                if connection.refs > 0:
+                    return False
+                del self._retired[id(ssh_client)]
+        ssh_client.close()
+        return False
+
+    def invalidate(self, config, ssh_client=None):
+        key = self.get_key(config)
+        with self._lock:
+            connection = self._connections.get(key)
+            if not connection or (ssh_client is not None and connection.ssh_client is not ssh_client):
+                return False
+        return self._remove(connection)
+
+    def _remove(self, connection):
+        with self._lock:
+            if self._connections.get(connection.key) is connection:
+                del self._connections[connection.key]
+            if connection.refs > 0:
+                # the other borrowers may still use the transport, the last one closes it
+                self._retired[id(connection.ssh_client)] = connection
+                return True
+        connection.close()
+        return True
+
+    def evict_idle(self):
+        now = time.time()
+        with self._lock:
+            idle_connections = [
+                connection for connection in self._connections.values()
+                if connection.refs == 0 and now - connection.last_used > self.idle_timeout
+            ]
+        for connection in idle_connections:
+            self._remove(connection)
+
+    def size(self):
+        return len(self._connections)
+
+    def close_all(self):
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            connections = list(self._connections.values()) + list(self._retired.values())
+            self._connections = {}
+            self._retired = {}
+        for connection in connections:
+            connection.close()
+
+
+SSH_CONNECTION_POOL = SshConnectionPool()
+atexit.register(SSH_CONNECTION_POOL.close_all)
+
+
+class HostFacts(object):
+
+    # name -> command. All of them are collected by one batched probe.
+    PROBES = (
+        ('meminfo', 'cat /proc/meminfo'),
+        ('cpuinfo', 'cat /proc/cpuinfo'),
+        ('cpu_count', "grep -e 'processor\\s*:' /proc/cpuinfo | wc -l"),
+        ('df', 'df --block-size=1024'),
+        ('df_human', 'df -h'),
+        ('ulimit', 'ulimit -a'),
+        ('sysctl', 'sysctl -a'),
+        ('aio', 'cat /proc/sys/fs/aio-max-nr /proc/sys/fs/aio-nr'),
+        ('nic', 'ls /sys/class/net'),
+        ('os_release', 'cat /etc/os-release'),
+        ('host_type', 'systemd-detect-virt'),
+    )
+
+    def __init__(self, host, returns=None, timestamp=None):
+        self.host = host
+        self.returns = returns if returns else {}
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    @classmethod
+    def probe(cls, client, stdio=None):
+        names = [name for name, _ in cls.PROBES]
+        rets = client.execute_batch([command for _, command in cls.PROBES], stdio=stdio)
+        returns = {}
+        for name, ret in zip(names, rets):
+            returns[name] = SshReturn(ret.code, ret.stdout, ret.stderr)
+        return cls(client.config.host, returns)
+
+    def is_expired(self, ttl):
+        return ttl is not None and time.time() - self.timestamp > ttl
+
+    def get_return(self, name):
+        return self.returns.get(name)
+
+    def get(self, name, default=None):
+        ret = self.returns.get(name)
+        return ret.stdout if ret else default
+
+    def to_dict(self):
+        returns = {}
+        for name in self.returns:
+            ret = self.returns[name]
+            returns[name] = [ret.code, ret.stdout, ret.stderr]
+        return {'timestamp': self.timestamp, 'returns': returns}
+
+    @classmethod
+    def from_dict(cls, host, data):
+        returns = {}
+        for name, ret in data.get('returns', {}).items():
+            returns[name] = SshReturn(*ret)
+        return cls(host, returns, data.get('timestamp', 0))
+
+
+class HostFactsCache(SafeStdio):
+
+    DEFAULT_TTL = 600
+
+    def __init__(self, path=None, ttl=None, stdio=None):
+        self.path = path
+        if ttl is None:
+            ttl = int(COMMAND_ENV.get(ENV_HOST_FACTS_TTL, self.DEFAULT_TTL))
+        self.ttl = ttl
+        self.stdio = stdio
+        self._facts = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._facts is not None:
+            return self._facts
+        self._facts = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                for key in data:
+                    self._facts[key] = HostFacts.from_dict(key.rsplit('@', 1)[-1].rsplit(':', 1)[0], data[key])
+            except Exception:
+                self.stdio and getattr(self.stdio, 'verbose', print)('failed to load host facts from %s' % self.path)
+        return self._facts
+
+    def _dump(self):
+        if not self.path:
+            return
+        data = {}
+        for key in self._facts:
+            if not self._facts[key].is_expired(self.ttl):
+                data[key] = self._facts[key].to_dict()
+        tmp_path = '%s.%s.tmp' % (self.path, os.getpid())
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.rename(tmp_path, self.path)
+        except Exception:
+            self.stdio and getattr(self.stdio, 'verbose', print)('failed to dump host facts to %s' % self.path)
+            FileUtil.rm(tmp_path)
+
+    @staticmethod
+    def get_key(client):
+        # the facts depend on the user too, e.g. ulimit
+        return '%s@%s:%s' % (client.config.username, client.config.host, client.config.port)
+
+    def get(self, client, refresh=False, stdio=None):
+        key = self.get_key(client)
+        with self._lock:
+            facts = self._load().get(key)
+            if facts and not refresh and not facts.is_expired(self.ttl):
+                return facts
+        facts = HostFacts.probe(client, stdio=stdio)
+        with self._lock:
+            self._facts[key] = facts
+            self._dump()
+        return facts
+
+    def invalidate(self, client=None):
+        with self._lock:
+            facts = self._load()
+            if client is None:
+                facts.clear()
+            else:
+                facts.pop(self.get_key(client), None)
+            self._dump()
+
+
+# used by the clients which are not bound to a deployment
+HOST_FACTS_CACHE = HostFactsCache()
+
+
 class RemoteTransporter(enum.Enum):
     CLIENT = 0
     RSYNC = 1
+    TAR = 2
 
     def __lt__(self, other):
         return self.value < other.value
@@ -316,15 +848,22 @@ class SshClient(SafeStdio):
     DEFAULT_PATH = '/sbin:/usr/local/bin:/usr/bin:/usr/local/sbin:/usr/sbin:'
     LOCAL_HOST = ['127.0.0.1', 'localhost', '127.1', '127.0.1']
     DISABLED_ALGORITHMS = dict(pubkeys=["rsa-sha2-512", "rsa-sha2-256"])
+    # sshd allows 10 sessions for one connection by default
+    SFTP_CONCURRENCY = 6
+    MAX_COMMAND_LENGTH = 65536
+    TAR_BUFFER_SIZE = 1 << 20
+    TAR_MAX_ARGS = 100
 
     def __init__(self, config, stdio=None):
         self.config = config
         self.stdio = stdio
         self.sftp = None
         self.is_connected = False
-        self.ssh_client = SSHClient()
+        self.ssh_client = None
         self.env_str = ''
         self._remote_transporter = None
+        self._tar_compressor = None
+        self.host_facts_cache = None
         self.task_queue = None
         self.result_queue = None
         self._is_local = self.is_local()
@@ -393,23 +932,13 @@ class SshClient(SafeStdio):
             return True
         err = None
         try:
-            self.ssh_client.set_missing_host_key_policy(AutoAddPolicy())
-            self.ssh_client.set_log_channel(None)
             stdio.verbose('host: %s, port: %s, user: %s, password: %s' % (self.config.host, self.config.port, self.config.username, self.config.password))
-            self.ssh_client.connect(
-                self.config.host,
-                port=self.config.port,
-                username=self.config.username,
-                password=self.config.password,
-                key_filename=self.config.key_filename,
-                timeout=self.config.timeout,
-                disabled_algorithms=self._disabled_rsa_algorithms
-            )
+            self.ssh_client = SSH_CONNECTION_POOL.acquire(self.config, disabled_algorithms=self._disabled_rsa_algorithms)
             self.is_connected = True
-        except AuthenticationException:
+        except paramiko.AuthenticationException:
             stdio.exception('')
             err = EC_SSH_CONNECT.format(user=self.config.username, ip=self.config.host, message='username or password error')
-        except NoValidConnectionsError:
+        except paramiko.ssh_exception.NoValidConnectionsError:
             stdio.exception('')
             err = EC_SSH_CONNECT.format(user=self.config.username, ip=self.config.host, message='time out')
         except BaseException as e:
@@ -427,7 +956,6 @@ class SshClient(SafeStdio):
         if self.sftp:
             return True
         if self._login(stdio=stdio):
-            SFTPClient.from_transport(self.ssh_client.get_transport())
             self.sftp = self.ssh_client.open_sftp()
             return True
         return False
@@ -442,19 +970,30 @@ class SshClient(SafeStdio):
         return self._login(stdio=stdio, exit=exit)
 
     def reconnect(self, stdio=None):
-        self.close(stdio=stdio)
+        self.close(invalidate=True, stdio=stdio)
         return self.connect(stdio=stdio)
 
-    def close(self, stdio=None):
+    def close(self, invalidate=False, stdio=None):
         if self._is_local:
             return True
-        if self.is_connected:
-            self.ssh_client.close()
         if self.sftp:
+            try:
+                self.sftp.close()
+            except Exception:
+                pass
             self.sftp = None
+        if self.is_connected:
+            if invalidate:
+                SSH_CONNECTION_POOL.invalidate(self.config, self.ssh_client)
+            SSH_CONNECTION_POOL.release(self.config, self.ssh_client)
+            self.ssh_client = None
+            self.is_connected = False
 
     def __del__(self):
-        self.close()
+        try:
+            self.close()
+        except Exception:
+            pass
 
     def _execute_command(self, command, timeout=None, retry=3, stdio=None):
         if not self._login(stdio):
@@ -473,10 +1012,16 @@ class SshClient(SafeStdio):
             if code:
                 verbose_msg = 'exited code %s, error output:\n%s' % (code, error)
             stdio.verbose(verbose_msg)
-        except SSHException as e:
+        except paramiko.SSHException as e:
             if retry:
-                self.close()
-                return self._execute_command(command, retry-1, stdio)
+                # a channel can fail on a healthy transport (e.g. MaxSessions is exceeded by the other borrowers),
+                # then only a new channel is needed and the shared transport is kept
+                transport = self.ssh_client.get_transport()
+                if transport is None or not transport.is_active():
+                    self.close(invalidate=True)
+                else:
+                    time.sleep(0.1)
+                return self._execute_command(command, timeout=timeout, retry=retry-1, stdio=stdio)
             else:
                 stdio.exception('')
                 stdio.critical('%s@%s connect failed: %s' % (self.config.username, self.config.host, e))
@@ -502,10 +1047,126 @@ class SshClient(SafeStdio):
         command = '(%s %s);echo -e "\n$?\c"' % (self.env_str, command.strip(';').lstrip('\n'))
         return self._execute_command(command, retry=3, timeout=timeout, stdio=stdio)
 
+    def execute_command_stream(self, command, on_stdout=None, on_stderr=None, timeout=None, buffer_size=None, stdio=None):
+        """
+        Start a command and return a StreamSshReturn at once, the outputs are read while the command is running.
+
+        :param command: the command to execute
+        :param on_stdout: called with each line of stdout, e.g. stdio.verbose
+        :param on_stderr: called with each line of stderr
+        :param timeout: the command is cancelled after timeout seconds. default no timeout
+        :param buffer_size: the max size of stdout/stderr kept in the return
+        :return: StreamSshReturn. Iterate it for the output chunks, or call cancel() to stop the command
+        """
+        if timeout is not None and timeout <= 0:
+            timeout = None
+        stdio.verbose('%s stream execute: %s ' % (self.config, command))
+        kwargs = dict(timeout=timeout, on_stdout=on_stdout, on_stderr=on_stderr, buffer_size=buffer_size, stdio=stdio)
+        if self._is_local:
+            try:
+                popen = Popen(command, env=LocalClient.init_env(self.env if self.env else None), shell=True, stdout=PIPE, stderr=PIPE, start_new_session=True)
+            except Exception as e:
+                stdio.exception('')
+                return SshReturn(255, '', str(e))
+
+            def kill():
+                try:
+                    os.killpg(popen.pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            readers = [
+                ('stdout', lambda size: os.read(popen.stdout.fileno(), size)),
+                ('stderr', lambda size: os.read(popen.stderr.fileno(), size))
+            ]
+            return StreamSshReturn(readers, popen.wait, kill, **kwargs)
+
+        if not self._login(stdio):
+            return SshReturn(255, '', 'connect failed')
+        token = '__OBD_PID_%s__' % uuid.uuid4().hex
+        state = {'head': b'', 'pid': None}
+        try:
+            channel = self.ssh_client.get_transport().open_session()
+            # sshd starts the command in a new session, so the pid of the shell is also its process group id
+            channel.exec_command('echo %s$$; %s %s' % (token, self.env_str, command.strip(';').lstrip('\n')))
+        except Exception as e:
+            stdio.exception('')
+            return SshReturn(255, '', str(e))
+
+        def read_stdout(size):
+            while state['pid'] is None:
+                data = channel.recv(size)
+                if not data:
+                    return data
+                state['head'] += data
+                if b'\n' in state['head']:
+                    line, _, data = state['head'].partition(b'\n')
+                    state['pid'] = line.decode(errors='replace').replace(token, '').strip()
+                    if data:
+                        return data
+            return channel.recv(size)
+
+        def wait():
+            try:
+                return channel.recv_exit_status()
+            finally:
+                channel.close()
+
+        def kill():
+            if state['pid'] and state['pid'].isdigit():
+                self.execute_command('kill -TERM -- -%s' % state['pid'], stdio=stdio)
+            channel.close()
+        readers = [('stdout', read_stdout), ('stderr', channel.recv_stderr)]
+        return StreamSshReturn(readers, wait, kill, **kwargs)
+
+    def execute_batch(self, commands, timeout=None, stdio=None):
+        """
+        Execute a group of commands in one round-trip.
+
+        The commands run one after another in a single remote shell script. The stdout, stderr and exit code
+        of each command are framed by a random token and split apart locally.
+
+        :param commands: the commands to execute
+        :param timeout: the timeout of the whole batch
+        :return: a list of SshReturn, one for each command and in the same order
+        """
+        commands = list(commands)
+        if not commands:
+            return []
+        token = '__OBD_BATCH_%s__' % uuid.uuid4().hex
+        script = ['__obd_batch_dir=$(mktemp -d 2>/dev/null || (mkdir -p /tmp/%s && echo /tmp/%s))' % (token, token)]
+        for idx, command in enumerate(commands):
+            script.append('(%s %s) >$__obd_batch_dir/%d.out 2>$__obd_batch_dir/%d.err </dev/null; printf %%s $? >$__obd_batch_dir/%d.code' % (
+                self.env_str, command.strip(';').lstrip('\n'), idx, idx, idx))
+        script.append('for __obd_idx in %s; do for __obd_type in out err code; do printf "\\n%s %%s %%s\\n" $__obd_idx $__obd_type; cat $__obd_batch_dir/$__obd_idx.$__obd_type 2>/dev/null; done; done' % (
+            ' '.join([str(idx) for idx in range(len(commands))]), token))
+        script.append('rm -fr $__obd_batch_dir')
+        stdio.verbose('%s execute batch: %s' % (self.config, commands))
+        ret = self.execute_command('\n'.join(script), timeout=timeout, stdio=stdio)
+        frames = {}
+        for frame in ret.stdout.split('\n%s ' % token)[1:]:
+            header, _, content = frame.partition('\n')
+            frames[tuple(header.split(' ', 1))] = content
+        rets = []
+        for idx in range(len(commands)):
+            code = frames.get((str(idx), 'code'), '').strip()
+            if not code.isdigit():
+                rets.append(SshReturn(255, '', ret.stderr or 'batch execute failed'))
+                continue
+            rets.append(SshReturn(int(code), frames.get((str(idx), 'out'), ''), frames.get((str(idx), 'err'), '')))
+        return rets
+
+    def get_host_facts(self, refresh=False, stdio=None):
+        cache = self.host_facts_cache if self.host_facts_cache else HOST_FACTS_CACHE
+        return cache.get(self, refresh=refresh, stdio=stdio)
+
     @property
     def disable_rsync(self):
         return COMMAND_ENV.get(ENV_DISABLE_RSYNC) == "1"
 
+    @property
+    def enable_tar_transporter(self):
+        return COMMAND_ENV.get(ENV_ENABLE_TAR_TRANSPORTER) == "1"
+
     @property
     def remote_transporter(self):
         if self._remote_transporter is not None:
@@ -516,10 +1177,117 @@ class SshClient(SafeStdio):
                 ret = LocalClient.execute_command('rsync -h', stdio=self.stdio) and self.execute_command('rsync -h', stdio=self.stdio)
                 if ret:
                     _transporter = RemoteTransporter.RSYNC
+            # the parallel sftp channels are the default without rsync, the tar stream is opt-in
+            if _transporter == RemoteTransporter.CLIENT and self.enable_tar_transporter and self.tar_compressor is not None:
+                _transporter = RemoteTransporter.TAR
         self._remote_transporter = _transporter
         self.stdio.verbose("current remote_transporter {}".format(self._remote_transporter))
         return self._remote_transporter
 
+    @property
+    def tar_compressor(self):
+        """
+        None if tar can not be used to send files, otherwise the compress command('' means no compression).
+        """
+        if self._tar_compressor is None:
+            self._tar_compressor = False
+            if LocalClient.execute_command('tar --version', stdio=self.stdio) and self.execute_command('tar --version', stdio=self.stdio):
+                self._tar_compressor = ''
+                if LocalClient.execute_command('zstd -V', stdio=self.stdio) and self.execute_command('zstd -V', stdio=self.stdio):
+                    self._tar_compressor = 'zstd'
+        return None if self._tar_compressor is False else self._tar_compressor
+
+    def put_tar(self, local_dir, remote_dir, paths=None, dereference=False, stdio=None):
+        """
+        Send the paths under local_dir to remote_dir as one tar stream. Symlinks and modes are kept unless dereference is True.
+
+        :param local_dir: the local base directory
+        :param remote_dir: the remote base directory
+        :param paths: the paths relative to local_dir to send. default is all of the content of local_dir
+        :param dereference: send the files that the symlinks point to
+        :return: True if succeed, otherwise False
+        """
+        if paths is None:
+            paths = os.listdir(local_dir) if os.path.isdir(local_dir) else []
+        if not paths:
+            stdio.verbose("%s is empty" % local_dir)
+            return True
+        compressor = '' if self._is_local else self.tar_compressor
+        if compressor is None:
+            stdio.verbose('tar is not available for %s' % self)
+            return False
+        if not self._is_local and not self._login(stdio):
+            return False
+        list_file = None
+        if len(paths) > self.TAR_MAX_ARGS:
+            # too many paths for the command line
+            list_file = tempfile.NamedTemporaryFile(mode='w')
+            list_file.write('\n'.join(paths))
+            list_file.flush()
+            tar_cmd = 'tar -C %s %s-cf - -T %s' % (quote(local_dir), '-h ' if dereference else '', quote(list_file.name))
+        else:
+            tar_cmd = 'tar -C %s %s-cf - %s' % (quote(local_dir), '-h ' if dereference else '', ' '.join([quote(path) for path in paths]))
+        extract_cmd = 'mkdir -p %s && %star -xf - -C %s' % (quote(remote_dir), '%s -d -q -c | ' % compressor if compressor else '', quote(remote_dir))
+        stdio.verbose('send %s to %s by tar: %s' % (local_dir, remote_dir, tar_cmd))
+        procs = []
+        # nobody reads stderr while the data flows, a pipe could fill up and block the process
+        errors = []
+        channel = None
+        try:
+            errors.append(tempfile.TemporaryFile())
+            procs.append(Popen(tar_cmd, stdout=PIPE, stderr=errors[-1], shell=True))
+            if compressor:
+                errors.append(tempfile.TemporaryFile())
+                procs.append(Popen('%s -q -c' % compressor, stdin=procs[0].stdout, stdout=PIPE, stderr=errors[-1], shell=True))
+                procs[0].stdout.close()
+            if self._is_local:
+                errors.append(tempfile.TemporaryFile())
+                sink = Popen(extract_cmd, stdin=PIPE, stderr=errors[-1], shell=True)
+                send = sink.stdin.write
+            else:
+                channel = self.ssh_client.get_transport().open_session()
+                channel.exec_command('(%s %s)' % (self.env_str, extract_cmd))
+                send = channel.sendall
+            while True:
+                data = procs[-1].stdout.read(self.TAR_BUFFER_SIZE)
+                if not data:
+                    break
+                send(data)
+            if self._is_local:
+                sink.stdin.close()
+                code = sink.wait()
+                errors[-1].seek(0)
+                error = errors[-1].read().decode(errors='replace')
+            else:
+                channel.shutdown_write()
+                code = channel.recv_exit_status()
+                error = channel.makefile_stderr('rb').read().decode(errors='replace')
+            for proc, error_file in zip(procs, errors):
+                if proc.wait() != 0:
+                    error_file.seek(0)
+                    stdio.verbose('local tar exited code %s, error output:\n%s' % (proc.returncode, error_file.read().decode(errors='replace')))
+                    return False
+            if code:
+                stdio.verbose('extract tar exited code %s, error output:\n%s' % (code, error))
+                return False
+            return True
+        except Exception as e:
+            stdio.exception('Fail to send %s by tar: %s' % (local_dir, e))
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+            return False
+        finally:
+            if channel:
+                channel.close()
+            if list_file:
+                list_file.close()
+            for error_file in errors:
+                error_file.close()
+
+    def _tar_put_dir(self, local_dir, remote_dir, stdio=None):
+        return self.put_tar(local_dir, remote_dir, dereference=True, stdio=stdio)
+
     def put_file(self, local_path, remote_path, stdio=None):
         if not os.path.isfile(local_path):
             stdio.error('path: %s is not file' % local_path)
@@ -612,9 +1380,25 @@ class SshClient(SafeStdio):
     def _put_dir(self):
         if self.remote_transporter == RemoteTransporter.RSYNC:
             return self._rsync_put_dir
+        elif self.remote_transporter == RemoteTransporter.TAR:
+            return self._tar_put_dir
         else:
             return self._client_put_dir
 
+    @staticmethod
+    def _split_command(prefix, args, limit=None):
+        limit = limit if limit else SshClient.MAX_COMMAND_LENGTH
+        commands = []
+        command = prefix
+        for arg in args:
+            if command != prefix and len(command) + len(arg) + 1 > limit:
+                commands.append(command)
+                command = prefix
+            command += ' ' + arg
+        if command != prefix:
+            commands.append(command)
+        return commands
+
     def _client_put_dir(self, local_dir, remote_dir, stdio=None):
         has_failed = False
         ret = LocalClient.execute_command('find -L %s -type f' % local_dir)
@@ -626,16 +1410,72 @@ class SshClient(SafeStdio):
             has_failed = True
         all_dirs = ret.stdout.strip().split('\n') if ret.stdout else []
         self._filter_dir_in_file_path(all_files, all_dirs)
+
+        # prepare the remote tree in a few commands instead of one round-trip for each file
+        files = []
+        parent_dirs = set()
+        file_modes = {}
         for local_path in all_files:
             remote_path = os.path.join(remote_dir, os.path.relpath(local_path, local_dir))
-            if not self._client_put_file(local_path, remote_path, stdio=stdio):
-                stdio.error('Fail to get %s' % remote_path)
-                has_failed = True
+            files.append((local_path, remote_path))
+            parent_dirs.add(os.path.dirname(remote_path))
+            stat = oct(os.stat(local_path).st_mode)[-3:]
+            file_modes.setdefault(stat, []).append(remote_path)
+        commands = self._split_command('rm -fr', [remote_path for _, remote_path in files])
+        commands += self._split_command('mkdir -p', sorted(parent_dirs))
+        dir_cmds = []
         for local_path in all_dirs:
             remote_path = os.path.join(remote_dir, os.path.relpath(local_path, local_dir))
             stat = oct(os.stat(local_path).st_mode)[-3:]
-            cmd = '[ -d "{remote_path}" ] || (mkdir -p {remote_path}; chmod {stat} {remote_path})'.format(remote_path=remote_path, stat=stat)
-            if not self.execute_command(cmd):
+            dir_cmds.append('[ -d "{remote_path}" ] || (mkdir -p {remote_path}; chmod {stat} {remote_path});'.format(remote_path=remote_path, stat=stat))
+        commands += self._split_command('', dir_cmds)
+        for cmd in commands:
+            if not self.execute_command(cmd.strip(), stdio=stdio):
+                return False
+
+        # send files through several sftp channels of the same transport
+        channels = [self.sftp]
+        while len(channels) < min(self.SFTP_CONCURRENCY, len(files)):
+            try:
+                channels.append(self.ssh_client.open_sftp())
+            except Exception as e:
+                stdio.verbose('open sftp channel failed: %s' % e)
+                break
+        lock = threading.Lock()
+        failed = []
+        tasks = list(reversed(files))
+
+        def upload(sftp):
+            while True:
+                with lock:
+                    if not tasks:
+                        return
+                    local_path, remote_path = tasks.pop()
+                stdio.verbose('send %s to %s' % (local_path, remote_path))
+                try:
+                    sftp.put(local_path.replace('~', os.getenv('HOME')), remote_path.replace('~', os.getenv('HOME')), confirm=False)
+                except Exception as e:
+                    stdio.verbose('send %s failed: %s' % (local_path, e))
+                    with lock:
+                        failed.append(remote_path)
+
+        pool = ThreadPool(len(channels))
+        try:
+            pool.map(upload, channels)
+        finally:
+            pool.close()
+            for sftp in channels[1:]:
+                sftp.close()
+        for remote_path in failed:
+            stdio.error('Fail to send %s' % remote_path)
+            has_failed = True
+
+        # apply the modes at the end
+        commands = []
+        for stat in file_modes:
+            commands += self._split_command('chmod %s' % stat, file_modes[stat])
+        for cmd in commands:
+            if not self.execute_command(cmd, stdio=stdio):
                 has_failed = True
         return not has_failed
 
@@ -32,7 +32,11 @@ import signal
 import shutil
 import re
 import json
+import mmap
+import atexit
 import hashlib
+import importlib
+import threading
 import socket
 import datetime
 from io import BytesIO
@@ -43,9 +47,31 @@ from ruamel.yaml import YAML, YAMLContextManager, representer
 
 from _errno import EC_SQL_EXECUTE_FAILED
 from _stdio import SafeStdio
+
+
+class LazyModule(object):
+
+    # stands in for a heavy module that is imported on first attribute access
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        if self.__dict__['_module'] is None:
+            self.__dict__['_module'] = importlib.import_module(self.__dict__['_name'])
+        return self.__dict__['_module']
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __repr__(self):
+        return '<lazy module %s>' % self.__dict__['_name']
+
+
 _open = open
 if sys.version_info.major == 2:
-    import MySQLdb as mysql
+    import imp
+    mysql = LazyModule('MySQLdb')
     from collections import OrderedDict
     from backports import lzma
     from io import open as _open
@@ -64,14 +90,14 @@ if sys.version_info.major == 2:
 
 else:
     import lzma
-    import pymysql as mysql
+    mysql = LazyModule('pymysql')
     encoding_open = open
 
     class OrderedDict(dict):
         pass
 
 
-__all__ = ("timeout", "DynamicLoading", "ConfigUtil", "DirectoryUtil", "FileUtil", "YamlLoader", "OrderedDict", "COMMAND_ENV", "TimeUtils", "Cursor")
+__all__ = ("timeout", "LazyModule", "DynamicLoading", "ConfigUtil", "DirectoryUtil", "FileUtil", "YamlLoader", "OrderedDict", "COMMAND_ENV", "TimeUtils", "Cursor")
 
 _WINDOWS = os.name == 'nt'
 
@@ -135,6 +161,7 @@ class DynamicLoading(object):
 
     LIBS_PATH = {}
     MODULES = {}
+    SOURCE_MODULES = {}
 
     @staticmethod
     def add_lib_path(lib):
@@ -183,6 +210,36 @@ class DynamicLoading(object):
         stdio and getattr(stdio, 'verbose', print)('add %s ref count to %s' % (name, DynamicLoading.MODULES[name].count))
         return DynamicLoading.MODULES[name].module
 
+    @staticmethod
+    def load_source(path, libs=None, stdio=None):
+        # import a script by path under a name of its own, and keep it for the life of the process
+        path = os.path.abspath(path)
+        module = DynamicLoading.SOURCE_MODULES.get(path)
+        if module is None:
+            name = '_obd_source_%s' % hashlib.md5(path.encode('utf-8')).hexdigest()
+            libs = libs if libs else [os.path.dirname(path)]
+            # the libs are only needed by the imports at the top of the script
+            DynamicLoading.add_libs_path(libs)
+            try:
+                stdio and getattr(stdio, 'verbose', print)('import %s' % path)
+                if sys.version_info.major == 2:
+                    module = imp.load_source(name, path)
+                else:
+                    import importlib.util
+                    spec = importlib.util.spec_from_file_location(name, path)
+                    module = importlib.util.module_from_spec(spec)
+                    sys.modules[name] = module
+                    spec.loader.exec_module(module)
+            except:
+                sys.modules.pop(name, None)
+                stdio and getattr(stdio, 'exception', print)('import %s failed' % path)
+                stdio and getattr(stdio, 'verbose', print)('sys.path: %s' % sys.path)
+                return None
+            finally:
+                DynamicLoading.remove_libs_path(libs)
+            DynamicLoading.SOURCE_MODULES[path] = module
+        return module
+
     @staticmethod
     def export_module(name, stdio=None):
         if name not in DynamicLoading.MODULES:
@@ -335,13 +392,112 @@ class DirectoryUtil(object):
         return False
 
 
+class FileChecksumCache(object):
+
+    # md5 of local files, keyed by (path, size, mtime, inode) and persisted under the obd home
+    RELATIVE_PATH = 'cache/checksum'
+    MAX_ENTRIES = 1 << 17
+
+    def __init__(self):
+        self._entries = None
+        self._changed = False
+        self._lock = threading.Lock()
+        atexit.register(self.dump)
+
+    @property
+    def path(self):
+        home = os.path.join(os.environ.get('OBD_HOME', os.getenv('HOME', '')), '.obd')
+        return os.path.join(home, self.RELATIVE_PATH)
+
+    @staticmethod
+    def file_key(st):
+        return [st.st_size, getattr(st, 'st_mtime_ns', st.st_mtime), st.st_ino]
+
+    def _load(self):
+        entries = {}
+        try:
+            if os.path.isfile(self.path):
+                with open(self.path, 'r') as f:
+                    entries = json.load(f)
+        except:
+            entries = {}
+        return entries if isinstance(entries, dict) else {}
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._load()
+        return self._entries
+
+    def get(self, path, st):
+        entry = self.entries.get(path)
+        if entry and entry[:3] == self.file_key(st):
+            return entry[3]
+        return None
+
+    def set(self, path, st, md5):
+        with self._lock:
+            self.entries[path] = self.file_key(st) + [md5]
+            self._changed = True
+
+    def dump(self):
+        if not self._changed:
+            return
+        with self._lock:
+            # merge with the entries written by other processes in the meantime
+            entries = self._load()
+            entries.update(self._entries)
+            if len(entries) > self.MAX_ENTRIES:
+                entries = dict((path, entries[path]) for path in entries if os.path.isfile(path))
+            path = self.path
+            tmp_path = '%s.%s.tmp' % (path, os.getpid())
+            try:
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(tmp_path, 'w') as f:
+                    json.dump(entries, f)
+                os.rename(tmp_path, path)
+                self._changed = False
+            except:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+
 class FileUtil(object):
 
     COPY_BUFSIZE = 1024 * 1024 if _WINDOWS else 64 * 1024
+    FICLONE = 0x40049409
+
+    CHECKSUM_CACHE = FileChecksumCache()
+    CHECKSUM_WORKERS = 8
+
+    @staticmethod
+    def _md5(target_path):
+        m = hashlib.md5()
+        with open(target_path, 'rb') as f:
+            try:
+                # hash the page cache directly, the GIL is released while hashing
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, mmap.error, OSError):
+                # empty or unmappable file
+                buf = None
+            if buf is not None:
+                try:
+                    m.update(buf)
+                finally:
+                    buf.close()
+            else:
+                while True:
+                    data = f.read(FileUtil.COPY_BUFSIZE)
+                    if not data:
+                        break
+                    m.update(data)
+        return m.hexdigest()
 
     @staticmethod
     def checksum(target_path, stdio=None):
-        from ssh import LocalClient
         if not os.path.isfile(target_path):
             info = 'No such file: ' + target_path
             if stdio:
@@ -349,14 +505,57 @@ class FileUtil(object):
                 return False
             else:
                 raise IOError(info)
-        ret = LocalClient.execute_command('md5sum {}'.format(target_path), stdio=stdio)
-        if ret:
-            return ret.stdout.strip().split(' ')[0].encode('utf-8')
-        else:
-            m = hashlib.md5()
-            with open(target_path, 'rb') as f:
-                m.update(f.read())
-            return m.hexdigest().encode(sys.getdefaultencoding())
+        path = os.path.abspath(target_path)
+        st = os.stat(path)
+        value = FileUtil.CHECKSUM_CACHE.get(path, st)
+        if value is None:
+            value = FileUtil._md5(path)
+            # skip files modified while being hashed
+            if FileChecksumCache.file_key(os.stat(path)) == FileChecksumCache.file_key(st):
+                FileUtil.CHECKSUM_CACHE.set(path, st, value)
+        return value.encode(sys.getdefaultencoding())
+
+    @staticmethod
+    def checksums(target_paths, stdio=None):
+        target_paths = list(target_paths)
+        if len(target_paths) < 2:
+            return dict((path, FileUtil.checksum(path, stdio=stdio)) for path in target_paths)
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(processes=min(FileUtil.CHECKSUM_WORKERS, len(target_paths)))
+        try:
+            values = pool.map(lambda path: FileUtil.checksum(path, stdio=stdio), target_paths)
+        finally:
+            pool.close()
+        return dict(zip(target_paths, values))
+
+    @staticmethod
+    def clone(src, dst, stdio=None):
+        # hard link first, then reflink on copy-on-write filesystems, a plain copy as the last resort
+        stdio and getattr(stdio, 'verbose', print)('clone %s %s' % (src, dst))
+        tmp_path = '%s.%s.%s.tmp' % (dst, os.getpid(), random.randint(0, 1 << 30))
+        try:
+            try:
+                os.link(src, tmp_path)
+            except OSError:
+                try:
+                    with open(src, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+                        fcntl.ioctl(fdst.fileno(), FileUtil.FICLONE, fsrc.fileno())
+                    os.chmod(tmp_path, os.stat(src).st_mode)
+                except (IOError, OSError):
+                    FileUtil.rm(tmp_path)
+                    if not FileUtil.copy(src, tmp_path, stdio=stdio):
+                        return False
+            os.rename(tmp_path, dst)
+            # rename does nothing when both names already link to the same file
+            os.path.exists(tmp_path) and os.remove(tmp_path)
+            return True
+        except Exception as e:
+            FileUtil.rm(tmp_path)
+            if stdio:
+                getattr(stdio, 'exception', print)('clone error: %s' % e)
+            else:
+                raise e
+        return False
 
     @staticmethod
     def copy_fileobj(fsrc, fdst):